@@ -1,158 +1,504 @@
 import subprocess
 import paramiko
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, g, jsonify, request, send_file
 from flask_cors import CORS
 import cv2
+import json
+import re
+import threading
+import time
+from urllib.parse import urljoin, urlparse
+
 import numpy as np
-import tensorflow as tf
-import os
 import requests
-from threading import Lock
-import socket
-from urllib.parse import urlparse
+
+from batcher import BatchScheduler
+from config import Config
+from delivery import AdaptiveClient, limit_send_buffer
+from detection_log import DetectionLog, DetectionStore
+from detector import interpreter_backend
+from frame_ring import CaptureProcess, FrameWorkers, RingFrame, detach
+from interpreter_pool import InterpreterPool
+from metrics import MetricsWriter
+from mjpeg import http_session, read_available
+from motion_gate import MotionGate
+from postprocess import PostProcessor
+from profiler import profiler, tagged
+from recorder import Recorder, RecordingStore, stream_id
+from resolver import StreamResolver
+from steering import SteeringPublisher
+from stream_hub import StreamHub
+from tiling import TiledDetector
+from tracker import AdaptiveCadence, BoxTracker
 
 # --- Load Model ---
-MODEL_PATH = "models/mobilenet_ssd_v2_coco_quant_postprocess.tflite"
-LABELS_PATH = "models/coco_labels.txt"
+# Every setting below comes from a Config (config.py maps the ASAR_* variables);
+# create_app(config) swaps them before the first load and the first stream.
+settings = Config.from_env()
+MODEL_PATH = settings.model_path
+LABELS_PATH = settings.labels_path
+
+# Interpreter pool: POOL_SIZE interpreters with INTERPRETER_THREADS threads each.
+# Defaults spread the interpreters across the available cores.
+INTERPRETER_THREADS = settings.interpreter_threads
+POOL_SIZE = settings.pool_size
+
+# Adaptive inference cadence: run the SSD every N frames (N follows the measured
+# inference latency against the target frame rate) and track boxes in between.
+TRACKER_ENABLED = settings.tracker
+TRACKER_USE_FLOW = settings.tracker_flow
+TRACKER_TARGET_FPS = settings.target_fps
+TRACKER_MAX_INTERVAL = settings.tracker_max_interval
+
+# Motion gate: skip inference while a downscaled grayscale view of the scene is
+# unchanged (optionally within ASAR_MOTION_ROI="x0,y0,x1,y1", normalised), but
+# re-run at least every MOTION_MIN_REFRESH seconds.
+MOTION_GATE_ENABLED = settings.motion_gate
+MOTION_PIXEL_THRESHOLD = settings.motion_pixel_threshold
+MOTION_AREA_THRESHOLD = settings.motion_area_threshold
+MOTION_MIN_REFRESH = settings.motion_min_refresh
+MOTION_ROI = settings.motion_roi
+
+# Detection post-processing: classes to keep (matched against coco_labels.txt once),
+# score threshold and optional NMS / top-k
+TARGET_CLASSES = settings.target_classes
+SCORE_THRESHOLD = settings.score_threshold
+NMS_IOU = settings.nms_iou
+TOP_K = settings.top_k
 
-interpreter = None
+# Cross-stream batching: up to BATCH_SIZE frames from different streams share one
+# invoke(), waiting at most BATCH_WAIT_MS for a batch to fill. 1 disables batching.
+BATCH_SIZE = settings.batch_size
+BATCH_WAIT_MS = settings.batch_wait_ms
+
+# Tiled inference for small / distant people: ASAR_TILES="3x2" (cols x rows) adds
+# overlapping tiles to the full-frame pass, as many per frame as fit in
+# TILE_BUDGET_MS (the rest rotate over the following frames). Unset = off.
+TILES = settings.tiles
+TILE_OVERLAP = settings.tile_overlap
+TILE_BUDGET_MS = settings.tile_budget_ms
+TILE_NMS_IOU = settings.tile_nms_iou
+
+# Process mode: ASAR_FRAME_WORKERS=N decodes every stream in its own capture process
+# into a shared-memory ring of RING_SLOTS frames (up to RING_MAX_SIZE "WxH", larger
+# frames are downscaled) and runs detection in N worker processes reading the ring.
+# 0 = everything in this process. Tiling needs the in-process detector and is off.
+FRAME_WORKERS = settings.frame_workers
+RING_SLOTS = settings.ring_slots
+RING_MAX_SIZE = settings.ring_max_size
+
+# The model is loaded on first detection use, so processes that only serve the
+# SSH / file routes start in milliseconds. ASAR_WARMUP=1 loads it (and runs one
+# dummy inference) on a background thread at startup instead.
+WARMUP = settings.warmup
+# After a failed load, wait this long before trying again on the next frame
+MODEL_RETRY_INTERVAL = settings.model_retry_interval
+
+detector_pool = None
+batch_scheduler = None
 labels = []
-lock = Lock()
+postprocessor = None
+
+# not_loaded -> loading -> ready | failed
+model_state = {"state": "not_loaded", "backend": None, "load_ms": None, "error": None, "failed_at": None}
+_model_lock = threading.Lock()
 
 def load_model():
-    global interpreter, labels
-    try:
-        if not os.path.exists(MODEL_PATH):
-            print(f"Model not found at {MODEL_PATH}")
-            return False
-            
-        interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
-        interpreter.allocate_tensors()
-        
-        with open(LABELS_PATH, 'r') as f:
-            labels = [line.strip() for line in f.readlines()]
-            
-        print("Model loaded successfully")
-        return True
-    except Exception as e:
-        print(f"Error loading model: {e}")
+    global detector_pool, batch_scheduler, labels, postprocessor
+    pool = InterpreterPool.create(MODEL_PATH, LABELS_PATH,
+                                  size=POOL_SIZE, num_threads=INTERPRETER_THREADS)
+    if not pool:
         return False
 
-# Load model on startup
-load_model()
+    labels = pool.labels
+    postprocessor = PostProcessor(labels, TARGET_CLASSES, score_threshold=SCORE_THRESHOLD,
+                                  top_k=TOP_K, nms_iou=NMS_IOU)
+    if BATCH_SIZE > 1:
+        batch_scheduler = BatchScheduler(pool, max_batch=BATCH_SIZE, max_wait=BATCH_WAIT_MS / 1000.0)
+    # Published last: other threads treat a non-None pool as "ready"
+    detector_pool = pool
+    print("Model loaded successfully")
+    return True
 
-def detect_objects(frame, sock=None, target_address=None):
-    global interpreter
-    if not interpreter:
-        return frame
-        
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
-    height = input_details[0]['shape'][1]
-    width = input_details[0]['shape'][2]
-
-    # Preprocess
-    # Match user's logic: Resize and Normalize
-    frame_resized = cv2.resize(frame, (width, height))
-    
-    # Expand dims (1, H, W, C)
-    input_data = np.expand_dims(frame_resized, axis=0)
-    
-    # Check if model expects float or int
-    # User's logic: if float, divide by 255.0 (range 0-1)
-    # Note: cv2 reads in BGR, TFLite models often expect RGB.
-    # The user's code does: cv2_im = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    # We should add that.
-    
-    # Logic adaptation:
-    input_data = cv2.cvtColor(input_data[0], cv2.COLOR_BGR2RGB)
-    input_data = np.expand_dims(input_data, axis=0)
-
-    if input_details[0]['dtype'] == np.uint8:
-        input_data = input_data.astype(np.uint8)
-    else:
-        # User supplied logic: (input_data / 255.0)
-        input_data = (input_data / 255.0).astype(np.float32)
-    
-    with lock:
-        interpreter.set_tensor(input_details[0]['index'], input_data)
-        interpreter.invoke()
-        
-        boxes = interpreter.get_tensor(output_details[0]['index'])[0]
-        classes = interpreter.get_tensor(output_details[1]['index'])[0]
-        scores = interpreter.get_tensor(output_details[2]['index'])[0]
-        # num_detections = int(interpreter.get_tensor(output_details[3]['index'])[0]) 
-        # (Standard TFLite obj detection has 4 outputs: boxes, classes, scores, num)
-
-    # Draw boxes
-    person_count = 0
+def ensure_model():
+    """Load the model if it is not loaded yet. Returns True when detection is available."""
+    if detector_pool is not None:
+        return True
+    with _model_lock:
+        if detector_pool is not None:
+            return True
+        failed_at = model_state["failed_at"]
+        if failed_at is not None and time.monotonic() - failed_at < MODEL_RETRY_INTERVAL:
+            return False
+
+        model_state.update(state="loading", error=None)
+        start = time.perf_counter()
+        try:
+            loaded = load_model()
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            loaded = False
+            model_state["error"] = str(e)
+        if loaded:
+            model_state.update(state="ready", backend=interpreter_backend()[1], failed_at=None,
+                               load_ms=round(1000 * (time.perf_counter() - start), 1))
+        else:
+            model_state.update(state="failed", failed_at=time.monotonic(),
+                               error=model_state["error"] or f"Could not load {MODEL_PATH}")
+        return loaded
+
+def warm_up():
+    """Load the model and run one inference so the first real frame does not pay for it."""
+    if ensure_model():
+        session = detector_pool.sessions[0]
+        run_detector(np.zeros((session.input_height, session.input_width, 3), dtype=np.uint8))
+        print("Model warm-up done")
+
+_warm_up_started = False
+
+def start_warm_up():
+    """Warm up on a background thread, once per process."""
+    global _warm_up_started
+    if not _warm_up_started:
+        _warm_up_started = True
+        threading.Thread(target=warm_up, daemon=True).start()
+
+def configure(config):
+    """
+    Apply a Config to this process. Model settings take effect at the next
+    model load and pipeline settings for streams started afterwards, so
+    call it before serving.
+    """
+    global settings, MODEL_PATH, LABELS_PATH, INTERPRETER_THREADS, POOL_SIZE
+    global BATCH_SIZE, BATCH_WAIT_MS, WARMUP, MODEL_RETRY_INTERVAL
+    global TRACKER_ENABLED, TRACKER_USE_FLOW, TRACKER_TARGET_FPS, TRACKER_MAX_INTERVAL
+    global MOTION_GATE_ENABLED, MOTION_PIXEL_THRESHOLD, MOTION_AREA_THRESHOLD, MOTION_MIN_REFRESH, MOTION_ROI
+    global TARGET_CLASSES, SCORE_THRESHOLD, NMS_IOU, TOP_K
+    global TILES, TILE_OVERLAP, TILE_BUDGET_MS, TILE_NMS_IOU, FRAME_WORKERS, RING_SLOTS, RING_MAX_SIZE
+    global RESOLVER_TTL, RESOLVER_NEGATIVE_TTL, STEER_HEARTBEAT, STEER_MAX_RATE
+    global RECORD_DIR, RECORD_ANNOTATED, RECORD_SEGMENT_SECONDS, RECORD_QUOTA_MB, recordings
+    global ADAPTIVE_DELIVERY, SEND_BUFFER_KB, DETECTION_LOG_DIR, detection_log, detection_store
+    global STREAM_PEERS, WORKER_INDEX
+    settings = config
+    MODEL_PATH = config.model_path
+    LABELS_PATH = config.labels_path
+    INTERPRETER_THREADS = config.interpreter_threads
+    POOL_SIZE = config.pool_size
+    BATCH_SIZE = config.batch_size
+    BATCH_WAIT_MS = config.batch_wait_ms
+    WARMUP = config.warmup
+    MODEL_RETRY_INTERVAL = config.model_retry_interval
+
+    TRACKER_ENABLED = config.tracker
+    TRACKER_USE_FLOW = config.tracker_flow
+    TRACKER_TARGET_FPS = config.target_fps
+    TRACKER_MAX_INTERVAL = config.tracker_max_interval
+    MOTION_GATE_ENABLED = config.motion_gate
+    MOTION_PIXEL_THRESHOLD = config.motion_pixel_threshold
+    MOTION_AREA_THRESHOLD = config.motion_area_threshold
+    MOTION_MIN_REFRESH = config.motion_min_refresh
+    MOTION_ROI = config.motion_roi
+    TARGET_CLASSES = config.target_classes
+    SCORE_THRESHOLD = config.score_threshold
+    NMS_IOU = config.nms_iou
+    TOP_K = config.top_k
+    TILES = config.tiles
+    TILE_OVERLAP = config.tile_overlap
+    TILE_BUDGET_MS = config.tile_budget_ms
+    TILE_NMS_IOU = config.tile_nms_iou
+    FRAME_WORKERS = config.frame_workers
+    RING_SLOTS = config.ring_slots
+    RING_MAX_SIZE = config.ring_max_size
+
+    RESOLVER_TTL = config.resolver_ttl
+    RESOLVER_NEGATIVE_TTL = config.resolver_negative_ttl
+    stream_resolver.ttl = RESOLVER_TTL
+    stream_resolver.negative_ttl = RESOLVER_NEGATIVE_TTL
+    STEER_HEARTBEAT = config.steer_heartbeat
+    STEER_MAX_RATE = config.steer_max_rate
+
+    if config.record_dir != RECORD_DIR:
+        recordings = RecordingStore(config.record_dir) if config.record_dir else None
+    RECORD_DIR = config.record_dir
+    RECORD_ANNOTATED = config.record_annotated
+    RECORD_SEGMENT_SECONDS = config.record_segment_seconds
+    RECORD_QUOTA_MB = config.record_quota_mb
+    ADAPTIVE_DELIVERY = config.adaptive_delivery
+    SEND_BUFFER_KB = config.send_buffer_kb
+    if config.detection_log_dir != DETECTION_LOG_DIR:
+        if detection_log is not None:
+            detection_log.close()
+        detection_log = DetectionLog(config.detection_log_dir) if config.detection_log_dir else None
+        detection_store = DetectionStore(config.detection_log_dir) if config.detection_log_dir else None
+    DETECTION_LOG_DIR = config.detection_log_dir
+
+    STREAM_PEERS = config.stream_peers
+    WORKER_INDEX = config.worker_index
+
+# Define deadzone threshold (e.g., 15% of width from center), in x_deviation units
+DIRECTION_DEADZONE = 0.15
+
+def direction_for(det):
+    # x_deviation = 0.5 - box centre, so negative means the target is right of centre
+    if det['x_deviation'] < -DIRECTION_DEADZONE:
+        return "right"
+    if det['x_deviation'] > DIRECTION_DEADZONE:
+        return "left"
+    return "forward"
+
+def draw_detections(frame, detections):
+    """Draw target boxes and the count onto the frame."""
     im_height, im_width, _ = frame.shape
-    
-    for i in range(len(scores)):
-        score = scores[i]
-        # User defined threshold in snippet was 0.3
-        if score > 0.3:
-            class_id = int(classes[i])
-            # User checks if class_id == 0 for person. 
-            # We can also check labels if available, but let's prioritize index 0 as 'person'
-            
-            is_person = (class_id == 0)
-            # Or fallback to label check if 0 is not person in this specific model (unlikely for COCO)
-            if not is_person and len(labels) > class_id:
-                if 'person' in labels[class_id].lower():
-                    is_person = True
-            
-            if is_person:
-                person_count += 1
-                ymin, xmin, ymax, xmax = boxes[i]
-                
-                (left, right, top, bottom) = (int(xmin * im_width), int(xmax * im_width),
-                                              int(ymin * im_height), int(ymax * im_height))
-                                              
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                text = f"person: {score:.2f}"
-                cv2.putText(frame, text, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                
-                # --- Direction Logic ---
-                box_center_x = (left + right) / 2
-                image_center_x = im_width / 2
-                
-                # Define deadzone threshold (e.g., 15% of width from center)
-                threshold = im_width * 0.15
-                
-                if box_center_x > image_center_x + threshold:
-                    direction = "right"
-                    print(f"Action: {direction}")
-                elif box_center_x < image_center_x - threshold:
-                    direction = "left"
-                    print(f"Action: {direction}")
-                else:
-                    direction = "forward"
-                    print(f"Action: {direction}")
-                
-                if sock and target_address:
-                    try:
-                        sock.sendto(direction.encode(), target_address)
-                    except Exception as e:
-                        print(f"Socket send error: {e}")
-                # -----------------------
-    
+    person_count = len(detections)
+
+    for det in detections:
+        left, top, right, bottom = int(det['left']), int(det['top']), int(det['right']), int(det['bottom'])
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+        text = f"person: {det['score']:.2f}"
+        cv2.putText(frame, text, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
     # Add count text
     detection_text = f"Persons: {person_count}"
     # Calculate text size for positioning
     (text_w, text_h), _ = cv2.getTextSize(detection_text, cv2.FONT_HERSHEY_SIMPLEX, 1, 2)
     cv2.putText(frame, detection_text, (im_width - text_w - 10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-                            
+
     return frame
 
-app = Flask(__name__)
-CORS(app)
+def choose_target(detections):
+    """The closest (largest) target to steer towards, or None."""
+    if len(detections) == 0:
+        return None
+    return detections[detections['area'].argmax()]
+
+frame_workers = None
+_frame_workers_lock = threading.Lock()
+
+def get_frame_workers():
+    """The inference process pool, started with the first stream in process mode."""
+    global frame_workers
+    with _frame_workers_lock:
+        if frame_workers is None:
+            frame_workers = FrameWorkers(FRAME_WORKERS, threads=INTERPRETER_THREADS)
+            print(f"Frame workers started: {FRAME_WORKERS} process(es)")
+        return frame_workers
+
+def run_detector(frame):
+    """Raw (boxes, classes, scores) for one frame, batched with other streams when enabled."""
+    if batch_scheduler:
+        return batch_scheduler.detect(frame)
+    # Check out a free interpreter: preprocess into its buffer, invoke and read outputs
+    return detector_pool.detect(frame)
+
+def run_detector_batch(frames):
+    """Raw outputs for several frames on one interpreter, packed into its batch size."""
+    with detector_pool.checkout() as session:
+        return session.detect_batch(frames)
+
+def find_targets(frame, boxes, classes, scores):
+    im_height, im_width = frame.shape[:2]
+    return postprocessor(boxes, classes, scores, im_width, im_height)
+
+class FrameProcessor:
+    """
+    Per-stream processor used by StreamHub. Runs detection on every frame,
+    stores the detections, closest target and its direction on the packet
+    (the stream publishes the steering decision), and only draws when someone
+    is watching the video. With the motion gate enabled, frames of a static
+    scene reuse the last detections instead of running the detector.
+    """
+    def __init__(self):
+        self.gate = make_motion_gate()
+        self.tiler = make_tiler()
+        self.last_detections = None
+
+    def _gate_skips(self, packet):
+        """Check the motion gate once per packet; sets packet.reused."""
+        if packet.reused is None:
+            if self.gate is None:
+                packet.reused = False
+            else:
+                # Checked even before the first detection, so that frame becomes the reference
+                changed = self.gate.changed(packet.frame, packet.source_jpeg)
+                packet.reused = not changed and self.last_detections is not None
+        return packet.reused
+
+    def wants_frame(self, packet):
+        """
+        Called by the stream before decoding an MJPEG frame. A frame that
+        would get no new annotations (static scene, nothing to draw) is
+        forwarded as its original JPEG bytes.
+        """
+        if self._gate_skips(packet):
+            return len(self.last_detections) > 0
+        return True
+
+    def run_detection(self, frame):
+        """Detections for one frame: full frame only, or full frame plus tiles."""
+        if self.tiler is not None:
+            return self.tiler(frame)
+        if isinstance(frame, RingFrame) and FRAME_WORKERS:
+            # Shared-memory frame: a worker process reads it in place
+            return get_frame_workers().detect(frame)
+        boxes, classes, scores = run_detector(frame)
+        return find_targets(frame, boxes, classes, scores)
 
-@app.route('/')
+    def detect(self, frame):
+        return self.run_detection(frame)
+
+    def __call__(self, packet, draw=True):
+        # In process mode the model lives in the frame workers
+        if not FRAME_WORKERS and not ensure_model():
+            return
+        if self._gate_skips(packet):
+            detections = self.last_detections
+        else:
+            start = time.perf_counter()
+            with profiler.section('detect_objects'):
+                detections = self.detect(packet.frame)
+            packet.inference_time = time.perf_counter() - start
+            self.last_detections = detections
+            if self.gate is not None:
+                self.gate.commit()
+
+        packet.detections = detections
+        packet.target = choose_target(detections)
+        packet.direction = None if packet.target is None else direction_for(packet.target)
+        if draw:
+            start = time.perf_counter()
+            # Never draw into a shared ring slot; a slot reused since detection yields no frame
+            packet.frame = detach(packet.frame)
+            if packet.frame is not None:
+                draw_detections(packet.frame, detections)
+            packet.draw_time = time.perf_counter() - start
+
+    def stats(self):
+        stats = {"motion_gate": self.gate.stats()} if self.gate else {}
+        if self.tiler is not None:
+            stats["tiling"] = self.tiler.stats()
+        return stats
+
+class TrackingDetector(FrameProcessor):
+    """
+    FrameProcessor that runs the SSD only on keyframes chosen by
+    AdaptiveCadence and tracks boxes in between. Overlays and UDP directions
+    are still produced on every frame.
+    """
+    def __init__(self):
+        super().__init__()
+        self.tracker = BoxTracker(use_flow=TRACKER_USE_FLOW)
+        self.cadence = AdaptiveCadence(target_fps=TRACKER_TARGET_FPS, max_interval=TRACKER_MAX_INTERVAL)
+        self._keyframe = None
+
+    def wants_frame(self, packet):
+        """
+        Frames that are neither keyframes nor carrying tracked boxes get no
+        new annotations, so the stream forwards their original JPEG bytes.
+        """
+        if self._gate_skips(packet):
+            return len(self.last_detections) > 0
+        self._keyframe = self.cadence.should_detect(self.tracker.confidence)
+        return self._keyframe or len(self.tracker.boxes) > 0
+
+    def detect(self, frame):
+        keyframe, self._keyframe = self._keyframe, None
+        if keyframe is None:
+            keyframe = self.cadence.should_detect(self.tracker.confidence)
+
+        if keyframe:
+            return self.tracker.update(frame, self.cadence.timed(self.run_detection, frame))
+        return self.tracker.propagate(frame)
+
+    def stats(self):
+        stats = super().stats()
+        stats["cadence"] = {
+            "interval": self.cadence.interval,
+            "keyframes": self.cadence.keyframes,
+            "tracked_frames": self.cadence.tracked_frames,
+        }
+        return stats
+
+def make_motion_gate():
+    if not MOTION_GATE_ENABLED:
+        return None
+    return MotionGate(pixel_threshold=MOTION_PIXEL_THRESHOLD, area_threshold=MOTION_AREA_THRESHOLD,
+                      min_refresh=MOTION_MIN_REFRESH, roi=MOTION_ROI)
+
+def make_tiler():
+    if not TILES or FRAME_WORKERS:
+        return None
+    cols, rows = TILES
+    return TiledDetector(run_detector_batch, find_targets, cols=cols, rows=rows, overlap=TILE_OVERLAP,
+                         budget_ms=TILE_BUDGET_MS, nms_iou=TILE_NMS_IOU)
+
+def make_frame_processor():
+    """Frame processor for one shared stream (tracker state must not be shared between sources)."""
+    if TRACKER_ENABLED:
+        return TrackingDetector()
+    return FrameProcessor()
+
+# Routes live on a blueprint so create_app() can build any number of apps
+bp = Blueprint('backend', __name__)
+
+# --- Profiling (see profiler.py); every hook returns at once while it is off ---
+@bp.before_app_request
+def start_request_profile():
+    if profiler.enabled and not request.path.startswith('/profiling'):
+        g.profile = profiler.track(f"{request.method} {request.path}")
+
+@bp.after_app_request
+def extend_streamed_profile(response):
+    # Streamed responses (MJPEG, SSE) run after the request returns: profile until they close
+    handle = g.pop('profile', None)
+    if handle is not None:
+        if response.is_streamed:
+            response.call_on_close(lambda: profiler.untrack(handle))
+        else:
+            profiler.untrack(handle)
+    return response
+
+@bp.teardown_app_request
+def end_request_profile(exc):
+    profiler.untrack(g.pop('profile', None))
+
+
+@bp.route('/')
 def hello():
     return jsonify({"message": "Hello from Flask Backend!"})
 
-@app.route('/wifi-status')
+@bp.route('/ready')
+def ready():
+    """
+    Model state for health checks. 503 while the model is loading or after a
+    failed load; 200 once ready, or while still unloaded in lazy mode (it
+    loads on first use). ?load=1 starts (or retries) loading in the background.
+    """
+    if request.args.get('load') == '1' and model_state["state"] in ("not_loaded", "failed"):
+        # Explicit request: retry a failed load right away
+        model_state["failed_at"] = None
+        threading.Thread(target=warm_up, daemon=True).start()
+    state = dict(model_state, lazy=not WARMUP)
+    state.pop("failed_at")
+    ok = state["state"] == "ready" or (state["state"] == "not_loaded" and not WARMUP)
+    return jsonify(state), 200 if ok else 503
+
+@bp.route('/pool-status')
+def pool_status():
+    if frame_workers is not None:
+        return jsonify(frame_workers.stats())
+    if not detector_pool:
+        return jsonify({"error": "Model not loaded"}), 503
+    stats = detector_pool.stats()
+    if batch_scheduler:
+        stats["batch_size"] = batch_scheduler.max_batch
+        stats["average_batch"] = round(batch_scheduler.average_batch, 2)
+    return jsonify(stats)
+
+@bp.route('/stream-status')
+def stream_status():
+    return jsonify({"streams": stream_hub.stats()})
+
+@bp.route('/wifi-status')
 def wifi_status():
     try:
         # Run netsh command to get wifi details
@@ -176,7 +522,7 @@ def wifi_status():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/scan-network')
+@bp.route('/scan-network')
 def scan_network():
     try:
         # Run arp -a to see connected devices
@@ -196,7 +542,8 @@ def scan_network():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/connect', methods=['POST'])
+@bp.route('/connect', methods=['POST'])
+@tagged('ssh')
 def connect_ssh():
     data = request.json
     ip = data.get('ip')
@@ -220,7 +567,8 @@ def connect_ssh():
     except Exception as e:
         return jsonify({"message": str(e), "status": "error"}), 401
 
-@app.route('/list-files', methods=['POST'])
+@bp.route('/list-files', methods=['POST'])
+@tagged('ssh')
 def list_files():
     data = request.json
     ip = data.get('ip')
@@ -262,7 +610,8 @@ def list_files():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/run-file', methods=['POST'])
+@bp.route('/run-file', methods=['POST'])
+@tagged('ssh')
 def run_file():
     data = request.json
     ip = data.get('ip')
@@ -297,7 +646,8 @@ def run_file():
     except Exception as e:
         return jsonify({"error": str(e), "status": "failed"}), 500
 
-@app.route('/view-file', methods=['POST'])
+@bp.route('/view-file', methods=['POST'])
+@tagged('ssh')
 def view_file():
     """Read and return the content of a file"""
     data = request.json
@@ -333,7 +683,8 @@ def view_file():
     except Exception as e:
         return jsonify({"error": str(e), "status": "failed"}), 500
 
-@app.route('/save-file', methods=['POST'])
+@bp.route('/save-file', methods=['POST'])
+@tagged('ssh')
 def save_file():
     """Save content to a file"""
     data = request.json
@@ -366,7 +717,8 @@ def save_file():
     except Exception as e:
         return jsonify({"error": str(e), "status": "failed"}), 500
 
-@app.route('/create-file', methods=['POST'])
+@bp.route('/create-file', methods=['POST'])
+@tagged('ssh')
 def create_file():
     """Create a new file in the specified directory"""
     data = request.json
@@ -411,17 +763,159 @@ def create_file():
     except Exception as e:
         return jsonify({"error": str(e), "status": "failed"}), 500
 
-@app.route('/process-video')
-def process_video():
-    url = request.args.get('url')
-    if not url:
-        return "Missing URL", 400
+def discover_stream_url(url):
+    """If url is a webpage, find the video stream it embeds. Otherwise return url unchanged. Raises on network errors."""
+    target_url = url
+
+    print(f"Inspect/Open video stream from: {target_url}")
+
+    # Diagnostic and Auto-discovery
+    r = http_session.get(target_url, stream=True, timeout=5)
+    try:
+        content_type = r.headers.get('Content-Type', '')
+        print(f"Target URL Content-Type: {content_type}")
+
+        if 'text/html' in content_type:
+            print("URL seems to be a webpage. Attempting to find video stream URL in HTML...")
+            html_content = r.text
+            # Look for img tag with src
+            matches = re.findall(r'<img[^>]+src=["\']([^"\']+)["\']', html_content)
+            if matches:
+                print(f"Found image sources: {matches}")
+                # Usually the stream is the main image in simple flask apps
+                src = matches[0]
+
+                if not src.startswith('http'):
+                    # Handle relative URL
+                    target_url = urljoin(target_url, src)
+                else:
+                    target_url = src
+
+                print(f"Resolved new video URL: {target_url}")
+            else:
+                print("No img tags found in HTML. Trying original URL...")
+    finally:
+        r.close()
+
+    return target_url
+
+# Page URL -> stream URL cache: fresh for RESOLVER_TTL seconds, then served stale
+# while revalidating in the background; failures fall back to the page URL.
+RESOLVER_TTL = settings.resolver_ttl
+RESOLVER_NEGATIVE_TTL = settings.resolver_negative_ttl
+stream_resolver = StreamResolver(discover_stream_url, ttl=RESOLVER_TTL, negative_ttl=RESOLVER_NEGATIVE_TTL)
+
+def resolve_stream_url(url):
+    """Cached discover_stream_url(); reconnects and extra viewers skip the page fetch."""
+    return stream_resolver.resolve(url)
+
+# UDP steering: unchanged commands are repeated only as a heartbeat every
+# STEER_HEARTBEAT seconds, and sends are capped at STEER_MAX_RATE per second
+STEER_HEARTBEAT = settings.steer_heartbeat
+STEER_MAX_RATE = settings.steer_max_rate
+
+def make_steering_publisher():
+    return SteeringPublisher(heartbeat_interval=STEER_HEARTBEAT, max_rate=STEER_MAX_RATE)
+
+# Optional mission recording: every stream's frames go to rolling segments under
+# ASAR_RECORD_DIR (unset = off). ASAR_RECORD_MODE=raw keeps the source JPEGs
+# instead of the annotated frames.
+RECORD_DIR = settings.record_dir
+RECORD_ANNOTATED = settings.record_annotated
+RECORD_SEGMENT_SECONDS = settings.record_segment_seconds
+RECORD_QUOTA_MB = settings.record_quota_mb
+
+recordings = RecordingStore(RECORD_DIR) if RECORD_DIR else None
+
+def make_recorder(source_url):
+    if not RECORD_DIR:
+        return None
+    return Recorder(RECORD_DIR, source_url, annotated=RECORD_ANNOTATED,
+                    segment_seconds=RECORD_SEGMENT_SECONDS, quota_bytes=int(RECORD_QUOTA_MB * (1 << 20)))
+
+# Per-viewer adaptive delivery: each /process-video client gets its own drop-oldest
+# send queue and, on a slow link, steps down to smaller / lower quality / lower fps
+# JPEGs (delivery.LEVELS). ?adaptive=0 opts a client out.
+ADAPTIVE_DELIVERY = settings.adaptive_delivery
+# Kernel send buffer for adaptive viewers, so backlog stays in the drop-oldest queue
+SEND_BUFFER_KB = settings.send_buffer_kb
+
+# Detection log: every frame's detections are appended to columnar files under
+# ASAR_DETECTION_LOG_DIR (unset = off), partitioned by stream and hour, and can be
+# queried by time range with /detection-log/query.
+DETECTION_LOG_DIR = settings.detection_log_dir
+detection_log = DetectionLog(DETECTION_LOG_DIR) if DETECTION_LOG_DIR else None
+detection_store = DetectionStore(DETECTION_LOG_DIR) if DETECTION_LOG_DIR else None
 
-    # Socket setup logic
-    target_ip = request.args.get('ip')
-    target_port = request.args.get('port')
-    sock = None
-    target_address = None
+def log_detections(source_url, packet):
+    # Looked up per packet: configure() may switch the log on or off before serving
+    if detection_log is not None:
+        detection_log.append(source_url, packet)
+
+def make_capture(source_url):
+    if not FRAME_WORKERS:
+        return None
+    width, height = RING_MAX_SIZE
+    return CaptureProcess(source_url, slots=RING_SLOTS, max_shape=(height, width, 3))
+
+def make_adaptive_client(stream):
+    return AdaptiveClient(stream.variants, source_fps=lambda: stream.metrics.fps)
+
+# One capture + inference loop per source, shared by every viewer
+stream_hub = StreamHub(make_frame_processor, make_steering_publisher, make_recorder, make_capture,
+                       on_packet=log_detections)
+
+# Pre-fork workers (serve.py): each source is owned by one worker, chosen from
+# its stream id, so its capture, inference, steering seq, log and recording
+# exist once. Other workers relay stream requests to the owner's internal
+# address (ASAR_STREAM_PEERS, one per worker, in worker order).
+STREAM_PEERS = settings.stream_peers
+WORKER_INDEX = settings.worker_index
+RELAYED_HEADER = 'X-ASAR-Relayed'
+
+def stream_owner(source_url, relayed=False):
+    """Internal base URL of the worker that owns source_url, or None if this worker serves it."""
+    if len(STREAM_PEERS) < 2 or relayed:
+        return None
+    owner = int(stream_id(source_url), 16) % len(STREAM_PEERS)
+    return None if owner == WORKER_INDEX else STREAM_PEERS[owner]
+
+def relay_to_owner(url):
+    """Response relayed from the worker owning url's stream, or None if this worker owns it."""
+    if len(STREAM_PEERS) < 2:
+        return None
+    peer = stream_owner(resolve_stream_url(url), bool(request.headers.get(RELAYED_HEADER)))
+    if peer is None:
+        return None
+    try:
+        # Connect timeout only: the relayed streams are endless
+        upstream = http_session.get(f"{peer}{request.path}?{request.query_string.decode('latin-1')}",
+                                    headers={RELAYED_HEADER: '1'}, stream=True, timeout=(5, None))
+    except (requests.ConnectionError, requests.Timeout) as e:
+        print(f"Stream owner {peer} unreachable: {e}")
+        return jsonify({"error": "Stream owner unavailable"}), 503
+    except requests.RequestException as e:
+        print(f"Relay to {peer} failed: {e}")
+        return jsonify({"error": str(e)}), 502
+
+    def relay():
+        try:
+            yield from read_available(upstream, 64 * 1024)
+        finally:
+            upstream.close()
+
+    return Response(relay(), status=upstream.status_code, content_type=upstream.headers.get('Content-Type'),
+                    headers={'Cache-Control': upstream.headers.get('Cache-Control', 'no-cache')})
+
+# While profiling, every stream's pipeline threads are sampled in windows
+profiler.add_source(lambda: [(id(s), f"stream {s.source_url}", s.thread_ids) for s in stream_hub.streams()])
+
+def steering_target(url, args=None):
+    """UDP (ip, port) from the request's ip/port args; ip defaults to the stream's host."""
+    if args is None:
+        args = request.args
+    target_ip = args.get('ip')
+    target_port = args.get('port')
 
     if not target_ip:
         # Try to extract IP from URL
@@ -436,96 +930,306 @@ def process_video():
     if target_ip and target_port:
         try:
             port = int(target_port)
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            target_address = (target_ip, port)
-            print(f"UDP Socket initialized for {target_address}")
+            print(f"UDP target registered: {(target_ip, port)}")
+            return (target_ip, port)
         except ValueError:
             print("Invalid port number")
-        
+    return None
+
+@bp.route('/process-video')
+def process_video():
+    url = request.args.get('url')
+    if not url:
+        return "Missing URL", 400
+
+    relayed = relay_to_owner(url)
+    if relayed is not None:
+        return relayed
+
+    target_address = steering_target(url)
+    adaptive = ADAPTIVE_DELIVERY and request.args.get('adaptive') != '0'
+    if adaptive:
+        # Only available under the development server; other servers keep their default
+        limit_send_buffer(request.environ.get('werkzeug.socket'), SEND_BUFFER_KB * 1024)
+
     def generate_frames():
-        # captured_url needs to be a local variable that can be updated
-        target_url = url
-        
-        print(f"Inspect/Open video stream from: {target_url}")
-        
-        # Diagnostic and Auto-discovery
+        source_url = resolve_stream_url(url)
+        subscription = stream_hub.subscribe(source_url, target_address)
+        stream = subscription.stream
+        client = make_adaptive_client(stream) if adaptive else None
         try:
-            r = requests.get(target_url, stream=True, timeout=5)
-            content_type = r.headers.get('Content-Type', '')
-            print(f"Target URL Content-Type: {content_type}")
-            
-            if 'text/html' in content_type:
-                print("URL seems to be a webpage. Attempting to find video stream URL in HTML...")
-                html_content = r.text
-                # Simple regex to find img src
-                import re
-                # Look for img tag with src
-                matches = re.findall(r'<img[^>]+src=["\']([^"\']+)["\']', html_content)
-                if matches:
-                    print(f"Found image sources: {matches}")
-                    # Usually the stream is the main image in simple flask apps
-                    src = matches[0]
-                    
-                    if not src.startswith('http'):
-                        # Handle relative URL
-                        from urllib.parse import urljoin
-                        target_url = urljoin(target_url, src)
-                    else:
-                        target_url = src
-                    
-                    print(f"Resolved new video URL: {target_url}")
+            for packet in subscription.queued_packets():
+                if client is None:
+                    frame_bytes = packet.jpeg
+                elif client.wants():
+                    frame_bytes = client.render(packet)
                 else:
-                    print("No img tags found in HTML. Trying original URL...")
-            r.close()
-        except Exception as e:
-            print(f"Error inspecting/parsing URL: {e}")
+                    continue
+                # Packets produced while only detection consumers were attached carry no JPEG
+                if frame_bytes is None:
+                    continue
+                start = time.perf_counter()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                # The generator resumes once the server has handed the part to the socket
+                if client is not None:
+                    client.record_send(len(frame_bytes), time.perf_counter() - start)
+        finally:
+            # Runs on stream end and on client disconnect
+            subscription.close()
 
-        # Open video stream
-        # Force FFMPEG backend which is often more robust for network streams
-        cap = cv2.VideoCapture(target_url, cv2.CAP_FFMPEG)
-        
-        if not cap.isOpened():
-            print(f"Failed to open video capture for URL: {url}")
-            return
+    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
-        print("Video capture opened successfully. Starting frame loop...")
-        frame_count = 0
-        while True:
-            success, frame = cap.read()
-            if not success:
-                print("Failed to read frame or stream ended.")
-                break
-            
-            # optional: limit log rate
-            if frame_count % 30 == 0:
-                print(f"Processing frame {frame_count}")
-            frame_count += 1
-                
-            # Run detection
-            try:
-                frame = detect_objects(frame, sock, target_address)
-            except Exception as e:
-                print(f"Error during detection: {e}")
-            
-            # Encode
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                print("Failed to encode frame.")
-                continue
-                
-            frame_bytes = buffer.tobytes()
-            
+def format_detection_record(packet, fmt):
+    """One /detections message: an SSE event or an NDJSON line."""
+    record = json.dumps(packet.detection_record(), separators=(',', ':'))
+    if fmt == 'sse':
+        return f"id: {packet.seq}\ndata: {record}\n\n"
+    return record + "\n"
+
+@bp.route('/detections')
+def detections_stream():
+    """
+    Per-frame detection records for consumers that do not need video.
+    ?format=sse (default) for Server-Sent Events, ?format=ndjson for one
+    JSON object per line. Frames are not drawn or encoded for these clients.
+    """
+    url = request.args.get('url')
+    if not url:
+        return "Missing URL", 400
+    fmt = request.args.get('format', 'sse')
+    if fmt not in ('sse', 'ndjson'):
+        return "format must be sse or ndjson", 400
+
+    relayed = relay_to_owner(url)
+    if relayed is not None:
+        return relayed
+
+    target_address = steering_target(url)
+
+    def generate_records():
+        source_url = resolve_stream_url(url)
+        subscription = stream_hub.subscribe(source_url, target_address, video=False)
+        try:
+            for packet in subscription.packets():
+                yield format_detection_record(packet, fmt)
+        finally:
+            subscription.close()
+
+    mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+    return Response(generate_records(), mimetype=mimetype, headers={'Cache-Control': 'no-cache'})
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus text exposition of stream, pipeline stage, pool and steering metrics."""
+    out = MetricsWriter()
+    out.gauge('asar_model_loaded', "1 if the detection model is loaded", int(bool(detector_pool)))
+
+    for stream in stream_hub.streams():
+        labels = {"stream": stream.source_url}
+        out.gauge('asar_stream_fps', "Smoothed frames per second published by the stream",
+                  stream.metrics.fps, labels)
+        out.counter('asar_stream_frames_total', "Frames taken from the source", stream.frame_count, labels)
+        out.counter('asar_stream_frames_dropped_total', "Frames dropped between pipeline stages",
+                    stream.frames_dropped, labels)
+        out.gauge('asar_stream_subscribers', "Active subscribers (video and detections)",
+                  stream.subscribers, labels)
+        out.gauge('asar_stream_video_subscribers', "Active video subscribers", stream.video_subscribers, labels)
+        if stream.last_latency is not None:
+            out.gauge('asar_stream_latency_seconds', "Capture to encode latency of the last frame",
+                      stream.last_latency, labels)
+        for stage, histogram in stream.metrics.stages.items():
+            out.histogram('asar_stage_latency_seconds', "Time spent in each pipeline stage per frame",
+                          histogram, dict(labels, stage=stage))
+        for kind, value in stream.steering.counters.items():
+            out.counter('asar_udp_commands_total', "UDP steering datagrams by outcome",
+                        value, dict(labels, outcome=kind))
+        gate = getattr(stream.process_frame, 'gate', None)
+        if gate is not None:
+            out.counter('asar_motion_gate_checks_total', "Frames checked by the motion gate",
+                        gate.checks, labels)
+            out.counter('asar_motion_gate_skips_total', "Frames that reused the last detections",
+                        gate.skips, labels)
+            out.counter('asar_motion_gate_cost_seconds_total', "Time spent preparing and checking frames",
+                        gate.cost, labels)
+
+    if detector_pool:
+        stats = detector_pool.stats()
+        out.gauge('asar_pool_size', "Interpreters in the pool", stats["size"])
+        out.gauge('asar_pool_in_use', "Interpreters currently checked out", stats["in_use"])
+        out.gauge('asar_pool_utilisation', "Fraction of pool time spent running detections",
+                  stats["utilisation"])
+        out.histogram('asar_pool_wait_seconds', "Time spent waiting for a free interpreter",
+                      detector_pool.wait_histogram)
+    if batch_scheduler:
+        out.counter('asar_batches_total', "Batched interpreter invocations", batch_scheduler.batches)
+        out.counter('asar_batched_frames_total', "Frames run through batched invocations",
+                    batch_scheduler.frames)
+
+    return Response(out.render(), content_type=MetricsWriter.CONTENT_TYPE)
+
+@bp.route('/profiling', methods=['GET', 'POST'])
+def profiling():
+    """
+    GET: whether profiling is on and summaries of the kept profiles (newest first).
+    POST ?enabled=1|0 (or JSON {"enabled": true}) turns it on or off.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        enabled = data.get('enabled', request.args.get('enabled'))
+        if enabled in (True, '1', 'true', 'on'):
+            profiler.enable()
+        elif enabled in (False, '0', 'false', 'off'):
+            profiler.disable()
+        else:
+            return jsonify({"error": "enabled must be 1 or 0"}), 400
+    return jsonify({
+        "enabled": profiler.enabled,
+        "interval_ms": round(1000 * profiler.interval, 2),
+        "window_s": profiler.window,
+        "profiles": profiler.profiles(),
+    })
+
+@bp.route('/profiling/<int:profile_id>')
+def profile_summary(profile_id):
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found (only the last ones are kept)"}), 404
+    return jsonify(profile.summary(top=25))
+
+@bp.route('/profiling/<int:profile_id>/collapsed')
+def profile_collapsed(profile_id):
+    """Collapsed stacks for flamegraph.pl / speedscope / inferno, as a download."""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return "Profile not found", 404
+    return Response(profile.collapsed(), content_type='text/plain; charset=utf-8',
+                    headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.folded"'})
+
+@bp.route('/detection-log')
+def list_detection_log():
+    if not detection_store:
+        return jsonify({"error": "Detection log is disabled (set ASAR_DETECTION_LOG_DIR)"}), 404
+    return jsonify({"streams": detection_store.streams(), "writer": detection_log.stats()})
+
+@bp.route('/detection-log/query')
+def query_detection_log():
+    """
+    Logged frames of one stream (?stream=<id> from /detection-log, or ?url=<stream url>)
+    between ?t0= and ?t1= (unix times, default the last hour) with at least
+    ?min_persons= (default 1) detections. ?limit= caps the frames returned
+    (default 1000, "matches" is always the full count); ?boxes=1 adds the boxes.
+    """
+    if not detection_store:
+        return jsonify({"error": "Detection log is disabled (set ASAR_DETECTION_LOG_DIR)"}), 404
+    sid = request.args.get('stream')
+    if not sid and request.args.get('url'):
+        # Logged under the resolved source URL, as /process-video subscribes to it
+        sid = stream_id(resolve_stream_url(request.args['url']))
+    if not sid:
+        return jsonify({"error": "Missing stream or url"}), 400
+    try:
+        t1 = float(request.args.get('t1', time.time()))
+        t0 = float(request.args.get('t0', t1 - 3600))
+        min_persons = int(request.args.get('min_persons', 1))
+        limit = max(0, int(request.args.get('limit', 1000)))
+    except ValueError:
+        return jsonify({"error": "t0 / t1 must be unix timestamps, min_persons / limit integers"}), 400
+    start = time.perf_counter()
+    result = detection_store.query(sid, t0, t1, min_persons=min_persons, limit=limit,
+                                   boxes=request.args.get('boxes') == '1')
+    result.update(stream=sid, t0=t0, t1=t1, min_persons=min_persons,
+                  elapsed_ms=round(1000 * (time.perf_counter() - start), 2))
+    return jsonify(result)
+
+@bp.route('/recordings')
+def list_recordings():
+    if not recordings:
+        return jsonify({"error": "Recording is disabled (set ASAR_RECORD_DIR)"}), 404
+    return jsonify({"streams": recordings.streams()})
+
+@bp.route('/recordings/<sid>/<segment>')
+def recording_segment(sid, segment):
+    """Raw segment file (JPEGs back to back). Supports Range requests; use /seek for offsets."""
+    path = recordings.segment_path(sid, segment) if recordings else None
+    if not path:
+        return jsonify({"error": "Segment not found"}), 404
+    return send_file(path, mimetype='application/octet-stream', conditional=True)
+
+@bp.route('/recordings/<sid>/seek')
+def recording_seek(sid):
+    """Segment, byte offset and length of the first frame at or after ?t=<unix time>."""
+    if not recordings:
+        return jsonify({"error": "Recording is disabled (set ASAR_RECORD_DIR)"}), 404
+    try:
+        ts = float(request.args.get('t', 0))
+    except ValueError:
+        return jsonify({"error": "t must be a unix timestamp"}), 400
+    found = recordings.seek(sid, ts)
+    if found is None:
+        return jsonify({"error": "No frames at or after t"}), 404
+    segment, position = found
+    record = recordings.read_index(sid, segment)[position]
+    return jsonify({
+        "segment": segment,
+        "ts": float(record['ts']),
+        "offset": int(record['offset']),
+        "length": int(record['length']),
+        "url": f"/recordings/{sid}/{segment}",
+    })
+
+@bp.route('/replay')
+def replay():
+    """
+    Replay a recorded stream as MJPEG from ?t= at ?speed= (default 1.0) times
+    real time. Frames are copied from the segment files, never decoded.
+    """
+    sid = request.args.get('stream')
+    if not recordings or not sid:
+        return "Missing stream (or recording disabled)", 400
+    try:
+        start = float(request.args.get('t', 0))
+        speed = float(request.args.get('speed', 1.0))
+    except ValueError:
+        return "t and speed must be numbers", 400
+
+    def generate_frames():
+        first_ts = None
+        clock = time.monotonic()
+        for ts, jpeg in recordings.frames(sid, start):
+            if first_ts is None:
+                first_ts = ts
+            elif speed > 0:
+                # Keep the recorded pacing
+                delay = (ts - first_ts) / speed - (time.monotonic() - clock)
+                if delay > 0:
+                    time.sleep(delay)
             yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                   
-        cap.release()
-        if sock:
-            sock.close()
-        print("Video capture released.")
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
 
     return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 from flask import Response
 
+def create_app(config=None):
+    """
+    Application factory: applies `config` (default: the ASAR_* environment)
+    and returns a Flask app with every route. Detection state (interpreter
+    pool, stream hub) is per process, so pre-fork servers (serve.py,
+    gunicorn 'app:create_app()') get their own interpreters in each worker,
+    loaded after the fork.
+    """
+    if config is not None:
+        configure(config)
+    flask_app = Flask(__name__)
+    flask_app.config["ASAR"] = settings.as_dict()
+    CORS(flask_app)
+    flask_app.register_blueprint(bp)
+    if WARMUP:
+        start_warm_up()
+    return flask_app
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
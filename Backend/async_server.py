@@ -0,0 +1,521 @@
+"""
+asyncio serving mode for the backend.
+
+    python async_server.py [--host 0.0.0.0] [--port 5000]
+
+/process-video, /detections, /replay and the /ws/video WebSocket (see
+video_protocol.py) are served natively on the event loop: each
+viewer is a coroutine that waits for the shared stream to publish and writes
+without blocking, so hundreds of idle or slow viewers do not need a thread
+each. Every other route is handed to the Flask app through a small WSGI
+bridge running in the thread pool, so the JSON / SSH routes behave exactly as
+under `python app.py` (streamed responses are forwarded chunk by chunk).
+Capture, inference and encoding stay on the per-stream pipeline threads in
+stream_hub.py (one set per source, not per viewer).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, WSMsgType, web
+from multidict import CIMultiDict
+
+import app as backend
+from delivery import limit_send_buffer
+from video_protocol import pack_frame
+
+# A viewer whose socket accepts nothing for this long is disconnected
+WRITE_TIMEOUT = float(os.environ.get("ASAR_ASYNC_WRITE_TIMEOUT", 30))
+# Threads for the WSGI bridge and blocking helpers (stream URL discovery)
+EXECUTOR_THREADS = int(os.environ.get("ASAR_ASYNC_THREADS", 16))
+
+# WebSocket ping interval; also detects dead clients between frames
+WS_HEARTBEAT = float(os.environ.get("ASAR_WS_HEARTBEAT", 15))
+
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+
+MJPEG_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+
+class StreamWaker:
+    """
+    Bridges one SourceStream to the event loop. The encode thread schedules a
+    single wake-up per published packet, which sets the event of every
+    asyncio viewer on that stream.
+    """
+    def __init__(self, loop, stream):
+        self.loop = loop
+        self.stream = stream
+        self.events = set()
+        # (seq, bytes) of the last MJPEG part, framed once for all viewers
+        self._part = (None, None)
+        stream.add_listener(self._on_packet)
+
+    def _on_packet(self, packet):
+        # Encode thread: never touch asyncio objects directly from here
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        for event in self.events:
+            event.set()
+
+    def mjpeg_part(self, packet):
+        seq, part = self._part
+        if seq != packet.seq:
+            part = MJPEG_PART_HEADER + packet.jpeg + b'\r\n'
+            self._part = (packet.seq, part)
+        return part
+
+    def close(self):
+        self.stream.remove_listener(self._on_packet)
+
+
+_wakers = {}
+
+
+class Viewer:
+    """One asyncio consumer of a SourceStream. next_packet() skips to the newest packet."""
+    def __init__(self, stream):
+        self.stream = stream
+        waker = _wakers.get(stream)
+        if waker is None:
+            waker = _wakers[stream] = StreamWaker(asyncio.get_running_loop(), stream)
+        self.waker = waker
+        self.event = asyncio.Event()
+        waker.events.add(self.event)
+        self.last_seq = None
+
+    def _fresh(self):
+        packet = self.stream.latest
+        if packet is not None and packet.seq != self.last_seq:
+            return packet
+        return None
+
+    async def next_packet(self, timeout=5.0):
+        """Newest packet not yet seen, or None once the stream has finished."""
+        while True:
+            packet = self._fresh()
+            if packet is not None:
+                self.last_seq = packet.seq
+                return packet
+            if self.stream.finished:
+                return None
+            self.event.clear()
+            # Re-check after clearing so a wake-up in between is not lost
+            if self._fresh() is not None or self.stream.finished:
+                continue
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def close(self):
+        self.waker.events.discard(self.event)
+        if not self.waker.events:
+            self.waker.close()
+            if _wakers.get(self.stream) is self.waker:
+                del _wakers[self.stream]
+
+
+async def _subscribe(request, video):
+    url = request.query.get('url')
+    target_address = backend.steering_target(url, request.query)
+    # Page fetch for stream discovery blocks; keep it off the loop
+    source_url = await asyncio.get_running_loop().run_in_executor(None, backend.resolve_stream_url, url)
+    return backend.stream_hub.subscribe(source_url, target_address, video=video)
+
+
+async def _write(response, data):
+    await asyncio.wait_for(response.write(data), WRITE_TIMEOUT)
+
+
+# --- Relaying to the worker that owns a stream (serve.py, see app.stream_owner) ---
+_relay_session = None
+
+
+async def _owner(request):
+    """Internal base URL of the worker owning the request's stream, or None if this worker does."""
+    if len(backend.STREAM_PEERS) < 2:
+        return None
+    source_url = await asyncio.get_running_loop().run_in_executor(
+        None, backend.resolve_stream_url, request.query['url'])
+    return backend.stream_owner(source_url, bool(request.headers.get(backend.RELAYED_HEADER)))
+
+
+def _peer_session():
+    global _relay_session
+    if _relay_session is None:
+        # No total timeout: relayed streams are endless
+        _relay_session = ClientSession(timeout=ClientTimeout(total=None, sock_connect=5))
+    return _relay_session
+
+
+async def relay_http(request, peer):
+    """Stream the owner's response for this request back to the client."""
+    try:
+        upstream = await _peer_session().get(peer + request.raw_path, headers={backend.RELAYED_HEADER: '1'})
+    except (ConnectionError, asyncio.TimeoutError, ClientError) as e:
+        print(f"Stream owner {peer} unreachable: {e}")
+        return web.json_response({"error": "Stream owner unavailable"}, status=503, headers=CORS_HEADERS)
+    async with upstream:
+        response = web.StreamResponse(status=upstream.status, headers=dict(CORS_HEADERS, **{
+            'Content-Type': upstream.headers.get('Content-Type', 'application/octet-stream'),
+            'Cache-Control': upstream.headers.get('Cache-Control', 'no-cache')}))
+        try:
+            await response.prepare(request)
+            async for chunk in upstream.content.iter_any():
+                await _write(response, chunk)
+        except (ConnectionError, asyncio.TimeoutError, ClientError):
+            pass
+    return response
+
+
+async def relay_ws(request, peer):
+    """Pass WebSocket messages both ways between the client and the owner."""
+    ws = web.WebSocketResponse(heartbeat=WS_HEARTBEAT)
+    await ws.prepare(request)
+    try:
+        async with _peer_session().ws_connect(peer + request.raw_path,
+                                              headers={backend.RELAYED_HEADER: '1'}) as upstream:
+            async def pump(source, sink):
+                async for msg in source:
+                    if msg.type == WSMsgType.BINARY:
+                        await asyncio.wait_for(sink.send_bytes(msg.data), WRITE_TIMEOUT)
+                    elif msg.type == WSMsgType.TEXT:
+                        await sink.send_str(msg.data)
+                    else:
+                        break
+
+            pumps = [asyncio.ensure_future(pump(upstream, ws)), asyncio.ensure_future(pump(ws, upstream))]
+            # Either side closing ends the relay
+            _, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+    except (ConnectionError, asyncio.TimeoutError, ClientError):
+        pass
+    finally:
+        await ws.close()
+    return ws
+
+
+async def process_video(request):
+    if not request.query.get('url'):
+        return web.Response(text="Missing URL", status=400, headers=CORS_HEADERS)
+    peer = await _owner(request)
+    if peer is not None:
+        return await relay_http(request, peer)
+
+    subscription = await _subscribe(request, video=True)
+    viewer = Viewer(subscription.stream)
+    adaptive = backend.ADAPTIVE_DELIVERY and request.query.get('adaptive') != '0'
+    client = backend.make_adaptive_client(subscription.stream) if adaptive else None
+    loop = asyncio.get_running_loop()
+    if client is not None and request.transport is not None:
+        limit_send_buffer(request.transport.get_extra_info('socket'), backend.SEND_BUFFER_KB * 1024)
+    response = web.StreamResponse(headers=dict(CORS_HEADERS, **{
+        'Content-Type': 'multipart/x-mixed-replace; boundary=frame'}))
+    try:
+        await response.prepare(request)
+        while True:
+            packet = await viewer.next_packet()
+            if packet is None:
+                break
+            # Packets produced while only detection consumers were attached carry no JPEG
+            if packet.jpeg is None:
+                continue
+            if client is None or client.level == 0:
+                part = viewer.waker.mjpeg_part(packet)
+            elif client.wants():
+                # Re-encoding is CPU work; keep it off the loop
+                jpeg = await loop.run_in_executor(None, client.render, packet)
+                if jpeg is None:
+                    continue
+                part = MJPEG_PART_HEADER + jpeg + b'\r\n'
+            else:
+                continue
+            start = time.perf_counter()
+            await _write(response, part)
+            if client is not None:
+                client.record_send(len(part), time.perf_counter() - start)
+    except (ConnectionError, asyncio.TimeoutError):
+        pass
+    finally:
+        # Runs on stream end, client disconnect and write timeout
+        viewer.close()
+        subscription.close()
+    return response
+
+
+async def detections(request):
+    if not request.query.get('url'):
+        return web.Response(text="Missing URL", status=400, headers=CORS_HEADERS)
+    fmt = request.query.get('format', 'sse')
+    if fmt not in ('sse', 'ndjson'):
+        return web.Response(text="format must be sse or ndjson", status=400, headers=CORS_HEADERS)
+    peer = await _owner(request)
+    if peer is not None:
+        return await relay_http(request, peer)
+
+    subscription = await _subscribe(request, video=False)
+    viewer = Viewer(subscription.stream)
+    response = web.StreamResponse(headers=dict(CORS_HEADERS, **{
+        'Content-Type': 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson',
+        'Cache-Control': 'no-cache'}))
+    try:
+        await response.prepare(request)
+        while True:
+            packet = await viewer.next_packet()
+            if packet is None:
+                break
+            await _write(response, backend.format_detection_record(packet, fmt).encode())
+    except (ConnectionError, asyncio.TimeoutError):
+        pass
+    finally:
+        viewer.close()
+        subscription.close()
+    return response
+
+
+async def video_socket(request):
+    """
+    Binary WebSocket video: one video_protocol frame per message (header,
+    detection record, JPEG). The client acks each frame with {"ack": seq};
+    at most ?window= (default 1) frames are unacknowledged at a time, and
+    when the client is behind it gets the newest frame, never a backlog.
+    """
+    if not request.query.get('url'):
+        return web.Response(text="Missing URL", status=400, headers=CORS_HEADERS)
+    try:
+        window = max(1, int(request.query.get('window', 1)))
+    except ValueError:
+        return web.Response(text="window must be an integer", status=400, headers=CORS_HEADERS)
+    peer = await _owner(request)
+    if peer is not None:
+        return await relay_ws(request, peer)
+
+    ws = web.WebSocketResponse(heartbeat=WS_HEARTBEAT)
+    await ws.prepare(request)
+    subscription = await _subscribe(request, video=True)
+    viewer = Viewer(subscription.stream)
+    inflight = set()
+    acked = asyncio.Event()
+
+    async def read_acks():
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                try:
+                    seq = int(json.loads(msg.data)["ack"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                # An ack covers every earlier frame too
+                inflight.difference_update([s for s in inflight if s <= seq])
+                acked.set()
+            elif msg.type == WSMsgType.ERROR:
+                break
+
+    reader = asyncio.ensure_future(read_acks())
+    try:
+        while not ws.closed and not reader.done():
+            while len(inflight) >= window and not reader.done():
+                acked.clear()
+                waiter = asyncio.ensure_future(acked.wait())
+                done, _ = await asyncio.wait([reader, waiter], timeout=WRITE_TIMEOUT,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not done:
+                    # A client that stops acking is disconnected like a stalled socket
+                    raise asyncio.TimeoutError
+            if reader.done():
+                break
+            # Fetched after the wait, so a lagging client gets the newest frame
+            packet = await viewer.next_packet()
+            if packet is None:
+                break
+            if packet.jpeg is None:
+                continue
+            inflight.add(packet.seq)
+            await _write_ws(ws, pack_frame(packet, packet.jpeg))
+    except (ConnectionError, asyncio.TimeoutError):
+        pass
+    finally:
+        reader.cancel()
+        viewer.close()
+        subscription.close()
+        await ws.close()
+    return ws
+
+
+async def replay(request):
+    """/replay paced on the loop: only the segment reads go to the executor."""
+    sid = request.query.get('stream')
+    if not backend.recordings or not sid:
+        return web.Response(text="Missing stream (or recording disabled)", status=400, headers=CORS_HEADERS)
+    try:
+        start = float(request.query.get('t', 0))
+        speed = float(request.query.get('speed', 1.0))
+    except ValueError:
+        return web.Response(text="t and speed must be numbers", status=400, headers=CORS_HEADERS)
+
+    loop = asyncio.get_running_loop()
+    frames = backend.recordings.frames(sid, start)
+    response = web.StreamResponse(headers=dict(CORS_HEADERS, **{
+        'Content-Type': 'multipart/x-mixed-replace; boundary=frame'}))
+    first_ts = None
+    clock = loop.time()
+    try:
+        await response.prepare(request)
+        while True:
+            record = await loop.run_in_executor(None, next, frames, None)
+            if record is None:
+                break
+            ts, jpeg = record
+            if first_ts is None:
+                first_ts = ts
+            elif speed > 0:
+                # Keep the recorded pacing
+                delay = (ts - first_ts) / speed - (loop.time() - clock)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await _write(response, MJPEG_PART_HEADER + jpeg + b'\r\n')
+    except (ConnectionError, asyncio.TimeoutError):
+        pass
+    finally:
+        await loop.run_in_executor(None, close_iterable, frames)
+    return response
+
+
+async def _write_ws(ws, data):
+    await asyncio.wait_for(ws.send_bytes(data), WRITE_TIMEOUT)
+
+
+# --- WSGI bridge for every other route ---
+def wsgi_environ(request, body):
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        # PEP 3333: the path is passed as latin-1 decoded bytes
+        'PATH_INFO': request.path.encode('utf-8').decode('latin-1'),
+        # As sent: request.query_string is percent-decoded, which breaks escaped & = % in values
+        'QUERY_STRING': request.raw_path.partition('?')[2],
+        'SERVER_NAME': request.url.host or 'localhost',
+        'SERVER_PORT': str(request.url.port or 80),
+        'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+        'REMOTE_ADDR': request.remote or '',
+        'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name in set(request.headers.keys()):
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            environ[key] = ','.join(request.headers.getall(name))
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    """
+    Start a WSGI app. Returns (status code, headers, body, result): a
+    response with a Content-Length is read to completion (result is None),
+    any other is streamed, and body is only what was written before it.
+    """
+    started = {}
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = status
+        started['headers'] = headers
+        return chunks.append
+
+    result = wsgi_app(environ, start_response)
+    status, headers = int(started['status'].split(' ', 1)[0]), started['headers']
+    if not any(k.lower() == 'content-length' for k, _ in headers):
+        return status, headers, b''.join(chunks), result
+    try:
+        for chunk in result:
+            chunks.append(chunk)
+    finally:
+        close_iterable(result)
+    return status, headers, b''.join(chunks), None
+
+
+def close_iterable(iterable):
+    if hasattr(iterable, 'close'):
+        try:
+            iterable.close()
+        except ValueError:
+            # Generator still running in another thread (handler cancelled mid-chunk)
+            pass
+
+
+async def wsgi_handler(request):
+    body = await request.read()
+    environ = wsgi_environ(request, body)
+    loop = asyncio.get_running_loop()
+    status, headers, payload, result = await loop.run_in_executor(None, call_wsgi, backend.app.wsgi_app, environ)
+    headers = CIMultiDict((k, v) for k, v in headers if k.lower() != 'content-length')
+    if result is None:
+        return web.Response(status=status, body=payload, headers=headers)
+
+    # Streamed (MJPEG, SSE): one executor hop per chunk, so no thread is held between chunks
+    response = web.StreamResponse(status=status, headers=headers)
+    chunks = iter(result)
+    try:
+        await response.prepare(request)
+        if payload:
+            await _write(response, payload)
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await _write(response, chunk)
+    except (ConnectionError, asyncio.TimeoutError):
+        pass
+    finally:
+        # Runs the app's close hooks (Flask call_on_close, generator finally blocks)
+        await loop.run_in_executor(None, close_iterable, result)
+    return response
+
+
+def make_app():
+    application = web.Application()
+    application.router.add_get('/process-video', process_video)
+    application.router.add_get('/detections', detections)
+    application.router.add_get('/ws/video', video_socket)
+    application.router.add_get('/replay', replay)
+    application.router.add_route('*', '/{tail:.*}', wsgi_handler)
+
+    async def use_executor(application):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=EXECUTOR_THREADS))
+    application.on_startup.append(use_executor)
+
+    async def close_relay_session(application):
+        global _relay_session
+        if _relay_session is not None:
+            await _relay_session.close()
+            _relay_session = None
+    application.on_cleanup.append(close_relay_session)
+    return application
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the backend with asyncio streaming endpoints")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args(argv)
+    web.run_app(make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,20 @@
 import cv2
-import numpy as np
-from PIL import Image
 import time
 from threading import Thread
-import tensorflow as tf
 import requests
 
+from detector import DetectorSession
+from postprocess import PostProcessor
+
 # ====================== CONFIGURATION ======================
 # Initial speed (0.0 to 1.0) - kept for reference logic
 speed = 0.7 
 
 # Detection settings
-# Stream setup
-IP_ADDRESS = input("Enter IP Address of Raspberry Pi : ")
-BASE_URL = f"http://{IP_ADDRESS}:5000"
-STREAM_URL = f"http://{IP_ADDRESS}:5000/video"
-print(f"Connecting to video stream at: {STREAM_URL}")
+# Stream setup (filled in by connect() so the module can be imported, e.g. by the benchmarks)
+IP_ADDRESS = None
+BASE_URL = None
+STREAM_URL = None
 
 # Initialize persistent session
 session = requests.Session()
@@ -48,9 +47,18 @@ class VideoStream:
         self.stopped = True
         self.stream.release()
 
-# Try to capture from URL using threaded stream
-# cap = cv2.VideoCapture(STREAM_URL)  # OLD: Blocking
-cap = VideoStream(STREAM_URL).start()
+cap = None
+
+def connect():
+    global IP_ADDRESS, BASE_URL, STREAM_URL, cap
+    IP_ADDRESS = input("Enter IP Address of Raspberry Pi : ")
+    BASE_URL = f"http://{IP_ADDRESS}:5000"
+    STREAM_URL = f"http://{IP_ADDRESS}:5000/video"
+    print(f"Connecting to video stream at: {STREAM_URL}")
+
+    # Try to capture from URL using threaded stream
+    # cap = cv2.VideoCapture(STREAM_URL)  # OLD: Blocking
+    cap = VideoStream(STREAM_URL).start()
 
 threshold = 0.5  # Increased slightly for better accuracy
 top_k = 5
@@ -122,143 +130,57 @@ def print_action(action, details=""):
 def load_model(model_dir, model_file, label_file):
     model_path = f"{model_dir}/{model_file}"
     label_path = f"{model_dir}/{label_file}"
-    
-    try:
-        # Use simple file reading for labels
-        with open(label_path, 'r') as f:
-            labels = {i: line.strip() for i, line in enumerate(f.readlines())}
-            
-        # Initialize Interpreter
-        interpreter = tf.lite.Interpreter(model_path=model_path)
-        interpreter.allocate_tensors()
-        
-        return interpreter, labels
-    except Exception as e:
-        print(f"Error loading model/labels: {e}")
+
+    # Shared with the Flask backend: metadata and input buffer are set up once
+    detector = DetectorSession.load(model_path, label_path)
+    if not detector:
         return None, None
 
-def set_input(interpreter, image):
-    input_details = interpreter.get_input_details()[0]
-    height = input_details['shape'][1]
-    width = input_details['shape'][2]
-    
-    resized_image = image.resize((width, height), Image.Resampling.LANCZOS)
-    input_data = np.expand_dims(np.array(resized_image), axis=0)
-    
-    # Check if model expects INT8 or FLOAT32
-    if input_details['dtype'] == np.uint8:
-        input_data = input_data.astype(np.uint8)
-    else:
-        # Normalize to [0,1] if float model
-        input_data = (input_data / 255.0).astype(np.float32)
-    
-    interpreter.set_tensor(input_details['index'], input_data)
+    # Person class ids are resolved from the label file once, not per box
+    postprocessor = PostProcessor(detector.labels, ('person',), score_threshold=threshold, top_k=top_k)
+    return detector, postprocessor
 
-def get_output(interpreter, score_threshold, top_k):
-    output_details = interpreter.get_output_details()
-    
-    boxes = interpreter.get_tensor(output_details[0]['index'])[0]
-    classes = interpreter.get_tensor(output_details[1]['index'])[0]
-    scores = interpreter.get_tensor(output_details[2]['index'])[0]
-    # Check if num_detections is available (index 3), otherwise ignore
-    # num_detections = int(interpreter.get_tensor(output_details[3]['index'])[0])
-    
-    detections = []
-    for i in range(len(scores)):
-        if scores[i] > score_threshold:
-            detections.append({
-                'bbox': boxes[i],
-                'class': int(classes[i]),
-                'score': scores[i]
-            })
-            if len(detections) >= top_k:
-                break
-    return detections
-
-def draw_boxes(frame, detections, labels):
-    height, width = frame.shape[:2]
-    person_count = 0
-    
-    for detection in detections:
-        class_id = detection['class']
-        # Class ID 0 is usually "person" in COCO models
-        # Also check label text just in case
-        label_text = labels.get(class_id, "Unknown").lower()
-        if class_id != 0 and "person" not in label_text: 
-            continue
-        
-        person_count += 1
-        ymin, xmin, ymax, xmax = detection['bbox']
-        xmin = int(xmin * width)
-        xmax = int(xmax * width)
-        ymin = int(ymin * height)
-        ymax = int(ymax * height)
-        
+def set_input(detector, frame):
+    # Resize + BGR->RGB straight into the detector's preallocated input tensor
+    detector.set_input(frame)
+
+def get_output(detector, postprocessor, frame_height, frame_width):
+    # Threshold, person mask, top-k, pixel boxes, areas and deviation in one pass
+    boxes, classes, scores = detector.get_output()
+    return postprocessor(boxes, classes, scores, frame_width, frame_height)
+
+def draw_boxes(frame, detections):
+    for det in detections:
+        xmin, ymin, xmax, ymax = int(det['left']), int(det['top']), int(det['right']), int(det['bottom'])
         cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
-        text = f"Person: {detection['score']:.2f}"
+        text = f"Person: {det['score']:.2f}"
         cv2.putText(frame, text, (xmin, ymin - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-    
+
+    person_count = len(detections)
     detection_text = f"Persons: {person_count}"
     cv2.putText(frame, detection_text, (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-    
+
     return person_count
 
 # ====================== LOGIC & TRACKING ======================
-def track_object(detections, labels, frame_height, frame_width):
-    global x_deviation, y_max, tolerance, bbox_area, frame_area
-    
+def track_object(detections, frame_height, frame_width):
+    global x_deviation, y_max, bbox_area, frame_area
+
     frame_area = frame_height * frame_width
-    
+
     if len(detections) == 0:
-        print_action("STOP", "No detections")
+        print_action("STOP", "No person found")
         return
-    
-    # Find the largest person
-    target_person = None
-    max_area = 0
 
-    for detection in detections:
-        class_id = detection['class']
-        label_text = labels.get(class_id, "Unknown").lower()
-        
-        if class_id == 0 or "person" in label_text: # Person
-            ymin, xmin, ymax, xmax = detection['bbox']
-            
-            # Calculate area to track the closest person
-            w = (xmax - xmin) * frame_width
-            h = (ymax - ymin) * frame_height
-            area = w * h
-            
-            if area > max_area:
-                max_area = area
-                target_person = detection
+    # Track the largest (closest) person
+    target_person = detections[detections['area'].argmax()]
+
+    bbox_area = float(target_person['area'])
+    # Center point deviation (-0.5 to 0.5), computed by the post-processor
+    x_deviation = round(float(target_person['x_deviation']), 3)
+    y_max = round(float(target_person['ymax']), 3)
 
-    if target_person is None:
-        print_action("STOP", "No person found")
-        return
-    
-    # Process the target person
-    ymin, xmin, ymax, xmax = target_person['bbox']
-    
-    # Convert to pixel values
-    xmin_px = int(xmin * frame_width)
-    xmax_px = int(xmax * frame_width)
-    ymin_px = int(ymin * frame_height)
-    ymax_px = int(ymax * frame_height)
-    
-    # Calculate bounding box area
-    bbox_width = xmax_px - xmin_px
-    bbox_height = ymax_px - ymin_px
-    bbox_area = bbox_width * bbox_height
-    
-    # Calculate center point deviation (-0.5 to 0.5)
-    # xmin, xmax are normalized [0,1]
-    x_center = xmin + ((xmax - xmin) / 2)
-    x_deviation = round(0.5 - x_center, 3)
-    y_max = round(ymax, 3)
-    
     # Run logic (directly, no separate thread needed for print-only if fast enough)
-    # Using thread to mimic original structure if preferred, but simple call is fine here.
     move_robot()
 
 def move_robot():
@@ -304,8 +226,10 @@ def search_mode():
 def main():
     global no_person_start_time, cap
     
-    interpreter, labels = load_model(model_dir, model_file, label_file)
-    if not interpreter:
+    connect()
+
+    detector, postprocessor = load_model(model_dir, model_file, label_file)
+    if not detector:
         print("Failed to load model. Exiting.")
         return
 
@@ -333,25 +257,18 @@ def main():
         
         frame_height, frame_width = frame.shape[:2]
         
-        # Prepare Input
-        # cv2 reads in BGR, TFLite needs RGB
-        cv2_im = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        try:
-            pil_im = Image.fromarray(cv2_im)
-        except Exception:
-            continue
-        
-        set_input(interpreter, pil_im)
-        interpreter.invoke()
-        detections = get_output(interpreter, score_threshold=threshold, top_k=top_k)
+        # Prepare Input (colour conversion happens inside the detector)
+        set_input(detector, frame)
+        detector.invoke()
+        detections = get_output(detector, postprocessor, frame_height, frame_width)
         
         # Draw and Count
-        person_count = draw_boxes(frame, detections, labels)
+        person_count = draw_boxes(frame, detections)
         
         # Logic
         if person_count > 0:
             no_person_start_time = None # Reset timer
-            track_object(detections, labels, frame_height, frame_width)
+            track_object(detections, frame_height, frame_width)
         else:
             if no_person_start_time is None:
                 no_person_start_time = time.time()
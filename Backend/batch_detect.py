@@ -0,0 +1,296 @@
+"""
+Offline detection over directories of videos and images.
+
+    python batch_detect.py INPUT [INPUT ...] --out results/ [--workers N]
+                           [--format jsonl|npz|parquet] [--chunk-frames N] [--stride N]
+
+Runs the same detection path as the server (app.run_detector + app.find_targets)
+at full machine speed: a process pool with one interpreter per worker, videos
+decoded frame by frame, never loaded whole. Every unit of work (an image
+group, a video, or a frame range of a video with --chunk-frames) writes its
+own part file atomically under OUT/parts, so rerunning the same command after
+an interruption skips finished units. The parts are merged into
+OUT/detections.<format> at the end.
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import multiprocessing
+import sys
+import time
+
+import cv2
+import numpy as np
+
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv', '.mjpeg', '.mjpg', '.h264', '.webm')
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+IMAGES_PER_UNIT = 64
+
+# Columnar output: one row per detection
+COLUMNS = ('source', 'frame', 'ts', 'class_id', 'score', 'ymin', 'xmin', 'ymax', 'xmax')
+
+
+# --- Planning (parent process) ---
+def find_inputs(paths):
+    videos, images = [], []
+    for path in paths:
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = sorted(os.path.join(d, f) for d, _, names in os.walk(path) for f in names)
+        for f in files:
+            ext = os.path.splitext(f)[1].lower()
+            if ext in VIDEO_EXTS:
+                videos.append(f)
+            elif ext in IMAGE_EXTS:
+                images.append(f)
+    return videos, images
+
+
+def unit_key(kind, files, start=0, end=None, stride=1):
+    """Stable id for a unit; changes with any input file or the stride, so stale parts are not reused."""
+    h = hashlib.sha1(f"{kind}:{start}:{end}:{stride}".encode())
+    for f in files:
+        st = os.stat(f)
+        h.update(f"{os.path.abspath(f)}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+
+def plan_units(videos, images, chunk_frames, stride=1):
+    units = []
+    for video in videos:
+        if chunk_frames:
+            cap = cv2.VideoCapture(video)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+        else:
+            total = 0
+        if total > chunk_frames > 0:
+            for start in range(0, total, chunk_frames):
+                end = min(start + chunk_frames, total)
+                units.append(('video', [video], start, end, unit_key('video', [video], start, end, stride)))
+        else:
+            units.append(('video', [video], 0, None, unit_key('video', [video], stride=stride)))
+    for i in range(0, len(images), IMAGES_PER_UNIT):
+        group = images[i:i + IMAGES_PER_UNIT]
+        units.append(('images', group, 0, None, unit_key('images', group)))
+    return units
+
+
+# --- Workers ---
+_app = None
+
+
+def worker_environ(threads):
+    """Backend settings for a worker: one interpreter, no cross-stream batching."""
+    os.environ["ASAR_POOL_SIZE"] = "1"
+    os.environ["ASAR_BATCH_SIZE"] = "1"
+    os.environ["ASAR_INTERPRETER_THREADS"] = str(threads)
+
+
+def init_worker(threads):
+    """
+    Import the backend once per worker with a single interpreter. main()
+    has already loaded the model once; a worker that still cannot is
+    reported by process_unit() rather than raised here, where Pool would
+    respawn it forever.
+    """
+    global _app
+    worker_environ(threads)
+    import app
+    if app.ensure_model():
+        _app = app
+    else:
+        print(f"Worker {os.getpid()}: could not load model {app.MODEL_PATH}")
+
+
+def detect(frame):
+    if _app is None:
+        raise RuntimeError("Model not loaded in this worker")
+    return _app.find_targets(frame, *_app.run_detector(frame))
+
+
+def video_frames(path, start, end, stride):
+    """
+    (index, ts, frame) for every stride-th frame in [start, end) of a video,
+    decoded one at a time. The stride counts from frame 0, not from start, so
+    the sampled frames do not depend on --chunk-frames.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"Failed to open {path}")
+        return
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while end is None or index < end:
+            if not cap.grab():
+                break
+            if index % stride == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    # From the index: CAP_PROP_POS_MSEC after a grab is already the next frame's position
+                    yield index, index / fps if fps > 0 else None, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def image_frames(paths):
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            print(f"Failed to read {path}")
+            continue
+        yield path, 0, None, frame
+
+
+def unit_frames(kind, files, start, end, stride):
+    """(source, frame index, ts, frame) for one unit."""
+    if kind == 'images':
+        yield from image_frames(files)
+    else:
+        for index, ts, frame in video_frames(files[0], start, end, stride):
+            yield files[0], index, ts, frame
+
+
+def process_unit(args):
+    (kind, files, start, end, key), out_dir, fmt, stride = args
+    started = time.perf_counter()
+    records = []
+    for source, index, ts, frame in unit_frames(kind, files, start, end, stride):
+        records.append((source, index, ts, detect(frame)))
+    write_part(os.path.join(out_dir, 'parts'), key, fmt, records)
+    return key, len(records), time.perf_counter() - started
+
+
+# --- Output ---
+def write_part(parts_dir, key, fmt, records):
+    """Write one unit's results to parts/<key>.<ext> via a temp file, so a part exists only when complete."""
+    ext = 'jsonl' if fmt == 'jsonl' else 'npz'
+    final = os.path.join(parts_dir, f"{key}.{ext}")
+    tmp = final + '.tmp'
+    if fmt == 'jsonl':
+        with open(tmp, 'w') as f:
+            for source, index, ts, dets in records:
+                f.write(json.dumps({
+                    "source": source,
+                    "frame": index,
+                    "ts": None if ts is None else round(ts, 3),
+                    "boxes": [[round(float(v), 4) for v in (d['ymin'], d['xmin'], d['ymax'], d['xmax'])]
+                              for d in dets],
+                    "scores": [round(float(v), 3) for v in dets['score']],
+                    "persons": len(dets),
+                }, separators=(',', ':')) + "\n")
+    else:
+        counts = [len(dets) for _, _, _, dets in records]
+        dets = np.concatenate([d for _, _, _, d in records]) if records else None
+        columns = {
+            "source": np.repeat(np.array([r[0] for r in records], dtype=str), counts),
+            "frame": np.repeat(np.array([r[1] for r in records], dtype=np.int64), counts),
+            "ts": np.repeat(np.array([np.nan if r[2] is None else r[2] for r in records], dtype=np.float64),
+                            counts),
+        }
+        for name in COLUMNS[3:]:
+            columns[name] = dets[name] if dets is not None else np.empty(0, dtype=np.float32)
+        columns["frames_processed"] = np.array([len(records)])
+        with open(tmp, 'wb') as f:
+            np.savez(f, **columns)
+    os.replace(tmp, final)
+
+
+def merge_parts(out_dir, fmt, keys):
+    """Combine the part files of this run, in plan order, into OUT/detections.<fmt>."""
+    parts_dir = os.path.join(out_dir, 'parts')
+    if fmt == 'jsonl':
+        path = os.path.join(out_dir, 'detections.jsonl')
+        with open(path, 'wb') as out:
+            for key in keys:
+                with open(os.path.join(parts_dir, f"{key}.jsonl"), 'rb') as f:
+                    out.write(f.read())
+        return path
+
+    columns = {name: [] for name in COLUMNS}
+    for key in keys:
+        with np.load(os.path.join(parts_dir, f"{key}.npz")) as part:
+            for name in COLUMNS:
+                columns[name].append(part[name])
+    columns = {name: np.concatenate(values) if values else np.empty(0) for name, values in columns.items()}
+
+    if fmt == 'parquet':
+        # Optional dependency, only needed for this output format
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        path = os.path.join(out_dir, 'detections.parquet')
+        pq.write_table(pa.table(columns), path)
+    else:
+        path = os.path.join(out_dir, 'detections.npz')
+        np.savez(path, **columns)
+    return path
+
+
+def part_exists(out_dir, fmt, key):
+    ext = 'jsonl' if fmt == 'jsonl' else 'npz'
+    return os.path.exists(os.path.join(out_dir, 'parts', f"{key}.{ext}"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch person detection over video / image directories")
+    parser.add_argument('inputs', nargs='+', help="Video / image files or directories (searched recursively)")
+    parser.add_argument('--out', required=True, help="Output directory (reuse it to resume)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=1, help="Interpreter threads per worker")
+    parser.add_argument('--format', choices=('jsonl', 'npz', 'parquet'), default='jsonl')
+    parser.add_argument('--chunk-frames', type=int, default=0,
+                        help="Split videos into ranges of this many frames so one long video uses several workers")
+    parser.add_argument('--stride', type=int, default=1, help="Process every Nth video frame")
+    args = parser.parse_args(argv)
+
+    if args.format == 'parquet':
+        if importlib.util.find_spec('pyarrow') is None:
+            parser.error("--format parquet needs pyarrow (pip install pyarrow), or use --format npz")
+
+    os.makedirs(os.path.join(args.out, 'parts'), exist_ok=True)
+    videos, images = find_inputs(args.inputs)
+    stride = max(1, args.stride)
+    units = plan_units(videos, images, args.chunk_frames, stride)
+    todo = [u for u in units if not part_exists(args.out, args.format, u[4])]
+    print(f"{len(videos)} videos, {len(images)} images -> {len(units)} units "
+          f"({len(units) - len(todo)} already done)")
+
+    started = time.perf_counter()
+    frames = 0
+    if todo:
+        # Fail fast here: a worker initializer that fails is respawned by Pool forever
+        worker_environ(args.threads)
+        import app
+        if not app.ensure_model():
+            print(f"Batch aborted: {app.model_state['error']}", file=sys.stderr)
+            return 1
+
+        jobs = [(unit, args.out, args.format, stride) for unit in todo]
+        # Spawned, not forked: this process now holds an interpreter, whose threads a fork would not copy
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(min(args.workers, len(todo)), initializer=init_worker, initargs=(args.threads,)) as pool:
+            try:
+                for done, (key, count, elapsed) in enumerate(pool.imap_unordered(process_unit, jobs), 1):
+                    frames += count
+                    print(f"[{done}/{len(todo)}] {key}: {count} frames in {elapsed:.1f}s")
+            except RuntimeError as e:
+                print(f"Batch failed: {e}", file=sys.stderr)
+                return 1
+
+    elapsed = time.perf_counter() - started
+    if frames:
+        print(f"Processed {frames} frames in {elapsed:.1f}s ({frames / elapsed:.1f} fps)")
+    path = merge_parts(args.out, args.format, [u[4] for u in units])
+    print(f"Detections written to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import time
+from collections import OrderedDict, deque
+from threading import Condition, Event, Lock, Thread, get_ident
+
+
+class _Request:
+    __slots__ = ('frame', 'done', 'result', 'error')
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class BatchScheduler:
+    """
+    Collects frames from all active streams and runs them through batch-N
+    interpreters from an InterpreterPool.
+
+    A worker waits up to max_wait seconds for a batch to fill, then takes
+    frames round-robin across streams (one frame per stream per pass), so a
+    busy stream cannot starve the others. Each caller blocks until its own
+    result is ready. Streams are identified by the calling thread unless a
+    key is given, which matches the one-inference-thread-per-stream pipeline.
+    If the model only runs batches of one, frames skip the queue and run on
+    the calling thread right away.
+    """
+    def __init__(self, pool, max_batch=4, max_wait=0.005):
+        self.pool = pool
+        self.max_wait = max_wait
+
+        # Resize every pooled interpreter; fall back to the size the model supports
+        for session in pool.sessions:
+            session.set_batch_size(max_batch)
+        self.max_batch = min(session.batch_size for session in pool.sessions)
+        if self.max_batch < max_batch:
+            print(f"Batching limited to {self.max_batch} frame(s) per invoke")
+
+        self._pending = OrderedDict()  # stream key -> deque of _Request
+        self._count = 0
+        self._cond = Condition()
+        self._stopped = False
+
+        # Updated from caller threads (direct dispatch) and workers alike
+        self._stats_lock = Lock()
+        self.batches = 0
+        self.frames = 0
+
+        # Nothing to batch at size 1: detect() dispatches directly, no workers needed
+        workers = pool.size if self.max_batch > 1 else 0
+        self._workers = [Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def detect(self, frame, key=None):
+        """Queue a frame and wait for its (boxes, classes, scores)."""
+        if self.max_batch == 1:
+            # Waiting max_wait for company would only add latency
+            result = self.pool.detect(frame)
+            self._count_batch(1)
+            return result
+        request = _Request(frame)
+        if key is None:
+            key = get_ident()
+        with self._cond:
+            self._pending.setdefault(key, deque()).append(request)
+            self._count += 1
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _count_batch(self, frames):
+        with self._stats_lock:
+            self.batches += 1
+            self.frames += frames
+
+    @property
+    def average_batch(self):
+        with self._stats_lock:
+            return self.frames / self.batches if self.batches else 0.0
+
+    def _take_batch(self):
+        """Pop up to max_batch requests, one per stream per round-robin pass."""
+        batch = []
+        while len(batch) < self.max_batch and self._count:
+            for key in list(self._pending):
+                queue = self._pending[key]
+                batch.append(queue.popleft())
+                self._count -= 1
+                # Served streams move to the back for the next batch
+                if queue:
+                    self._pending.move_to_end(key)
+                else:
+                    del self._pending[key]
+                if len(batch) >= self.max_batch:
+                    break
+        return batch
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._count or self._stopped)
+                if self._stopped:
+                    return
+                # Give other streams a short window to join this batch
+                deadline = time.perf_counter() + self.max_wait
+                while self._count < self.max_batch and not self._stopped:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            if not batch:
+                continue
+
+            try:
+                with self.pool.checkout() as session:
+                    results = session.detect_batch([request.frame for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                self._count_batch(len(batch))
+                for request in batch:
+                    request.done.set()
@@ -0,0 +1,8 @@
+"""
+Microbenchmarks for the detection hot path.
+
+Run from the Backend directory, no camera or model needed:
+
+    python -m bench.run --out bench_results.json
+    python -m bench.compare old.json new.json
+"""
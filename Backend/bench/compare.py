@@ -0,0 +1,75 @@
+"""
+Compare two bench.run result files and flag regressions.
+
+    python -m bench.compare baseline.json candidate.json [--threshold 0.15] [--min-delta-ms 0.05]
+
+A stage regresses when its p50 grows by more than `threshold` (relative)
+and by more than `min_delta_ms` (absolute, to ignore noise on tiny stages).
+Exits with status 1 if anything regressed.
+"""
+import argparse
+import json
+import sys
+
+
+def case_key(case):
+    return (case["path"], case["resolution"], case["persons"])
+
+
+def compare(baseline, candidate, threshold, min_delta_ms):
+    base_cases = {case_key(c): c for c in baseline["cases"]}
+    regressions = []
+    rows = []
+    for case in candidate["cases"]:
+        base = base_cases.get(case_key(case))
+        if base is None:
+            continue
+        stages = dict(case["stages"], total=case["total"])
+        base_stages = dict(base["stages"], total=base["total"])
+        for stage, stats in stages.items():
+            if stage not in base_stages:
+                continue
+            old = base_stages[stage]["p50_ms"]
+            new = stats["p50_ms"]
+            change = (new - old) / old if old else 0.0
+            regressed = change > threshold and (new - old) > min_delta_ms
+            rows.append((case_key(case), stage, old, new, change, regressed))
+            if regressed:
+                regressions.append((case_key(case), stage, old, new, change))
+
+        old_alloc, new_alloc = base["alloc_peak_bytes"], case["alloc_peak_bytes"]
+        if old_alloc and (new_alloc - old_alloc) / old_alloc > threshold:
+            regressions.append((case_key(case), "alloc_peak_bytes", old_alloc, new_alloc,
+                                (new_alloc - old_alloc) / old_alloc))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two bench.run result files")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.15)
+    parser.add_argument('--min-delta-ms', type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline {baseline['meta'].get('commit')}  ->  candidate {candidate['meta'].get('commit')}")
+    rows, regressions = compare(baseline, candidate, args.threshold, args.min_delta_ms)
+    for (path, resolution, persons), stage, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{path:<11} {resolution:<10} p={persons:<2} {stage:<12} "
+              f"{old:9.3f} -> {new:9.3f} ms  {change:+7.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
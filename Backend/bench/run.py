@@ -0,0 +1,194 @@
+"""
+Time each stage of the detection hot path with a stub interpreter.
+
+    python -m bench.run [--iterations 200] [--resolutions 320x240,640x480,1280x720]
+                        [--persons 0,1,5] [--paths app,autonomous] [--out results.json]
+
+Writes one JSON document: run metadata plus one case per
+(path, resolution, person count) with per-stage mean / p50 / p95 in ms and
+the peak bytes allocated while processing one frame.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from bench.stub import StubInterpreter, synthetic_frame
+from detector import DetectorSession
+from postprocess import PostProcessor
+
+LABELS_PATH = "models/coco_labels.txt"
+
+
+def load_labels():
+    try:
+        with open(LABELS_PATH, 'r') as f:
+            return [line.strip() for line in f.readlines()]
+    except OSError:
+        return []
+
+
+def app_stages(persons, labels):
+    """Stages of Backend/app.py's FrameProcessor path: preprocess, invoke, postprocess, draw, encode."""
+    import app
+
+    session = DetectorSession(StubInterpreter(persons=persons), labels)
+    app.postprocessor = PostProcessor(labels, app.TARGET_CLASSES, score_threshold=app.SCORE_THRESHOLD,
+                                      top_k=app.TOP_K, nms_iou=app.NMS_IOU)
+    state = {}
+
+    def preprocess(frame):
+        state['input'] = session.preprocess(frame)
+
+    def invoke(frame):
+        session.interpreter.set_tensor(session.input_index, state['input'])
+        session.invoke()
+
+    def postprocess(frame):
+        state['detections'] = app.find_targets(frame, *session.get_output())
+
+    def draw(frame):
+        app.draw_detections(frame, state['detections'])
+
+    def encode(frame):
+        cv2.imencode('.jpg', frame)
+
+    return [('preprocess', preprocess), ('invoke', invoke), ('postprocess', postprocess),
+            ('draw', draw), ('encode', encode)]
+
+
+def autonomous_stages(persons, labels):
+    """Stages of Backend/autonomous.py's main loop: set_input, invoke, get_output, draw_boxes."""
+    import autonomous
+
+    session = DetectorSession(StubInterpreter(persons=persons), labels)
+    postprocessor = PostProcessor(labels, ('person',), score_threshold=autonomous.threshold,
+                                  top_k=autonomous.top_k)
+    state = {}
+
+    def preprocess(frame):
+        autonomous.set_input(session, frame)
+
+    def invoke(frame):
+        session.invoke()
+
+    def postprocess(frame):
+        height, width = frame.shape[:2]
+        state['detections'] = autonomous.get_output(session, postprocessor, height, width)
+
+    def draw(frame):
+        autonomous.draw_boxes(frame, state['detections'])
+
+    return [('preprocess', preprocess), ('invoke', invoke), ('postprocess', postprocess), ('draw', draw)]
+
+
+PATHS = {'app': app_stages, 'autonomous': autonomous_stages}
+
+
+def summarise(samples):
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+    }
+
+
+def run_case(stages, frame, iterations, warmup):
+    timings = {name: [] for name, _ in stages}
+    totals = []
+    for i in range(warmup + iterations):
+        # Drawing modifies the frame; copying it is not part of any stage
+        work = frame.copy()
+        start = time.perf_counter()
+        stage_times = []
+        for name, fn in stages:
+            t0 = time.perf_counter()
+            fn(work)
+            stage_times.append((name, time.perf_counter() - t0))
+        total = time.perf_counter() - start
+        if i >= warmup:
+            for name, elapsed in stage_times:
+                timings[name].append(elapsed)
+            totals.append(total)
+
+    # Separate pass: tracemalloc slows everything down, so never mix it with timing
+    peaks = []
+    tracemalloc.start()
+    for _ in range(min(iterations, 50)):
+        work = frame.copy()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _, fn in stages:
+            fn(work)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        "stages": {name: summarise(samples) for name, samples in timings.items()},
+        "total": summarise(totals),
+        "alloc_peak_bytes": int(np.median(peaks)),
+    }
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detection hot-path microbenchmarks (stub interpreter)")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--resolutions', default="320x240,640x480,1280x720")
+    parser.add_argument('--persons', default="0,1,5")
+    parser.add_argument('--paths', default="app,autonomous")
+    parser.add_argument('--out', help="Write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    labels = load_labels()
+    resolutions = [tuple(int(v) for v in r.split('x')) for r in args.resolutions.split(',')]
+    person_counts = [int(p) for p in args.persons.split(',')]
+
+    cases = []
+    for path in args.paths.split(','):
+        for width, height in resolutions:
+            frame = synthetic_frame(width, height)
+            for persons in person_counts:
+                result = run_case(PATHS[path](persons, labels), frame, args.iterations, args.warmup)
+                result.update({"path": path, "resolution": f"{width}x{height}", "persons": persons})
+                cases.append(result)
+                print(f"{path:<11} {width}x{height:<5} persons={persons}  "
+                      f"total p50 {result['total']['p50_ms']:.3f} ms  "
+                      f"alloc {result['alloc_peak_bytes'] / 1024:.0f} KiB", file=sys.stderr)
+
+    results = {"meta": metadata(), "cases": cases}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}", file=sys.stderr)
+    else:
+        # Progress goes to stderr, so stdout holds only the JSON
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
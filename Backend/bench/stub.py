@@ -0,0 +1,103 @@
+import time
+
+import cv2
+import numpy as np
+
+# Same layout as mobilenet_ssd_v2_coco_quant_postprocess.tflite
+INPUT_SIZE = 300
+MAX_DETECTIONS = 10
+PERSON_CLASS = 0
+OTHER_CLASS = 2  # car
+
+
+class StubInterpreter:
+    """
+    Deterministic stand-in for tf.lite.Interpreter running an SSD detection
+    model. Exposes the same input/output details and returns fixed boxes:
+    `persons` person detections spread across the frame, then one
+    lower-scoring non-person, then zero-score padding. invoke() does no work
+    unless invoke_ms is set to mimic model latency.
+    """
+    def __init__(self, persons=1, dtype=np.uint8, max_detections=MAX_DETECTIONS, invoke_ms=0.0):
+        self.persons = persons
+        self.dtype = dtype
+        self.max_detections = max_detections
+        self.invoke_ms = invoke_ms
+        self.batch = 1
+        self.invocations = 0
+        self._input = None
+        self._build_outputs()
+
+    def _build_outputs(self):
+        n = self.max_detections
+        boxes = np.zeros((n, 4), dtype=np.float32)
+        classes = np.zeros(n, dtype=np.float32)
+        scores = np.zeros(n, dtype=np.float32)
+
+        persons = min(self.persons, n)
+        for i in range(persons):
+            # Evenly spaced, slightly overlapping boxes across the width
+            x0 = i / max(persons, 1) * 0.9
+            boxes[i] = (0.2, x0, 0.9, min(x0 + 0.2, 1.0))
+            classes[i] = PERSON_CLASS
+            scores[i] = 0.9 - 0.05 * i
+        if persons < n:
+            boxes[persons] = (0.5, 0.5, 0.7, 0.8)
+            classes[persons] = OTHER_CLASS
+            scores[persons] = 0.6
+
+        self._outputs = {
+            0: np.tile(boxes, (self.batch, 1, 1)),
+            1: np.tile(classes, (self.batch, 1)),
+            2: np.tile(scores, (self.batch, 1)),
+            3: np.full(self.batch, min(persons + 1, n), dtype=np.float32),
+        }
+
+    def allocate_tensors(self):
+        self._build_outputs()
+
+    def get_input_details(self):
+        return [{
+            'index': 100,
+            'shape': np.array([self.batch, INPUT_SIZE, INPUT_SIZE, 3], dtype=np.int32),
+            'dtype': self.dtype,
+        }]
+
+    def get_output_details(self):
+        n = self.max_detections
+        shapes = ([self.batch, n, 4], [self.batch, n], [self.batch, n], [self.batch])
+        return [{'index': i, 'shape': np.array(shape, dtype=np.int32), 'dtype': np.float32}
+                for i, shape in enumerate(shapes)]
+
+    def resize_tensor_input(self, index, shape):
+        self.batch = int(shape[0])
+
+    def set_tensor(self, index, value):
+        if value.shape[0] != self.batch or value.dtype != self.dtype:
+            raise ValueError(f"Bad input {value.shape} {value.dtype}")
+        # The real interpreter copies the input into its own tensor
+        if self._input is None or self._input.shape != value.shape:
+            self._input = np.empty_like(value)
+        np.copyto(self._input, value)
+
+    def invoke(self):
+        self.invocations += 1
+        if self.invoke_ms:
+            time.sleep(self.invoke_ms / 1000.0)
+
+    def get_tensor(self, index):
+        # The real interpreter returns a copy
+        return self._outputs[index].copy()
+
+
+def synthetic_frame(width, height, seed=0):
+    """Deterministic BGR frame with some texture, so JPEG encoding cost is realistic."""
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    # Smooth gradient background plus noise
+    frame[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)[None, :]
+    frame[..., 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    frame[..., 2] = 128
+    noise = rng.integers(0, 32, size=frame.shape, dtype=np.uint8)
+    cv2.add(frame, noise, dst=frame)
+    return frame
@@ -0,0 +1,194 @@
+import os
+
+DEFAULT_MODEL_PATH = "models/mobilenet_ssd_v2_coco_quant_postprocess.tflite"
+DEFAULT_LABELS_PATH = "models/coco_labels.txt"
+
+
+def _optional(env, name, parse):
+    """parse(value) of a set, non-empty variable, else None."""
+    value = env.get(name)
+    return parse(value) if value else None
+
+
+def _size(text):
+    """'3x2' -> (3, 2)"""
+    return tuple(int(v) for v in text.lower().split("x"))
+
+
+class Config:
+    """
+    Settings for one backend process: model and serving (paths, interpreter
+    pool, batching, warm-up) and the pipeline features (tracker, motion gate,
+    tiling, frame workers, recording, detection log, delivery, stream peers).
+    from_env() reads the ASAR_* variables and keyword arguments override
+    them; environ() turns a config back into variables, so forked or spawned
+    workers can rebuild the same config.
+    """
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, labels_path=DEFAULT_LABELS_PATH,
+                 interpreter_threads=1, pool_size=None, batch_size=1, batch_wait_ms=5.0,
+                 warmup=False, model_retry_interval=30.0,
+                 tracker=False, tracker_flow=True, target_fps=15.0, tracker_max_interval=8,
+                 motion_gate=False, motion_pixel_threshold=25, motion_area_threshold=0.01,
+                 motion_min_refresh=2.0, motion_roi=None,
+                 target_classes=("person",), score_threshold=0.3, nms_iou=None, top_k=None,
+                 tiles=None, tile_overlap=0.2, tile_budget_ms=60.0, tile_nms_iou=0.5,
+                 frame_workers=0, ring_slots=8, ring_max_size=(1280, 720),
+                 resolver_ttl=300.0, resolver_negative_ttl=10.0, steer_heartbeat=1.0, steer_max_rate=20.0,
+                 record_dir=None, record_annotated=True, record_segment_seconds=60.0, record_quota_mb=2048.0,
+                 adaptive_delivery=True, send_buffer_kb=256, detection_log_dir=None,
+                 stream_peers=(), worker_index=0):
+        self.model_path = model_path
+        self.labels_path = labels_path
+        self.interpreter_threads = max(1, int(interpreter_threads))
+        # Default: spread the interpreters across the available cores
+        if pool_size is None:
+            pool_size = max(1, (os.cpu_count() or 1) // self.interpreter_threads)
+        self.pool_size = max(1, int(pool_size))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait_ms = float(batch_wait_ms)
+        self.warmup = bool(warmup)
+        self.model_retry_interval = float(model_retry_interval)
+
+        self.tracker = bool(tracker)
+        self.tracker_flow = bool(tracker_flow)
+        self.target_fps = float(target_fps)
+        self.tracker_max_interval = int(tracker_max_interval)
+
+        self.motion_gate = bool(motion_gate)
+        self.motion_pixel_threshold = int(motion_pixel_threshold)
+        self.motion_area_threshold = float(motion_area_threshold)
+        self.motion_min_refresh = float(motion_min_refresh)
+        # (x0, y0, x1, y1) in 0..1, or None for the whole frame
+        self.motion_roi = tuple(motion_roi) if motion_roi else None
+
+        self.target_classes = list(target_classes)
+        self.score_threshold = float(score_threshold)
+        self.nms_iou = nms_iou
+        self.top_k = top_k
+
+        # (cols, rows), or None for full-frame detection only
+        self.tiles = tuple(tiles) if tiles else None
+        self.tile_overlap = float(tile_overlap)
+        self.tile_budget_ms = float(tile_budget_ms)
+        self.tile_nms_iou = float(tile_nms_iou)
+
+        self.frame_workers = max(0, int(frame_workers))
+        self.ring_slots = int(ring_slots)
+        # (width, height)
+        self.ring_max_size = tuple(ring_max_size)
+
+        self.resolver_ttl = float(resolver_ttl)
+        self.resolver_negative_ttl = float(resolver_negative_ttl)
+        self.steer_heartbeat = float(steer_heartbeat)
+        self.steer_max_rate = float(steer_max_rate)
+
+        self.record_dir = record_dir or None
+        self.record_annotated = bool(record_annotated)
+        self.record_segment_seconds = float(record_segment_seconds)
+        self.record_quota_mb = float(record_quota_mb)
+
+        self.adaptive_delivery = bool(adaptive_delivery)
+        self.send_buffer_kb = int(send_buffer_kb)
+        self.detection_log_dir = detection_log_dir or None
+
+        # Internal base URL of every pre-fork worker, in worker order
+        self.stream_peers = list(stream_peers)
+        self.worker_index = int(worker_index)
+
+    @classmethod
+    def from_env(cls, environ=None, **overrides):
+        env = os.environ if environ is None else environ
+        values = {
+            "model_path": env.get("ASAR_MODEL_PATH", DEFAULT_MODEL_PATH),
+            "labels_path": env.get("ASAR_LABELS_PATH", DEFAULT_LABELS_PATH),
+            "interpreter_threads": int(env.get("ASAR_INTERPRETER_THREADS", 1)),
+            "pool_size": _optional(env, "ASAR_POOL_SIZE", int),
+            "batch_size": int(env.get("ASAR_BATCH_SIZE", 1)),
+            "batch_wait_ms": float(env.get("ASAR_BATCH_WAIT_MS", 5)),
+            "warmup": env.get("ASAR_WARMUP", "0") == "1",
+            "model_retry_interval": float(env.get("ASAR_MODEL_RETRY_INTERVAL", 30)),
+            "tracker": env.get("ASAR_TRACKER", "0") == "1",
+            "tracker_flow": env.get("ASAR_TRACKER_FLOW", "1") == "1",
+            "target_fps": float(env.get("ASAR_TARGET_FPS", 15)),
+            "tracker_max_interval": int(env.get("ASAR_TRACKER_MAX_INTERVAL", 8)),
+            "motion_gate": env.get("ASAR_MOTION_GATE", "0") == "1",
+            "motion_pixel_threshold": int(env.get("ASAR_MOTION_PIXEL_THRESHOLD", 25)),
+            "motion_area_threshold": float(env.get("ASAR_MOTION_AREA_THRESHOLD", 0.01)),
+            "motion_min_refresh": float(env.get("ASAR_MOTION_MIN_REFRESH", 2.0)),
+            "motion_roi": _optional(env, "ASAR_MOTION_ROI", lambda v: tuple(float(x) for x in v.split(","))),
+            "target_classes": env.get("ASAR_TARGET_CLASSES", "person").split(","),
+            "score_threshold": float(env.get("ASAR_SCORE_THRESHOLD", 0.3)),
+            "nms_iou": _optional(env, "ASAR_NMS_IOU", float),
+            "top_k": _optional(env, "ASAR_TOP_K", int),
+            "tiles": _optional(env, "ASAR_TILES", _size),
+            "tile_overlap": float(env.get("ASAR_TILE_OVERLAP", 0.2)),
+            "tile_budget_ms": float(env.get("ASAR_TILE_BUDGET_MS", 60)),
+            "tile_nms_iou": float(env.get("ASAR_TILE_NMS_IOU", 0.5)),
+            "frame_workers": int(env.get("ASAR_FRAME_WORKERS", 0)),
+            "ring_slots": int(env.get("ASAR_RING_SLOTS", 8)),
+            "ring_max_size": _size(env.get("ASAR_RING_MAX_SIZE", "1280x720")),
+            "resolver_ttl": float(env.get("ASAR_RESOLVER_TTL", 300)),
+            "resolver_negative_ttl": float(env.get("ASAR_RESOLVER_NEGATIVE_TTL", 10)),
+            "steer_heartbeat": float(env.get("ASAR_STEER_HEARTBEAT", 1.0)),
+            "steer_max_rate": float(env.get("ASAR_STEER_MAX_RATE", 20)),
+            "record_dir": env.get("ASAR_RECORD_DIR"),
+            "record_annotated": env.get("ASAR_RECORD_MODE", "annotated") != "raw",
+            "record_segment_seconds": float(env.get("ASAR_RECORD_SEGMENT_SECONDS", 60)),
+            "record_quota_mb": float(env.get("ASAR_RECORD_QUOTA_MB", 2048)),
+            "adaptive_delivery": env.get("ASAR_ADAPTIVE_DELIVERY", "1") == "1",
+            "send_buffer_kb": int(env.get("ASAR_SEND_BUFFER_KB", 256)),
+            "detection_log_dir": env.get("ASAR_DETECTION_LOG_DIR"),
+            "stream_peers": [peer for peer in env.get("ASAR_STREAM_PEERS", "").split(",") if peer],
+            "worker_index": int(env.get("ASAR_WORKER_INDEX", 0)),
+        }
+        values.update((k, v) for k, v in overrides.items() if v is not None)
+        return cls(**values)
+
+    def environ(self):
+        return {
+            "ASAR_MODEL_PATH": self.model_path,
+            "ASAR_LABELS_PATH": self.labels_path,
+            "ASAR_INTERPRETER_THREADS": str(self.interpreter_threads),
+            "ASAR_POOL_SIZE": str(self.pool_size),
+            "ASAR_BATCH_SIZE": str(self.batch_size),
+            "ASAR_BATCH_WAIT_MS": str(self.batch_wait_ms),
+            "ASAR_WARMUP": "1" if self.warmup else "0",
+            "ASAR_MODEL_RETRY_INTERVAL": str(self.model_retry_interval),
+            "ASAR_TRACKER": "1" if self.tracker else "0",
+            "ASAR_TRACKER_FLOW": "1" if self.tracker_flow else "0",
+            "ASAR_TARGET_FPS": str(self.target_fps),
+            "ASAR_TRACKER_MAX_INTERVAL": str(self.tracker_max_interval),
+            "ASAR_MOTION_GATE": "1" if self.motion_gate else "0",
+            "ASAR_MOTION_PIXEL_THRESHOLD": str(self.motion_pixel_threshold),
+            "ASAR_MOTION_AREA_THRESHOLD": str(self.motion_area_threshold),
+            "ASAR_MOTION_MIN_REFRESH": str(self.motion_min_refresh),
+            "ASAR_MOTION_ROI": ",".join(str(v) for v in self.motion_roi) if self.motion_roi else "",
+            "ASAR_TARGET_CLASSES": ",".join(self.target_classes),
+            "ASAR_SCORE_THRESHOLD": str(self.score_threshold),
+            "ASAR_NMS_IOU": "" if self.nms_iou is None else str(self.nms_iou),
+            "ASAR_TOP_K": "" if self.top_k is None else str(self.top_k),
+            "ASAR_TILES": "x".join(str(v) for v in self.tiles) if self.tiles else "",
+            "ASAR_TILE_OVERLAP": str(self.tile_overlap),
+            "ASAR_TILE_BUDGET_MS": str(self.tile_budget_ms),
+            "ASAR_TILE_NMS_IOU": str(self.tile_nms_iou),
+            "ASAR_FRAME_WORKERS": str(self.frame_workers),
+            "ASAR_RING_SLOTS": str(self.ring_slots),
+            "ASAR_RING_MAX_SIZE": "x".join(str(v) for v in self.ring_max_size),
+            "ASAR_RESOLVER_TTL": str(self.resolver_ttl),
+            "ASAR_RESOLVER_NEGATIVE_TTL": str(self.resolver_negative_ttl),
+            "ASAR_STEER_HEARTBEAT": str(self.steer_heartbeat),
+            "ASAR_STEER_MAX_RATE": str(self.steer_max_rate),
+            # Empty = unset (off)
+            "ASAR_RECORD_DIR": self.record_dir or "",
+            "ASAR_RECORD_MODE": "annotated" if self.record_annotated else "raw",
+            "ASAR_RECORD_SEGMENT_SECONDS": str(self.record_segment_seconds),
+            "ASAR_RECORD_QUOTA_MB": str(self.record_quota_mb),
+            "ASAR_ADAPTIVE_DELIVERY": "1" if self.adaptive_delivery else "0",
+            "ASAR_SEND_BUFFER_KB": str(self.send_buffer_kb),
+            "ASAR_DETECTION_LOG_DIR": self.detection_log_dir or "",
+            "ASAR_STREAM_PEERS": ",".join(self.stream_peers),
+            "ASAR_WORKER_INDEX": str(self.worker_index),
+        }
+
+    def as_dict(self):
+        return dict(vars(self))
@@ -0,0 +1,177 @@
+import socket
+import time
+from threading import Lock
+
+import cv2
+
+from profiler import profiler
+
+# Delivery levels from best to cheapest: (output scale, JPEG quality, max fps).
+# Level 0 is the stream's own JPEG, so a client on a good link costs no extra encode.
+LEVELS = (
+    (1.0, None, None),
+    (1.0, 60, None),
+    (0.75, 50, None),
+    (0.5, 50, 15),
+    (0.5, 35, 8),
+    (0.25, 35, 4),
+)
+
+
+class VariantCache:
+    """
+    Re-encoded variants of a stream's latest packet, one per level. Clients
+    at the same level share a single resize + encode; entries for older
+    packets are dropped as soon as a newer packet is requested.
+    """
+    def __init__(self, levels=LEVELS):
+        self.levels = levels
+        self._lock = Lock()
+        self._seq = None
+        self._variants = {}
+        # Last encoded size per level, used to predict what a level would cost
+        self.sizes = {}
+        self.encodes = 0
+        self.hits = 0
+
+    def get(self, packet, level):
+        if level == 0 and packet.jpeg is not None:
+            self.sizes[0] = len(packet.jpeg)
+            return packet.jpeg
+        with self._lock:
+            if self._seq != packet.seq:
+                self._seq = packet.seq
+                self._variants = {}
+            data = self._variants.get(level)
+            if data is not None:
+                self.hits += 1
+                return data
+            data = self._encode(packet, level)
+            if data is not None:
+                self._variants[level] = data
+                self.sizes[level] = len(data)
+                self.encodes += 1
+            return data
+
+    def _encode(self, packet, level):
+        frame = packet.decode()
+        if frame is None:
+            return None
+        scale, quality, _ = self.levels[level]
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality] if quality else []
+        with profiler.section('cv2.imencode'):
+            ret, buffer = cv2.imencode('.jpg', frame, params)
+        return buffer.tobytes() if ret else None
+
+
+def limit_send_buffer(sock, nbytes):
+    """
+    Shrink a client socket's kernel send buffer. Frames should queue in the
+    viewer's drop-oldest queue, not in a multi-megabyte kernel buffer that
+    can only be drained in order, and sends must block early enough for the
+    throughput estimate to see the real link rate.
+    """
+    if sock is None or not nbytes:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, nbytes)
+    except OSError as e:
+        print(f"Could not limit send buffer: {e}")
+
+
+class AdaptiveClient:
+    """
+    Per-viewer delivery controller. Sends that block show the client's real
+    throughput (bytes per second of blocking send time); it moves down the
+    LEVELS ladder when a frame takes longer to send than the stream's frame
+    interval or the level's bitrate exceeds the estimate, and back up after
+    upgrade_after frames that were sent comfortably.
+    """
+    # Sends faster than this went straight into the socket buffer and say nothing about the link
+    BLOCKING = 0.002
+
+    def __init__(self, cache, source_fps=None, headroom=0.8, smoothing=0.3, upgrade_after=30):
+        self.cache = cache
+        # Callable returning the stream's current frame rate
+        self.source_fps = source_fps or (lambda: 0.0)
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self.upgrade_after = upgrade_after
+
+        self.level = 0
+        self.throughput = None  # bytes / second
+        self._good = 0
+        # Blocking sends during the current good streak
+        self._blocked = 0
+        self._last_sent = None
+
+        self.sent = 0
+        self.skipped = 0
+        self.changes = 0
+
+    def _fps(self, level):
+        max_fps = self.cache.levels[level][2]
+        source = self.source_fps() or 30.0
+        return min(source, max_fps) if max_fps else source
+
+    def wants(self, now=None):
+        """Frame-rate cap of the current level: False if this frame should be skipped."""
+        max_fps = self.cache.levels[self.level][2]
+        now = time.monotonic() if now is None else now
+        if max_fps and self._last_sent is not None and now - self._last_sent < 1.0 / max_fps:
+            self.skipped += 1
+            return False
+        return True
+
+    def render(self, packet):
+        return self.cache.get(packet, self.level)
+
+    def record_send(self, nbytes, seconds):
+        """Account for one frame that took `seconds` to hand to the client, and pick the next level."""
+        self.sent += 1
+        self._last_sent = time.monotonic()
+        if seconds >= self.BLOCKING:
+            self._blocked += 1
+            rate = nbytes / seconds
+            if self.throughput is None:
+                self.throughput = rate
+            else:
+                self.throughput += self.smoothing * (rate - self.throughput)
+
+        budget = self.throughput * self.headroom if self.throughput else float('inf')
+        interval = 1.0 / self._fps(self.level)
+        if seconds > interval or nbytes * self._fps(self.level) > budget:
+            self._good = self._blocked = 0
+            self._set_level(self.level + 1)
+            return
+
+        self._good += 1
+        if self._good >= self.upgrade_after and self.level > 0:
+            better = self.level - 1
+            # Unknown size: assume the better level costs twice this one
+            size = self.cache.sizes.get(better, 2 * nbytes)
+            # A streak with no blocking send at all means the estimate is stale: probe upwards
+            if size * self._fps(better) <= budget or not self._blocked:
+                self._set_level(better)
+            self._good = self._blocked = 0
+
+    def _set_level(self, level):
+        level = max(0, min(len(self.cache.levels) - 1, level))
+        if level != self.level:
+            self.level = level
+            self.changes += 1
+
+    def stats(self):
+        scale, quality, max_fps = self.cache.levels[self.level]
+        return {
+            "level": self.level,
+            "scale": scale,
+            "quality": quality,
+            "max_fps": max_fps,
+            "throughput_kbps": round(8 * self.throughput / 1000, 1) if self.throughput else None,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "changes": self.changes,
+        }
@@ -0,0 +1,344 @@
+import calendar
+import json
+import os
+import time
+from threading import Thread
+
+import numpy as np
+
+from pipeline import LatestQueue
+from recorder import stream_id
+
+# Fixed-width columns, one file each (<name>.col) per partition. Frames: one row per
+# frame that ran (or reused) detection; first_box is its first row in the box columns.
+FRAME_COLUMNS = (
+    ('ts', '<f8'), ('seq', '<u4'), ('persons', '<u2'), ('max_score', '<f4'),
+    ('direction', 'i1'), ('first_box', '<u4'),
+)
+BOX_COLUMNS = (
+    ('ymin', '<f4'), ('xmin', '<f4'), ('ymax', '<f4'), ('xmax', '<f4'), ('score', '<f4'), ('class_id', '<i2'),
+)
+# Sparse time index: the ts and row of every SPARSE_STRIDE-th frame of a partition
+SPARSE_DTYPE = np.dtype([('ts', '<f8'), ('row', '<u8')])
+SPARSE_STRIDE = 1024
+
+DIRECTIONS = (None, 'left', 'forward', 'right')
+_DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+
+COLUMN_EXT = '.col'
+SPARSE_FILE = 'sparse.idx'
+# One partition directory per stream and UTC hour
+HOUR_FORMAT = '%Y%m%d%H'
+
+
+def partition_name(ts):
+    return time.strftime(HOUR_FORMAT, time.gmtime(ts))
+
+
+def partition_start(name):
+    return calendar.timegm(time.strptime(name, HOUR_FORMAT))
+
+
+def _rows(path, dtype):
+    try:
+        return os.path.getsize(path) // np.dtype(dtype).itemsize
+    except OSError:
+        return 0
+
+
+class _Partition:
+    """Append handles for one stream-hour. Reopening after a crash trims the columns to a common length."""
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.frames = self._trim(FRAME_COLUMNS)
+        self.boxes = self._trim(BOX_COLUMNS)
+        sparse = os.path.join(directory, SPARSE_FILE)
+        # Drop index entries for rows that were trimmed away
+        entries = min(_rows(sparse, SPARSE_DTYPE), -(-self.frames // SPARSE_STRIDE))
+        if os.path.exists(sparse):
+            os.truncate(sparse, entries * SPARSE_DTYPE.itemsize)
+        self.next_sparse = entries * SPARSE_STRIDE
+        if self.next_sparse < self.frames:
+            # Index fell behind the columns (crash between the two writes): rebuild its tail
+            ts = np.fromfile(self._path('ts'), dtype='<f8', count=self.frames)
+            rows = np.arange(self.next_sparse, self.frames, SPARSE_STRIDE)
+            with open(sparse, 'ab') as f:
+                f.write(np.array(list(zip(ts[rows], rows)), dtype=SPARSE_DTYPE).tobytes())
+            self.next_sparse = int(rows[-1]) + SPARSE_STRIDE
+        self.files = {name: open(self._path(name), 'ab') for name, _ in FRAME_COLUMNS + BOX_COLUMNS}
+        self.sparse = open(sparse, 'ab')
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + COLUMN_EXT)
+
+    def _trim(self, columns):
+        rows = min(_rows(self._path(name), dtype) for name, dtype in columns)
+        for name, dtype in columns:
+            path = self._path(name)
+            if os.path.exists(path):
+                os.truncate(path, rows * np.dtype(dtype).itemsize)
+        return rows
+
+    def append(self, frames, boxes):
+        # Boxes first, then frames (ts last), so a visible frame row never points past its boxes
+        for name, dtype in BOX_COLUMNS:
+            self.files[name].write(boxes[name].astype(dtype, copy=False).tobytes())
+            self.files[name].flush()
+        for name, dtype in FRAME_COLUMNS[::-1]:
+            self.files[name].write(frames[name].astype(dtype, copy=False).tobytes())
+            self.files[name].flush()
+
+        first, count = self.frames, len(frames['ts'])
+        rows = np.arange(self.next_sparse, first + count, SPARSE_STRIDE)
+        if len(rows):
+            entries = np.empty(len(rows), dtype=SPARSE_DTYPE)
+            entries['ts'] = frames['ts'][rows - first]
+            entries['row'] = rows
+            self.sparse.write(entries.tobytes())
+            self.sparse.flush()
+            self.next_sparse = int(rows[-1]) + SPARSE_STRIDE
+        self.frames += count
+        self.boxes += len(boxes['score'])
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.sparse.close()
+
+
+class DetectionLog:
+    """
+    Append-only detection log for every stream, partitioned by stream and
+    hour (root/<stream id>/<YYYYMMDDHH>/). Each column is a file of
+    fixed-width little-endian values (FRAME_COLUMNS, BOX_COLUMNS), so
+    readers memory-map exactly the rows they need; a sparse index of every
+    SPARSE_STRIDE-th timestamp narrows a time range to a few pages before
+    any column is touched.
+
+    append() only queues the packet's detections (from the stream's encode
+    thread); a writer thread batches them and appends every flush_interval.
+    If the disk cannot keep up the oldest queued frames are dropped.
+    """
+    def __init__(self, root, flush_interval=1.0, queue_size=4096):
+        self.root = root
+        self.flush_interval = flush_interval
+        self._queue = LatestQueue(maxsize=queue_size)
+        # stream id -> (partition name, _Partition)
+        self._open = {}
+        self._known = set()
+
+        self.frames = 0
+        self.boxes = 0
+        self.errors = 0
+
+        os.makedirs(root, exist_ok=True)
+        self._thread = Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped(self):
+        return self._queue.dropped
+
+    def append(self, source_url, packet):
+        """Queue one published packet (never blocks). Packets without detections are skipped."""
+        if packet is None or packet.detections is None:
+            return
+        self._queue.put((source_url, packet.capture_ts, packet.seq & 0xFFFFFFFF,
+                         _DIRECTION_CODES.get(packet.direction, 0), packet.detections))
+
+    def close(self):
+        self._queue.close()
+
+    # --- Writer thread ---
+    def _write_loop(self):
+        pending = []
+        last_flush = time.monotonic()
+        try:
+            while True:
+                item = self._queue.get(timeout=self.flush_interval)
+                if item is not None:
+                    pending.append(item)
+                elif self._queue.closed and not len(self._queue):
+                    break
+                if pending and (item is None or time.monotonic() - last_flush >= self.flush_interval):
+                    self._flush(pending)
+                    pending = []
+                    last_flush = time.monotonic()
+        finally:
+            if pending:
+                self._flush(pending)
+            for _, partition in self._open.values():
+                partition.close()
+
+    def _flush(self, items):
+        groups = {}
+        for item in items:
+            groups.setdefault((item[0], partition_name(item[1])), []).append(item)
+        for (source_url, hour), rows in groups.items():
+            try:
+                self._write(source_url, hour, rows)
+            except OSError as e:
+                self.errors += 1
+                print(f"Detection log write failed: {e}")
+                # Reopen next time, which trims any half-written rows
+                current = self._open.pop(stream_id(source_url), None)
+                if current is not None:
+                    current[1].close()
+
+    def _partition(self, source_url, hour):
+        sid = stream_id(source_url)
+        if sid not in self._known:
+            os.makedirs(os.path.join(self.root, sid), exist_ok=True)
+            with open(os.path.join(self.root, sid, 'stream.json'), 'w') as f:
+                json.dump({"source": source_url}, f)
+            self._known.add(sid)
+        current = self._open.get(sid)
+        if current is None or current[0] != hour:
+            if current is not None:
+                current[1].close()
+            current = self._open[sid] = (hour, _Partition(os.path.join(self.root, sid, hour)))
+        return current[1]
+
+    def _write(self, source_url, hour, rows):
+        partition = self._partition(source_url, hour)
+        dets = [row[4] for row in rows]
+        counts = np.array([len(d) for d in dets], dtype=np.int64)
+        frames = {
+            'ts': np.array([row[1] for row in rows], dtype='<f8'),
+            'seq': np.array([row[2] for row in rows], dtype='<u4'),
+            'persons': counts,
+            'max_score': np.array([d['score'].max() if len(d) else 0.0 for d in dets], dtype='<f4'),
+            'direction': np.array([row[3] for row in rows], dtype='i1'),
+            'first_box': partition.boxes + np.concatenate(([0], np.cumsum(counts)[:-1])),
+        }
+        boxes = np.concatenate(dets) if counts.sum() else None
+        boxes = {name: boxes[name] if boxes is not None else np.empty(0, dtype)
+                 for name, dtype in BOX_COLUMNS}
+        partition.append(frames, boxes)
+        self.frames += len(rows)
+        self.boxes += int(counts.sum())
+
+    def stats(self):
+        return {"frames": self.frames, "boxes": self.boxes, "dropped": self.dropped, "errors": self.errors}
+
+
+class DetectionStore:
+    """Read side of the detection log: time-range queries over memory-mapped columns."""
+    def __init__(self, root):
+        self.root = root
+
+    def _directory(self, sid):
+        # Only ids we generated (hex) are valid path components
+        if not sid or not all(c in '0123456789abcdef' for c in sid):
+            return None
+        directory = os.path.join(self.root, sid)
+        return directory if os.path.isdir(directory) else None
+
+    def partitions(self, sid, t0=None, t1=None):
+        """Partition names of a stream overlapping [t0, t1], oldest first."""
+        directory = self._directory(sid)
+        if directory is None:
+            return []
+        names = sorted(n for n in os.listdir(directory) if len(n) == 10 and n.isdigit())
+        return [n for n in names
+                if (t0 is None or partition_start(n) + 3600 > t0) and (t1 is None or partition_start(n) <= t1)]
+
+    def _column(self, sid, hour, name, dtype, rows):
+        path = os.path.join(self.root, sid, hour, name + COLUMN_EXT)
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+    def _frame_rows(self, sid, hour):
+        # Rows every frame column has (the writer may be half way through an append)
+        return min(_rows(os.path.join(self.root, sid, hour, name + COLUMN_EXT), dtype)
+                   for name, dtype in FRAME_COLUMNS)
+
+    def _row_range(self, sid, hour, rows, t0, t1):
+        """[lo, hi) of the rows with t0 <= ts <= t1, reading only the sparse index and one block per end."""
+        sparse = np.fromfile(os.path.join(self.root, sid, hour, SPARSE_FILE), dtype=SPARSE_DTYPE)
+        lo_block, hi_block = 0, rows
+        if len(sparse):
+            i = np.searchsorted(sparse['ts'], t0, side='left')
+            lo_block = int(sparse['row'][i - 1]) if i > 0 else 0
+            j = np.searchsorted(sparse['ts'], t1, side='right')
+            hi_block = int(sparse['row'][j]) if j < len(sparse) else rows
+        hi_block = min(hi_block, rows)
+        ts = self._column(sid, hour, 'ts', '<f8', rows)[lo_block:hi_block]
+        return (lo_block + int(np.searchsorted(ts, t0, side='left')),
+                lo_block + int(np.searchsorted(ts, t1, side='right')))
+
+    def query(self, sid, t0, t1, min_persons=1, limit=1000, boxes=False):
+        """
+        Frames of stream sid with t0 <= ts <= t1 and at least min_persons
+        detections. Returns the total match count and up to `limit` frames
+        (oldest first), with their boxes if asked.
+        """
+        matches = 0
+        frames = []
+        scanned = 0
+        for hour in self.partitions(sid, t0, t1):
+            rows = self._frame_rows(sid, hour)
+            if not rows:
+                continue
+            lo, hi = self._row_range(sid, hour, rows, t0, t1)
+            if hi <= lo:
+                continue
+            scanned += hi - lo
+            persons = self._column(sid, hour, 'persons', '<u2', rows)[lo:hi]
+            hits = np.flatnonzero(persons >= min_persons) + lo
+            matches += len(hits)
+            room = limit - len(frames)
+            if room <= 0 or not len(hits):
+                continue
+            hits = hits[:room]
+            columns = {name: self._column(sid, hour, name, dtype, rows)[hits] for name, dtype in FRAME_COLUMNS}
+            box_columns = None
+            if boxes:
+                box_rows = min(_rows(os.path.join(self.root, sid, hour, name + COLUMN_EXT), dtype)
+                               for name, dtype in BOX_COLUMNS)
+                box_columns = {name: self._column(sid, hour, name, dtype, box_rows)
+                               for name, dtype in BOX_COLUMNS}
+            for i in range(len(hits)):
+                code = int(columns['direction'][i])
+                frame = {
+                    "ts": round(float(columns['ts'][i]), 3),
+                    "seq": int(columns['seq'][i]),
+                    "persons": int(columns['persons'][i]),
+                    "max_score": round(float(columns['max_score'][i]), 3),
+                    "direction": DIRECTIONS[code] if 0 <= code < len(DIRECTIONS) else None,
+                }
+                if box_columns is not None:
+                    first = int(columns['first_box'][i])
+                    span = slice(first, first + frame["persons"])
+                    frame["boxes"] = np.stack([box_columns[name][span] for name in ('ymin', 'xmin', 'ymax', 'xmax')],
+                                              axis=1).astype(float).round(4).tolist()
+                    frame["scores"] = box_columns['score'][span].astype(float).round(3).tolist()
+                frames.append(frame)
+        return {"matches": matches, "scanned": scanned, "frames": frames}
+
+    def streams(self):
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for sid in sorted(os.listdir(self.root)):
+            if self._directory(sid) is None:
+                continue
+            try:
+                with open(os.path.join(self.root, sid, 'stream.json')) as f:
+                    source = json.load(f).get("source")
+            except (OSError, ValueError):
+                source = None
+            partitions = []
+            for hour in self.partitions(sid):
+                rows = self._frame_rows(sid, hour)
+                ts = self._column(sid, hour, 'ts', '<f8', rows)
+                partitions.append({
+                    "hour": hour,
+                    "frames": rows,
+                    "start": float(ts[0]) if rows else None,
+                    "end": float(ts[-1]) if rows else None,
+                })
+            result.append({"stream": sid, "source": source, "partitions": partitions})
+        return result
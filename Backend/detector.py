@@ -0,0 +1,184 @@
+import mmap
+import os
+from threading import Lock
+
+import cv2
+import numpy as np
+
+
+_interpreter_class = None
+
+
+def interpreter_backend():
+    """
+    The TFLite Interpreter class to use and its package name. Prefers the
+    small tflite_runtime wheel and only falls back to full TensorFlow, which
+    takes seconds and hundreds of MB to import. Resolved once.
+    """
+    global _interpreter_class
+    if _interpreter_class is None:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+            _interpreter_class = (Interpreter, "tflite_runtime")
+        except ImportError:
+            import tensorflow as tf
+            _interpreter_class = (tf.lite.Interpreter, "tensorflow")
+    return _interpreter_class
+
+
+def preload_model_file(model_path):
+    """
+    Read a model file into the page cache through a read-only mapping and
+    return its size (0 if it cannot be read). Loading from a path, TFLite
+    memory-maps the file itself, so every interpreter in every worker uses
+    these same cached pages for its weights; preloading once in the parent
+    of a pre-fork server keeps the workers' loads off the disk.
+    """
+    try:
+        with open(model_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_WILLNEED)
+            # Touch every page so the read has finished before anyone forks
+            for offset in range(0, len(mapped), mmap.PAGESIZE):
+                mapped[offset]
+            return len(mapped)
+    except (OSError, ValueError) as e:
+        print(f"Could not preload {model_path}: {e}")
+        return 0
+
+
+class DetectorSession:
+    """
+    Wraps a TFLite SSD interpreter for repeated per-frame use.
+    Tensor metadata is read once and the input buffer is allocated once, so
+    the per-frame path is resize -> colour convert -> set_tensor -> invoke
+    with no intermediate arrays.
+    """
+    def __init__(self, interpreter, labels=None):
+        self.interpreter = interpreter
+        self.labels = labels or []
+        self.lock = Lock()
+
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()
+        self.input_index = input_details['index']
+        self.input_height = int(input_details['shape'][1])
+        self.input_width = int(input_details['shape'][2])
+        self.input_dtype = input_details['dtype']
+        # Standard TFLite obj detection has 4 outputs: boxes, classes, scores, num
+        self.boxes_index = output_details[0]['index']
+        self.classes_index = output_details[1]['index']
+        self.scores_index = output_details[2]['index']
+
+        self.batch_size = 1
+        self._is_uint8 = self.input_dtype == np.uint8
+        self._allocate_buffers()
+
+    def _allocate_buffers(self):
+        shape = (self.input_height, self.input_width, 3)
+        # Resized BGR frame, then RGB written straight into the input tensor layout
+        self._resized = np.empty(shape, dtype=np.uint8)
+        self._input = np.empty((self.batch_size,) + shape, dtype=self.input_dtype)
+        # Float models need one extra uint8 RGB scratch before scaling to [0,1]
+        self._rgb = None if self._is_uint8 else np.empty(shape, dtype=np.uint8)
+
+    def set_batch_size(self, batch_size):
+        """
+        Resize the input to hold `batch_size` frames. Returns False (and stays
+        at batch 1) if the model cannot be resized, e.g. SSD models whose
+        detection post-process op only supports a batch of one.
+        """
+        if batch_size == self.batch_size:
+            return True
+        shape = [batch_size, self.input_height, self.input_width, 3]
+        try:
+            self.interpreter.resize_tensor_input(self.input_index, shape)
+            self.interpreter.allocate_tensors()
+            boxes_shape = self.interpreter.get_output_details()[0]['shape']
+            if boxes_shape[0] != batch_size:
+                raise ValueError(f"output batch is {boxes_shape[0]}")
+        except Exception as e:
+            print(f"Model does not support batch size {batch_size}: {e}")
+            self.interpreter.resize_tensor_input(self.input_index, [1] + shape[1:])
+            self.interpreter.allocate_tensors()
+            batch_size = 1
+        ok = batch_size == shape[0]
+        self.batch_size = batch_size
+        self._allocate_buffers()
+        return ok
+
+    @classmethod
+    def load(cls, model_path, labels_path=None, num_threads=None):
+        """Build a session from files. Returns None (and prints why) on failure."""
+        try:
+            if not os.path.exists(model_path):
+                print(f"Model not found at {model_path}")
+                return None
+
+            # Imported here so modules that only use the buffers (or a stub interpreter) stay light
+            Interpreter, _ = interpreter_backend()
+            # model_path, not model_content: the file is memory-mapped and its pages
+            # shared with other interpreters and processes instead of copied
+            interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+            interpreter.allocate_tensors()
+
+            labels = []
+            if labels_path:
+                with open(labels_path, 'r') as f:
+                    labels = [line.strip() for line in f.readlines()]
+
+            return cls(interpreter, labels)
+        except Exception as e:
+            print(f"Error loading model/labels: {e}")
+            return None
+
+    def preprocess(self, frame, slot=0):
+        """Resize a BGR frame and convert it to RGB directly into slot `slot` of the input buffer."""
+        cv2.resize(frame, (self.input_width, self.input_height), dst=self._resized)
+        if self._is_uint8:
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._input[slot])
+        else:
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._rgb)
+            # Normalize to [0,1] if float model
+            np.multiply(self._rgb, 1.0 / 255.0, out=self._input[slot], casting='unsafe')
+        return self._input
+
+    def set_input(self, frame):
+        self.interpreter.set_tensor(self.input_index, self.preprocess(frame))
+
+    def invoke(self):
+        self.interpreter.invoke()
+
+    def get_output(self, slot=0):
+        """Return (boxes, classes, scores) for one batch entry."""
+        boxes = self.interpreter.get_tensor(self.boxes_index)[slot]
+        classes = self.interpreter.get_tensor(self.classes_index)[slot]
+        scores = self.interpreter.get_tensor(self.scores_index)[slot]
+        return boxes, classes, scores
+
+    def detect(self, frame):
+        """Thread-safe preprocess + invoke + read outputs."""
+        with self.lock:
+            self.set_input(frame)
+            self.invoke()
+            return self.get_output()
+
+    def detect_batch(self, frames):
+        """
+        Run up to batch_size frames in one invoke(). Returns one
+        (boxes, classes, scores) tuple per frame. Unused slots keep stale
+        data and their outputs are ignored.
+        """
+        results = []
+        with self.lock:
+            for start in range(0, len(frames), self.batch_size):
+                chunk = frames[start:start + self.batch_size]
+                for slot, frame in enumerate(chunk):
+                    self.preprocess(frame, slot)
+                self.interpreter.set_tensor(self.input_index, self._input)
+                self.invoke()
+                boxes = self.interpreter.get_tensor(self.boxes_index)
+                classes = self.interpreter.get_tensor(self.classes_index)
+                scores = self.interpreter.get_tensor(self.scores_index)
+                results.extend((boxes[i], classes[i], scores[i]) for i in range(len(chunk)))
+        return results
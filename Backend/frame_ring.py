@@ -0,0 +1,349 @@
+"""
+Process mode for the stream pipeline: decoded frames live in shared memory.
+
+A CaptureProcess decodes one source in its own process and writes every
+frame into a FrameRing, a multiprocessing.shared_memory block of fixed-size
+slots, each with the frame's sequence number, capture time and size. The
+stream thread in the server gets a 20-byte notice per frame and wraps the
+slot as a RingFrame, a numpy view on the shared block. FrameWorkers is a
+pool of inference processes that map the same block: a task is only
+(ring name, slot, seq), the worker runs the detector on the slot in place
+and sends back the DETECTION_DTYPE rows. Frames are never pickled or copied
+between processes, and decoding and inference run outside the server's GIL.
+"""
+import multiprocessing
+import os
+import struct
+import time
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from threading import Lock
+
+import cv2
+import numpy as np
+
+from postprocess import DETECTION_DTYPE
+
+# Block layout: RING_HEADER, then one SLOT_DTYPE record per slot, then the slots' pixels
+RING_HEADER = np.dtype([('slots', '<u4'), ('height', '<u4'), ('width', '<u4'), ('channels', '<u4')])
+SLOT_DTYPE = np.dtype([('seq', '<u8'), ('ts', '<f8'), ('height', '<u4'), ('width', '<u4')])
+# Capture process -> server: slot, seq, capture time (a seq of 0 means the stream ended)
+NOTICE = struct.Struct('<IQd')
+
+# Spawned, not forked: the server process has threads (and locks) a fork would copy
+_context = multiprocessing.get_context('spawn')
+
+
+class RingFrame(np.ndarray):
+    """A frame that is a view on a FrameRing slot. Slices keep the ring name, slot and seq."""
+    def __array_finalize__(self, obj):
+        self.ring_name = getattr(obj, 'ring_name', None)
+        self.slot = getattr(obj, 'slot', None)
+        self.seq = getattr(obj, 'seq', None)
+
+
+def detach(frame):
+    """
+    A private copy of a RingFrame (for drawing on or keeping), or None if
+    the capture process reused the slot before the copy was complete (the
+    pixels may then be torn or newer than the frame's detections). Other
+    frames are returned as they are.
+    """
+    if not isinstance(frame, RingFrame):
+        return frame
+    copy = np.array(frame, subok=False)
+    ring = _owned.get(frame.ring_name)
+    if ring is None or not ring.valid(frame.slot, frame.seq):
+        if ring is not None:
+            ring.torn += 1
+        return None
+    return copy
+
+
+class FrameRing:
+    """
+    Fixed-size ring of decoded frames in shared memory, with a single writer.
+
+    write() clears the slot's seq, copies the pixels and only then sets the
+    new seq, so a reader that finds the seq it was given before and after
+    using a slot knows the frame was not overwritten in between (valid()).
+    Frames larger than max_shape are downscaled to fit.
+    """
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        header = np.ndarray((1,), dtype=RING_HEADER, buffer=shm.buf)[0]
+        self.slots = int(header['slots'])
+        self.max_shape = (int(header['height']), int(header['width']), int(header['channels']))
+        self._index = np.ndarray((self.slots,), dtype=SLOT_DTYPE, buffer=shm.buf, offset=RING_HEADER.itemsize)
+        self._slot_bytes = int(np.prod(self.max_shape))
+        # Slot views are views of this array, so the block has only two buffer exports
+        self._pixels = np.ndarray((self.slots, self._slot_bytes), dtype=np.uint8, buffer=shm.buf,
+                                  offset=RING_HEADER.itemsize + self.slots * SLOT_DTYPE.itemsize)
+        self._next = 0
+        self.resized = 0
+        # Frames dropped by detach() because their slot was reused
+        self.torn = 0
+
+    @classmethod
+    def create(cls, slots=8, max_shape=(720, 1280, 3)):
+        size = RING_HEADER.itemsize + slots * SLOT_DTYPE.itemsize + slots * int(np.prod(max_shape))
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        header = np.ndarray((1,), dtype=RING_HEADER, buffer=shm.buf)
+        header[0] = (slots,) + tuple(max_shape)
+        ring = cls(shm, owner=True)
+        ring._index[:] = 0
+        _owned[ring.name] = ring
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        return cls(shared_memory.SharedMemory(name=name))
+
+    def _slot_view(self, slot, height, width):
+        return self._pixels[slot, :height * width * self.max_shape[2]].reshape(height, width, self.max_shape[2])
+
+    def write(self, frame, seq, ts):
+        """Store a BGR frame as `seq` (> 0) in the next slot. Returns the slot."""
+        slot = self._next
+        self._next = (slot + 1) % self.slots
+        height, width = frame.shape[:2]
+        max_h, max_w = self.max_shape[:2]
+        if height > max_h or width > max_w:
+            scale = min(max_h / height, max_w / width)
+            height, width = max(1, int(height * scale)), max(1, int(width * scale))
+        entry = self._index[slot:slot + 1]
+        entry['seq'] = 0
+        view = self._slot_view(slot, height, width)
+        if (height, width) == frame.shape[:2]:
+            np.copyto(view, frame)
+        else:
+            cv2.resize(frame, (width, height), dst=view, interpolation=cv2.INTER_AREA)
+            self.resized += 1
+        entry['ts'] = ts
+        entry['height'] = height
+        entry['width'] = width
+        entry['seq'] = seq
+        return slot
+
+    def frame(self, slot, seq):
+        """The slot as a RingFrame if it still holds `seq`, else None. No copy."""
+        entry = self._index[slot]
+        if int(entry['seq']) != seq:
+            return None
+        frame = self._slot_view(slot, int(entry['height']), int(entry['width'])).view(RingFrame)
+        frame.ring_name = self.name
+        frame.slot = slot
+        frame.seq = seq
+        return frame
+
+    def valid(self, slot, seq):
+        index = self._index
+        # A closed ring holds no frames
+        return index is not None and int(index[slot]['seq']) == seq
+
+    def close(self):
+        """Unlink the block (owner only) and unmap it once no frame views it any more."""
+        _owned.pop(self.name, None)
+        self._index = self._pixels = None
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        _closing.append(self.shm)
+        _closing[:] = [shm for shm in _closing if not _unmapped(shm)]
+
+
+# Rings created by this process, by name: detach() checks their slots
+_owned = {}
+# Blocks closed while frames still viewed them; retried on every close()
+_closing = []
+
+
+def _unmapped(shm):
+    try:
+        shm.close()
+        return True
+    except BufferError:
+        return False
+
+
+# --- Capture process ---
+def _decoded_frames(source_url, stop):
+    from mjpeg import MjpegReader
+    reader = MjpegReader(source_url)
+    if source_url.startswith(('http://', 'https://')) and reader.open():
+        try:
+            for jpeg in reader:
+                if stop.is_set():
+                    break
+                frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is not None:
+                    yield frame
+        finally:
+            reader.close()
+        return
+
+    cap = cv2.VideoCapture(source_url, cv2.CAP_FFMPEG)
+    if not cap.isOpened():
+        print(f"Failed to open video capture for URL: {source_url}")
+        return
+    try:
+        while not stop.is_set():
+            success, frame = cap.read()
+            if not success:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def capture_main(source_url, ring_name, conn, stop):
+    """Capture process: decode source_url into the ring and send a NOTICE per frame."""
+    ring = FrameRing.attach(ring_name)
+    seq = 0
+    try:
+        for frame in _decoded_frames(source_url, stop):
+            seq += 1
+            ts = time.time()
+            slot = ring.write(frame, seq, ts)
+            conn.send_bytes(NOTICE.pack(slot, seq, ts))
+    except (BrokenPipeError, EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        try:
+            conn.send_bytes(NOTICE.pack(0, 0, 0.0))
+        except (BrokenPipeError, OSError):
+            pass
+        conn.close()
+        ring.close()
+
+
+class CaptureProcess:
+    """
+    Server-side handle of one capture process and the ring it fills. The
+    ring is created (and finally unlinked) here; frames() yields
+    (seq, ts, RingFrame) as the process reports them.
+    """
+    def __init__(self, source_url, slots=8, max_shape=(720, 1280, 3)):
+        self.source_url = source_url
+        self.ring = FrameRing.create(slots, max_shape)
+        self._conn, child_conn = _context.Pipe(duplex=False)
+        self._stop = _context.Event()
+        self.process = _context.Process(target=capture_main, args=(source_url, self.ring.name, child_conn, self._stop),
+                                        daemon=True)
+        self._child_conn = child_conn
+        self.missed = 0
+
+    def frames(self):
+        self.process.start()
+        # Only the child writes to its end
+        self._child_conn.close()
+        try:
+            while True:
+                try:
+                    slot, seq, ts = NOTICE.unpack(self._conn.recv_bytes())
+                except (EOFError, OSError):
+                    break
+                if seq == 0:
+                    break
+                frame = self.ring.frame(slot, seq)
+                if frame is None:
+                    # Already overwritten: the capture process is a full ring ahead
+                    self.missed += 1
+                    continue
+                yield seq, ts, frame
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop.set()
+        if self.process.pid is not None:
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+        self._conn.close()
+        self.ring.close()
+
+
+# --- Inference workers ---
+_rings = OrderedDict()
+_backend = None
+# Rings of ended streams are unmapped once this many newer ones were used
+MAX_ATTACHED_RINGS = 16
+
+
+def init_frame_worker(threads):
+    """Worker initializer: import the backend with one interpreter, in-process detection only."""
+    global _backend
+    os.environ["ASAR_POOL_SIZE"] = "1"
+    os.environ["ASAR_BATCH_SIZE"] = "1"
+    os.environ["ASAR_INTERPRETER_THREADS"] = str(threads)
+    os.environ["ASAR_FRAME_WORKERS"] = "0"
+    import app
+    if not app.ensure_model():
+        print(f"Frame worker {os.getpid()}: could not load model {app.MODEL_PATH}")
+    _backend = app
+
+
+def _attached(name):
+    ring = _rings.get(name)
+    if ring is None:
+        ring = _rings[name] = FrameRing.attach(name)
+        while len(_rings) > MAX_ATTACHED_RINGS:
+            _rings.popitem(last=False)[1].close()
+    else:
+        _rings.move_to_end(name)
+    return ring
+
+
+def detect_slot(name, slot, seq):
+    """Detections for one ring slot, or None if the slot no longer holds seq."""
+    ring = _attached(name)
+    frame = ring.frame(slot, seq)
+    if frame is None or not _backend.ensure_model():
+        return None
+    frame = frame.view(np.ndarray)
+    detections = _backend.find_targets(frame, *_backend.run_detector(frame))
+    del frame
+    # Overwritten while the detector was reading it: the result may mix two frames
+    if not ring.valid(slot, seq):
+        return None
+    return detections
+
+
+class FrameWorkers:
+    """Pool of inference processes for RingFrames. detect() blocks the calling stream thread only."""
+    def __init__(self, processes, threads=1):
+        self.processes = processes
+        self._pool = _context.Pool(processes, initializer=init_frame_worker, initargs=(threads,))
+        self._lock = Lock()
+        self.frames = 0
+        self.lost = 0
+        self.busy = 0.0
+
+    def detect(self, frame):
+        start = time.perf_counter()
+        detections = self._pool.apply(detect_slot, (frame.ring_name, frame.slot, frame.seq))
+        with self._lock:
+            self.frames += 1
+            self.busy += time.perf_counter() - start
+            if detections is None:
+                self.lost += 1
+        if detections is None:
+            return np.empty(0, dtype=DETECTION_DTYPE)
+        return detections
+
+    def close(self):
+        self._pool.terminate()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "frames": self.frames,
+                "lost": self.lost,
+                "avg_ms": round(1000 * self.busy / self.frames, 2) if self.frames else None,
+            }
@@ -0,0 +1,94 @@
+import time
+from contextlib import contextmanager
+from queue import Queue
+from threading import Lock
+
+from detector import DetectorSession
+from metrics import Histogram
+
+
+class InterpreterPool:
+    """
+    Fixed set of DetectorSessions, each with its own interpreter, tensors and
+    input buffer. Callers check one out for a single detection, so concurrent
+    streams run on separate cores instead of queueing behind one lock.
+    """
+    def __init__(self, sessions):
+        if not sessions:
+            raise ValueError("InterpreterPool needs at least one session")
+        self.sessions = list(sessions)
+        self.size = len(self.sessions)
+        self.labels = self.sessions[0].labels
+
+        self._idle = Queue()
+        for session in self.sessions:
+            self._idle.put(session)
+
+        # Counters for wait time and utilisation
+        self._stats_lock = Lock()
+        self._created = time.perf_counter()
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._busy_total = 0.0
+        self._in_use = 0
+        # One wait histogram per session, written only by whoever holds that
+        # session, so observing needs no lock; merged when scraped
+        self._wait_histograms = {id(session): Histogram() for session in self.sessions}
+
+    @classmethod
+    def create(cls, model_path, labels_path=None, size=2, num_threads=1):
+        """Load `size` interpreters. Returns None (and prints why) if the model cannot be loaded."""
+        sessions = []
+        for _ in range(max(1, size)):
+            session = DetectorSession.load(model_path, labels_path, num_threads=num_threads)
+            if not session:
+                return None
+            sessions.append(session)
+        print(f"Interpreter pool ready: {len(sessions)} x {num_threads} thread(s)")
+        return cls(sessions)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Borrow a session for one detection. Blocks while all sessions are busy."""
+        start = time.perf_counter()
+        session = self._idle.get(timeout=timeout)
+        acquired = time.perf_counter()
+        waited = acquired - start
+
+        with self._stats_lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._in_use += 1
+        self._wait_histograms[id(session)].observe(waited)
+        try:
+            yield session
+        finally:
+            busy = time.perf_counter() - acquired
+            with self._stats_lock:
+                self._busy_total += busy
+                self._in_use -= 1
+            self._idle.put(session)
+
+    @property
+    def wait_histogram(self):
+        """Checkout wait times across all sessions."""
+        return Histogram.merged(self._wait_histograms.values())
+
+    def detect(self, frame, timeout=None):
+        with self.checkout(timeout) as session:
+            return session.detect(frame)
+
+    def stats(self):
+        with self._stats_lock:
+            elapsed = time.perf_counter() - self._created
+            checkouts = self._checkouts
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "checkouts": checkouts,
+                "wait_avg_ms": round(1000 * self._wait_total / checkouts, 3) if checkouts else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max, 3),
+                "utilisation": round(self._busy_total / (elapsed * self.size), 4) if elapsed > 0 else 0.0,
+            }
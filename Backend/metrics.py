@@ -0,0 +1,138 @@
+import time
+from bisect import bisect_left
+
+# Seconds; covers sub-millisecond postprocessing up to multi-second stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram.
+
+    Meant to have a single writer (one pipeline stage thread), so observe()
+    takes no lock. A scrape may race with an update and be one sample
+    behind, which is fine for monitoring.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One extra slot for +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    @classmethod
+    def merged(cls, histograms):
+        """A snapshot summing histograms that share bucket bounds."""
+        histograms = list(histograms)
+        total = cls(histograms[0].buckets if histograms else DEFAULT_BUCKETS)
+        for histogram in histograms:
+            total.counts = [a + b for a, b in zip(total.counts, list(histogram.counts))]
+            total.sum += histogram.sum
+            total.count += histogram.count
+        return total
+
+    def cumulative(self):
+        """[(upper bound, cumulative count)] including +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), list(self.counts)):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class StreamMetrics:
+    """
+    Per-SourceStream stage histograms and frame rate. Each histogram is
+    written only by the stage thread that owns it.
+    """
+    STAGES = ('capture', 'decode', 'inference', 'draw', 'encode')
+
+    def __init__(self, smoothing=0.1):
+        self.stages = {stage: Histogram() for stage in self.STAGES}
+        self.smoothing = smoothing
+        self._last_frame = None
+        self._interval = None
+
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+
+    def frame_done(self):
+        """Called by the encode stage once per published frame; updates the smoothed FPS."""
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            interval = now - self._last_frame
+            if self._interval is None:
+                self._interval = interval
+            else:
+                self._interval += self.smoothing * (interval - self._interval)
+        self._last_frame = now
+
+    @property
+    def fps(self):
+        if not self._interval or self._last_frame is None:
+            return 0.0
+        # Decay to zero when the stream stalls instead of reporting the last rate forever
+        interval = max(self._interval, time.perf_counter() - self._last_frame)
+        return 1.0 / interval
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class MetricsWriter:
+    """
+    Builds a Prometheus text-format (0.0.4) exposition. Samples are grouped
+    by metric name, so callers can loop over streams and add several
+    metrics per stream without breaking up the families.
+    """
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        # name -> header + sample lines, in first-declared order
+        self._families = {}
+
+    def _family(self, name, kind, help_text):
+        lines = self._families.get(name)
+        if lines is None:
+            lines = self._families[name] = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        return lines
+
+    def gauge(self, name, help_text, value, labels=None):
+        self._family(name, 'gauge', help_text).append(f'{name}{_labels(labels)} {_number(value)}')
+
+    def counter(self, name, help_text, value, labels=None):
+        self._family(name, 'counter', help_text).append(f'{name}{_labels(labels)} {_number(value)}')
+
+    def histogram(self, name, help_text, histogram, labels=None):
+        lines = self._family(name, 'histogram', help_text)
+        labels = dict(labels or {})
+        buckets = histogram.cumulative()
+        for bound, count in buckets:
+            lines.append(f'{name}_bucket{_labels(dict(labels, le=_number(float(bound))))} {count}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(histogram.sum)}')
+        # Taken from the +Inf bucket so the two always agree, even mid-update
+        lines.append(f'{name}_count{_labels(labels)} {buckets[-1][1]}')
+
+    def render(self):
+        return '\n'.join(line for lines in self._families.values() for line in lines) + '\n'
@@ -0,0 +1,130 @@
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared HTTP session so reconnects to the same camera reuse pooled connections
+http_session = requests.Session()
+http_session.mount('http://', HTTPAdapter(pool_connections=8, pool_maxsize=32))
+http_session.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=32))
+
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+_LENGTH_RE = re.compile(r'content-length:\s*(\d+)', re.IGNORECASE)
+
+
+def read_available(response, chunk_size=32 * 1024):
+    """
+    Body of a streamed requests response, yielding whatever bytes have
+    arrived (up to chunk_size at a time). iter_content() would wait for a
+    full chunk, delaying small frames on live streams.
+    """
+    raw = response.raw
+    if not hasattr(raw, 'read1'):
+        # urllib3 < 2: no read1, small chunks keep the wait short
+        yield from response.iter_content(1024)
+        return
+    while True:
+        chunk = raw.read1(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class MjpegReader:
+    """
+    Streaming parser for multipart/x-mixed-replace (MJPEG) HTTP sources.
+    Yields each part's raw JPEG bytes without decoding them, so the caller
+    decides which frames are worth decoding. The receive buffer is bounded:
+    if no complete part shows up within max_buffer bytes, the buffer is
+    dropped and the parser resyncs on the next boundary.
+    """
+    def __init__(self, url, session=None, chunk_size=32 * 1024, max_buffer=4 * 1024 * 1024, timeout=5):
+        self.url = url
+        self.session = session or http_session
+        self.chunk_size = chunk_size
+        self.max_buffer = max_buffer
+        self.timeout = timeout
+
+        self.response = None
+        self.delimiter = None
+        self.frames = 0
+        self.resyncs = 0
+
+    def open(self):
+        """Connect and check the stream is multipart. Returns False otherwise (caller falls back)."""
+        try:
+            self.response = self.session.get(self.url, stream=True, timeout=self.timeout)
+        except Exception as e:
+            print(f"MJPEG connect failed for {self.url}: {e}")
+            return False
+
+        content_type = self.response.headers.get('Content-Type', '')
+        match = _BOUNDARY_RE.search(content_type)
+        if 'multipart' not in content_type.lower() or not match:
+            self.close()
+            return False
+
+        boundary = match.group(1).strip()
+        # Some servers include the leading dashes in the header, most do not
+        if boundary.startswith('--'):
+            boundary = boundary[2:]
+        self.delimiter = b'--' + boundary.encode('latin-1')
+        return True
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def __iter__(self):
+        buf = bytearray()
+        for chunk in read_available(self.response, self.chunk_size):
+            if not chunk:
+                continue
+            buf += chunk
+            while True:
+                jpeg, consumed = self._next_part(buf)
+                if not consumed:
+                    break
+                del buf[:consumed]
+                if jpeg:
+                    self.frames += 1
+                    yield jpeg
+            if len(buf) > self.max_buffer:
+                # Lost sync (or a runaway part): keep only a possible partial delimiter
+                self.resyncs += 1
+                del buf[:-len(self.delimiter)]
+
+        # Stream closed: the last part has no trailing delimiter
+        start = buf.find(self.delimiter)
+        header_end = buf.find(b'\r\n\r\n', start) if start >= 0 else -1
+        if header_end >= 0:
+            body = bytes(buf[header_end + 4:]).rstrip(b'\r\n')
+            if body:
+                self.frames += 1
+                yield body
+
+    def _next_part(self, buf):
+        """Return (jpeg bytes or None, bytes consumed). (None, 0) means wait for more data."""
+        start = buf.find(self.delimiter)
+        if start < 0:
+            return None, 0
+        header_end = buf.find(b'\r\n\r\n', start)
+        if header_end < 0:
+            return None, 0
+        headers = bytes(buf[start + len(self.delimiter):header_end]).decode('latin-1')
+        body_start = header_end + 4
+
+        length = _LENGTH_RE.search(headers)
+        if length:
+            body_end = body_start + int(length.group(1))
+            if len(buf) < body_end:
+                return None, 0
+            return bytes(buf[body_start:body_end]), body_end
+
+        # No Content-Length: the part runs until the next delimiter
+        body_end = buf.find(self.delimiter, body_start)
+        if body_end < 0:
+            return None, 0
+        body = bytes(buf[body_start:body_end]).rstrip(b'\r\n')
+        return (body or None), body_end
@@ -0,0 +1,91 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap "has anything changed?" check used to skip inference on static scenes.
+
+    Frames are reduced to a small grayscale image (optionally cropped to a
+    normalised region of interest) and compared with the frame the detector
+    last ran on. The gate opens when more than area_threshold of the pixels
+    differ by more than pixel_threshold, or when min_refresh seconds have
+    passed since the last inference so detections never go stale.
+    """
+    def __init__(self, width=64, pixel_threshold=25, area_threshold=0.01, min_refresh=2.0, roi=None):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.min_refresh = min_refresh
+        # (x0, y0, x1, y1) in 0..1, or None for the whole frame
+        self.roi = roi
+
+        self._reference = None
+        self._candidate = None
+        self._reference_time = 0.0
+
+        self.checks = 0
+        self.skips = 0
+        self.cost = 0.0
+
+    def _reduce(self, gray):
+        if self.roi is not None:
+            h, w = gray.shape
+            x0, y0, x1, y1 = self.roi
+            gray = gray[int(y0 * h):max(int(y1 * h), int(y0 * h) + 1),
+                        int(x0 * w):max(int(x1 * w), int(x0 * w) + 1)]
+        h, w = gray.shape
+        height = max(1, round(h * self.width / w))
+        return cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA)
+
+    def prepare(self, frame):
+        """Small grayscale version of a BGR frame."""
+        return self._reduce(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+
+    def prepare_jpeg(self, jpeg):
+        """Small grayscale version of a JPEG, decoded at 1/8 scale (far cheaper than a full decode)."""
+        gray = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if gray is None:
+            return None
+        return self._reduce(gray)
+
+    def changed(self, frame=None, jpeg=None):
+        """
+        True if the detector should run on this BGR frame (or, without one,
+        this JPEG). Call commit() once it has. The cost counted includes
+        preparing the small image.
+        """
+        start = time.perf_counter()
+        small = self.prepare(frame) if frame is not None else self.prepare_jpeg(jpeg)
+        self.checks += 1
+        self._candidate = small
+        reference = self._reference
+
+        if (small is None or reference is None or reference.shape != small.shape
+                or time.monotonic() - self._reference_time >= self.min_refresh):
+            result = True
+        else:
+            diff = cv2.absdiff(small, reference)
+            changed_fraction = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+            result = changed_fraction > self.area_threshold
+
+        if not result:
+            self.skips += 1
+        self.cost += time.perf_counter() - start
+        return result
+
+    def commit(self):
+        """The detector ran on the last checked frame: make it the new reference."""
+        if self._candidate is not None:
+            self._reference = self._candidate
+            self._reference_time = time.monotonic()
+
+    def stats(self):
+        return {
+            "checks": self.checks,
+            "skips": self.skips,
+            "skip_rate": round(self.skips / self.checks, 4) if self.checks else 0.0,
+            "avg_cost_ms": round(1000 * self.cost / self.checks, 4) if self.checks else 0.0,
+        }
@@ -0,0 +1,109 @@
+import time
+from collections import deque
+from threading import Condition
+
+import cv2
+import numpy as np
+
+
+class FramePacket:
+    """
+    A frame moving through the pipeline, tagged at capture time.
+    MJPEG sources fill source_jpeg and leave frame as None until a stage
+    decides the frame is worth decoding.
+    """
+    __slots__ = ('seq', 'capture_ts', 'frame', 'source_jpeg', 'jpeg', 'encoded_ts',
+                 'detections', 'target', 'direction', 'reused', 'inference_time', 'draw_time')
+
+    def __init__(self, seq, frame=None, capture_ts=None, source_jpeg=None):
+        self.seq = seq
+        # Wall-clock capture time, comparable across processes / machines
+        self.capture_ts = capture_ts if capture_ts is not None else time.time()
+        self.frame = frame
+        self.source_jpeg = source_jpeg
+        self.jpeg = None
+        self.encoded_ts = None
+        # Set by the frame processor: DETECTION_DTYPE array, the row being
+        # steered towards (closest target) and the steering direction
+        self.detections = None
+        self.target = None
+        self.direction = None
+        # None until checked; True when detections were reused from an earlier frame
+        self.reused = None
+        # Seconds spent in the detector / drawing overlays, when they ran
+        self.inference_time = None
+        self.draw_time = None
+
+    def decode(self):
+        """Decode source_jpeg into frame (no-op if already decoded). Returns the frame or None."""
+        if self.frame is None and self.source_jpeg is not None:
+            self.frame = cv2.imdecode(np.frombuffer(self.source_jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return self.frame
+
+    def detection_record(self):
+        """Compact JSON-ready summary: normalised [ymin, xmin, ymax, xmax] boxes, scores, count, direction."""
+        dets = self.detections
+        if dets is None or len(dets) == 0:
+            boxes, scores = [], []
+        else:
+            boxes = [[round(float(v), 4) for v in (d['ymin'], d['xmin'], d['ymax'], d['xmax'])] for d in dets]
+            scores = [round(float(v), 3) for v in dets['score']]
+        return {
+            "seq": self.seq,
+            "ts": round(self.capture_ts, 3),
+            "boxes": boxes,
+            "scores": scores,
+            "persons": len(scores),
+            "direction": self.direction,
+        }
+
+    @property
+    def latency(self):
+        """Seconds from capture to encode (None until encoded)."""
+        if self.encoded_ts is None:
+            return None
+        return self.encoded_ts - self.capture_ts
+
+
+class LatestQueue:
+    """
+    Bounded queue between two pipeline stages. When full, put() drops the
+    oldest item instead of blocking, so a slow consumer always gets the
+    freshest frames and latency stays bounded.
+    """
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = deque()
+        self._cond = Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            if self._closed:
+                return
+            while len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Next item, or None once the queue is closed and empty (or on timeout)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout=timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,129 @@
+import numpy as np
+
+# One row per kept detection. Boxes are kept both normalised (for tracking)
+# and in pixels (for drawing); area is in pixels, x_deviation is 0.5 - x_center
+# in normalised units (positive = target is left of centre).
+DETECTION_DTYPE = np.dtype([
+    ('ymin', 'f4'), ('xmin', 'f4'), ('ymax', 'f4'), ('xmax', 'f4'),
+    ('left', 'i4'), ('top', 'i4'), ('right', 'i4'), ('bottom', 'i4'),
+    ('class_id', 'i2'), ('score', 'f4'), ('area', 'f4'), ('x_deviation', 'f4'),
+])
+
+# Class ids above this are treated as "not a target"
+MAX_CLASS_ID = 255
+
+
+def parse_labels(lines):
+    """Map class id -> name from coco_labels.txt style lines ("0  person") or plain names."""
+    labels = {}
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split(maxsplit=1)
+        if len(parts) == 2 and parts[0].isdigit():
+            labels[int(parts[0])] = parts[1].strip()
+        else:
+            labels[i] = line
+    return labels
+
+
+def compile_target_classes(labels, target_names=('person',)):
+    """
+    Boolean lookup table indexed by class id, built once from the label file
+    so the per-frame path never touches strings. `labels` may be the raw label
+    lines or an id -> name dict.
+    """
+    if not isinstance(labels, dict):
+        labels = parse_labels(labels)
+    names = [name.strip().lower() for name in target_names if name.strip()]
+
+    mask = np.zeros(MAX_CLASS_ID + 1, dtype=bool)
+    for class_id, label in labels.items():
+        if 0 <= class_id <= MAX_CLASS_ID and any(name in label.lower() for name in names):
+            mask[class_id] = True
+    # COCO models put person at index 0, even without a label file
+    if 'person' in names and not labels:
+        mask[0] = True
+    return mask
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of normalised [ymin, xmin, ymax, xmax] boxes, shape (len(a), len(b))."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    ymin = np.maximum(a[:, None, 0], b[None, :, 0])
+    xmin = np.maximum(a[:, None, 1], b[None, :, 1])
+    ymax = np.minimum(a[:, None, 2], b[None, :, 2])
+    xmax = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ymax - ymin, 0, None) * np.clip(xmax - xmin, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression. Returns kept indices, highest score first."""
+    order = np.argsort(-scores, kind='stable')
+    if len(order) <= 1:
+        return order
+    ious = iou_matrix(boxes[order], boxes[order])
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(order[i])
+        suppressed |= ious[i] > iou_threshold
+    return np.asarray(keep, dtype=np.intp)
+
+
+def to_detections(boxes, scores, class_ids, frame_width, frame_height):
+    """Build a DETECTION_DTYPE array from normalised boxes."""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    out = np.empty(len(boxes), dtype=DETECTION_DTYPE)
+    if len(boxes) == 0:
+        return out
+
+    out['ymin'], out['xmin'], out['ymax'], out['xmax'] = boxes.T
+    out['left'] = boxes[:, 1] * frame_width
+    out['right'] = boxes[:, 3] * frame_width
+    out['top'] = boxes[:, 0] * frame_height
+    out['bottom'] = boxes[:, 2] * frame_height
+    out['class_id'] = class_ids
+    out['score'] = scores
+    out['area'] = (out['right'] - out['left']) * (out['bottom'] - out['top'])
+    out['x_deviation'] = 0.5 - (boxes[:, 1] + boxes[:, 3]) * 0.5
+    return out
+
+
+class PostProcessor:
+    """
+    Array-form replacement for the per-box Python loops: score threshold,
+    target-class mask, optional NMS and top-k, then pixel coordinates, areas
+    and centre deviation. Returns a compact DETECTION_DTYPE array sorted by
+    score.
+    """
+    def __init__(self, labels, target_names=('person',), score_threshold=0.3, top_k=None, nms_iou=None):
+        self.target_mask = compile_target_classes(labels, target_names)
+        self.score_threshold = score_threshold
+        self.top_k = top_k
+        self.nms_iou = nms_iou
+
+    def __call__(self, boxes, classes, scores, frame_width, frame_height):
+        class_ids = classes.astype(np.intp)
+        np.clip(class_ids, 0, MAX_CLASS_ID, out=class_ids)
+        keep = np.flatnonzero((scores > self.score_threshold) & self.target_mask[class_ids])
+
+        kept_boxes = boxes[keep]
+        kept_scores = scores[keep]
+        if self.nms_iou is not None and len(keep) > 1:
+            order = nms(kept_boxes, kept_scores, self.nms_iou)
+        else:
+            order = np.argsort(-kept_scores, kind='stable')
+        if self.top_k is not None:
+            order = order[:self.top_k]
+
+        return to_detections(kept_boxes[order], kept_scores[order], class_ids[keep][order],
+                             frame_width, frame_height)
@@ -0,0 +1,306 @@
+"""
+Opt-in sampling profiler for Flask requests and the stream pipelines.
+
+Enable with ASAR_PROFILE=1 or POST /profiling?enabled=1. A sampler thread
+then snapshots the stacks of tracked threads (the thread serving each
+request, and every stream's capture / inference / encode threads) every
+ASAR_PROFILE_INTERVAL_MS. Samples are grouped into profiles: one per
+request, and one per ASAR_PROFILE_WINDOW seconds for long-running work
+(streams, MJPEG viewers). The last ASAR_PROFILE_KEEP profiles are kept and
+can be downloaded as collapsed stacks ("frame;frame;frame count" lines),
+the input format of flamegraph.pl, speedscope and inferno.
+
+section(name) marks a region, e.g. detect_objects or cv2.imencode. Its wall
+time is added to the thread's profile, and the name appears as a [name]
+frame in the sampled stacks. While profiling is off, section() returns a
+shared no-op context manager and nothing else runs.
+"""
+import itertools
+import os
+import sys
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from functools import wraps
+from threading import Lock, Thread, get_ident
+
+PROFILE_ENABLED = os.environ.get("ASAR_PROFILE", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.environ.get("ASAR_PROFILE_INTERVAL_MS", 5))
+PROFILE_WINDOW = float(os.environ.get("ASAR_PROFILE_WINDOW", 10))
+PROFILE_KEEP = int(os.environ.get("ASAR_PROFILE_KEEP", 20))
+
+_NO_SECTION = nullcontext()
+_ids = itertools.count(1)
+
+
+class Profile:
+    """Samples and section times of one request or one window of a long-running task."""
+    def __init__(self, name, kind, interval):
+        self.id = next(_ids)
+        self.name = name
+        self.kind = kind
+        self.interval = interval
+        self.started = time.time()
+        self.duration = None
+        self.samples = Counter()
+        # section name -> [seconds, count]
+        self.sections = {}
+        # The sampler and section exits write while requests read
+        self._lock = Lock()
+
+    def add_samples(self, stacks):
+        with self._lock:
+            self.samples.update(stacks)
+
+    def add_section(self, name, seconds):
+        with self._lock:
+            entry = self.sections.get(name)
+            if entry is None:
+                self.sections[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def snapshot(self):
+        """(samples, sections) copies that are safe to iterate."""
+        with self._lock:
+            return Counter(self.samples), {name: tuple(entry) for name, entry in self.sections.items()}
+
+    def collapsed(self):
+        samples, _ = self.snapshot()
+        return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+    def summary(self, top=10):
+        samples, sections = self.snapshot()
+        total = sum(samples.values())
+        # Innermost real frame of each stack, weighted by its samples
+        leaves = Counter()
+        for stack, count in samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return {
+            "id": self.id,
+            "name": self.name,
+            "kind": self.kind,
+            "started": round(self.started, 3),
+            "duration_ms": round(1000 * self.duration, 1) if self.duration is not None else None,
+            "samples": total,
+            "interval_ms": round(1000 * self.interval, 2),
+            "sections": {name: {"ms": round(1000 * seconds, 2), "count": count}
+                         for name, (seconds, count) in sorted(sections.items(), key=lambda s: -s[1][0])},
+            "top": [{"frame": frame, "samples": count} for frame, count in leaves.most_common(top)],
+        }
+
+
+class _Tracked:
+    __slots__ = ('name', 'kind', 'threads', 'profile', 'window_start')
+
+    def __init__(self, name, kind, threads, profile):
+        self.name = name
+        self.kind = kind
+        self.threads = set(threads)
+        self.profile = profile
+        self.window_start = time.monotonic()
+
+
+class Profiler:
+    """See the module docstring. One instance per process: `profiler` below."""
+    def __init__(self, interval_ms=5.0, window=10.0, keep=20):
+        self.interval = interval_ms / 1000.0
+        self.window = window
+        self.enabled = False
+        self.history = deque(maxlen=keep)
+
+        self._lock = Lock()
+        self._tracked = {}
+        # Callables returning [(key, name, thread ids)] for tasks that outlive requests
+        self._sources = []
+        self._source_handles = {}
+        # thread id -> [(section name, stack depth)] of the sections it is in
+        self._sections = {}
+        self._labels = {}
+        self._thread = None
+
+    # --- Control ---
+    def enable(self):
+        with self._lock:
+            if self.enabled:
+                return
+            self.enabled = True
+            self._thread = Thread(target=self._sample_loop, daemon=True, name="profiler")
+            self._thread.start()
+        print(f"Profiling enabled ({1000 * self.interval:.1f} ms interval)")
+
+    def disable(self):
+        with self._lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+            thread = self._thread
+        thread.join(timeout=1.0)
+        print("Profiling disabled")
+
+    def add_source(self, source):
+        """source() -> [(key, name, thread ids)]: long-running tasks to profile while they exist."""
+        self._sources.append(source)
+
+    def track(self, name, kind="request", threads=None):
+        """Start profiling the given threads (default: the calling one). Returns a handle, or None when off."""
+        if not self.enabled:
+            return None
+        handle = object()
+        tracked = _Tracked(name, kind, threads or [get_ident()], Profile(name, kind, self.interval))
+        with self._lock:
+            self._tracked[handle] = tracked
+        return handle
+
+    def untrack(self, handle):
+        if handle is None:
+            return
+        with self._lock:
+            tracked = self._tracked.pop(handle, None)
+        if tracked is not None:
+            self._finish(tracked)
+
+    def _finish(self, tracked):
+        profile = tracked.profile
+        profile.duration = time.monotonic() - tracked.window_start
+        # Requests that never got sampled and never entered a section are not worth a slot
+        if profile.samples or profile.sections:
+            self.history.append(profile)
+
+    # --- Sections ---
+    def section(self, name):
+        if not self.enabled:
+            return _NO_SECTION
+        return _Section(self, name)
+
+    def _enter(self, name):
+        frame = sys._getframe(2)
+        depth = 0
+        while frame is not None:
+            depth += 1
+            frame = frame.f_back
+        tid = get_ident()
+        self._sections.setdefault(tid, []).append((name, depth))
+
+    def _exit(self, name, seconds):
+        tid = get_ident()
+        stack = self._sections.get(tid)
+        if stack:
+            stack.pop()
+            if not stack:
+                self._sections.pop(tid, None)
+        for tracked in list(self._tracked.values()):
+            if tid in tracked.threads:
+                tracked.profile.add_section(name, seconds)
+
+    # --- Sampler thread ---
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _stack(self, frame, sections):
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        # Sections appear as [name] frames where they were entered
+        for name, depth in reversed(sections):
+            labels.insert(min(depth, len(labels)), f"[{name}]")
+        return ";".join(labels)
+
+    def _sync_sources(self):
+        seen = set()
+        for source in self._sources:
+            try:
+                tasks = source()
+            except Exception as e:
+                print(f"Profiler source failed: {e}")
+                continue
+            for key, name, threads in tasks:
+                seen.add(key)
+                if key not in self._source_handles:
+                    self._source_handles[key] = self.track(name, "stream", [t for t in threads if t])
+        for key in list(self._source_handles):
+            if key not in seen:
+                self.untrack(self._source_handles.pop(key))
+
+    def _sample_loop(self):
+        last_sync = 0.0
+        me = get_ident()
+        while self.enabled:
+            now = time.monotonic()
+            if now - last_sync >= 1.0:
+                self._sync_sources()
+                last_sync = now
+
+            # Tasks first, so a thread tracked after the snapshot is not sampled with an old stack
+            with self._lock:
+                tracked = list(self._tracked.values())
+            frames = sys._current_frames()
+            for task in tracked:
+                stacks = [self._stack(frames[tid], tuple(self._sections.get(tid, ())))
+                          for tid in task.threads if tid in frames and tid != me]
+                if stacks:
+                    task.profile.add_samples(stacks)
+                # Long-running tasks are cut into windows so their profiles become available
+                if now - task.window_start >= self.window:
+                    self._finish(task)
+                    task.profile = Profile(task.name, task.kind, self.interval)
+                    task.window_start = now
+            del frames
+            time.sleep(self.interval)
+
+        # Stopped: close every open profile
+        for key in list(self._source_handles):
+            self.untrack(self._source_handles.pop(key))
+        with self._lock:
+            tracked, self._tracked = list(self._tracked.values()), {}
+        for task in tracked:
+            self._finish(task)
+
+    # --- Results ---
+    def profiles(self):
+        return [profile.summary(top=5) for profile in reversed(self.history)]
+
+    def get(self, profile_id):
+        for profile in self.history:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+
+class _Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def tagged(name):
+    """Decorator: run the function inside profiler.section(name)."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiler.section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+profiler = Profiler(interval_ms=PROFILE_INTERVAL_MS, window=PROFILE_WINDOW, keep=PROFILE_KEEP)
+if PROFILE_ENABLED:
+    profiler.enable()
@@ -1,9 +1,41 @@
+import os
 import socket
+import time
+
+from steering import unpack_command
 
 # Listen on all interfaces so we can receive from outside
-UDP_IP = "0.0.0.0" 
+UDP_IP = "0.0.0.0"
 # This port must match what you send in the URL (e.g. &port=9999)
 UDP_PORT = 9999
+# Staleness does not assume the robot's clock agrees with the server's.
+# arrival - ts is clock skew plus delay; its lowest value over the last two
+# BASELINE_WINDOWs counts as "no delay", and commands that arrive more than
+# MAX_DELAY seconds later than that are ignored.
+MAX_DELAY = float(os.environ.get("ASAR_MAX_COMMAND_DELAY", 0.5))
+BASELINE_WINDOW = 30.0
+# After this long without datagrams any seq is accepted (the server may have restarted)
+SEQ_RESET_AFTER = 5.0
+
+
+class DelayBaseline:
+    """Windowed minimum of arrival - ts, so a clock step is forgotten after two windows."""
+    def __init__(self, window):
+        self.window = window
+        self.started = None
+        self.current = None
+        self.previous = None
+
+    def delay(self, arrival, ts):
+        offset = arrival - ts
+        if self.started is None or arrival - self.started >= self.window:
+            self.started = arrival
+            self.previous, self.current = self.current, None
+        if self.current is None or offset < self.current:
+            self.current = offset
+        baseline = self.current if self.previous is None else min(self.current, self.previous)
+        return offset - baseline
+
 
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 try:
@@ -11,9 +43,38 @@ try:
     print(f"Listening for movement commands on port {UDP_PORT}...")
     print("Press Ctrl+C to stop.")
 
+    last_seq = None
+    last_arrival = None
+    baseline = DelayBaseline(BASELINE_WINDOW)
     while True:
         data, addr = sock.recvfrom(1024) # buffer size is 1024 bytes
-        print(f"Received from {addr}: {data.decode()}")
+        arrival = time.time()
+        command = unpack_command(data)
+        if command is None:
+            # Older backends send the bare direction text
+            print(f"Received from {addr}: {data.decode(errors='replace')}")
+            continue
+
+        if last_arrival is not None and arrival - last_arrival > SEQ_RESET_AFTER:
+            last_seq = None
+        last_arrival = arrival
+
+        # Drop reordered / duplicate datagrams (seq is a wrapping uint32)
+        if last_seq is not None and ((command["seq"] - last_seq) & 0xFFFFFFFF) >= 0x80000000:
+            print(f"Dropped out-of-order seq {command['seq']} (last {last_seq})")
+            continue
+        if last_seq is not None and command["seq"] == last_seq:
+            continue
+        last_seq = command["seq"]
+
+        delay = baseline.delay(arrival, command["ts"])
+        if delay > MAX_DELAY:
+            print(f"Dropped stale seq {command['seq']} ({delay:.2f}s late)")
+            continue
+
+        kind = "heartbeat" if command["heartbeat"] else "command"
+        print(f"Received {kind} #{command['seq']} from {addr}: {command['direction']} "
+              f"box={[round(v, 3) for v in command['box']]} delay={delay * 1000:.0f}ms")
 except OSError as e:
     print(f"Error: Could not bind to port {UDP_PORT}. Is it already in use?")
     print(f"Details: {e}")
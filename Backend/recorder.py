@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import time
+from threading import Lock, Thread
+
+import numpy as np
+
+from pipeline import LatestQueue
+
+# One index record per frame: capture time, byte offset and length in the segment file
+INDEX_DTYPE = np.dtype([('ts', '<f8'), ('offset', '<u8'), ('length', '<u4')])
+
+SEGMENT_EXT = '.mjpeg'
+INDEX_EXT = '.idx'
+
+
+def stream_id(source_url):
+    """Short, filesystem-safe directory name for a source URL."""
+    return hashlib.sha1(source_url.encode('utf-8')).hexdigest()[:12]
+
+
+class Recorder:
+    """
+    Records one stream's JPEG frames into rolling segment files.
+
+    Each segment is the frames' JPEG bytes back to back (<start ms>.mjpeg) plus
+    a fixed-width index (<start ms>.idx, INDEX_DTYPE) mapping capture
+    timestamps to byte offsets, so replay can seek without parsing or
+    decoding. record() only queues the bytes; a writer thread does buffered
+    writes, rotates every segment_seconds and deletes the oldest segments
+    under `root` once it exceeds quota_bytes. If the disk cannot keep up the
+    oldest queued frames are dropped, never the pipeline.
+
+    annotated=True records the frames as viewers see them (with overlays);
+    False records the source JPEGs untouched where the source provides them.
+    """
+    def __init__(self, root, source_url, annotated=True, segment_seconds=60.0, quota_bytes=2 << 30,
+                 queue_size=64, flush_interval=1.0):
+        self.root = root
+        self.source_url = source_url
+        self.annotated = annotated
+        self.directory = os.path.join(root, stream_id(source_url))
+        self.segment_seconds = segment_seconds
+        self.quota_bytes = quota_bytes
+        self.flush_interval = flush_interval
+
+        self._queue = LatestQueue(maxsize=queue_size)
+        self._data = None
+        self._index = None
+        self._segment_start = None
+        self._offset = 0
+        self._last_flush = 0.0
+
+        self.frames = 0
+        self.bytes = 0
+        self.segments = 0
+        self.errors = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'stream.json'), 'w') as f:
+            json.dump({"source": source_url}, f)
+
+        self._thread = Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped(self):
+        return self._queue.dropped
+
+    def record(self, ts, jpeg):
+        """Queue one frame (never blocks)."""
+        if jpeg is not None:
+            self._queue.put((ts, jpeg))
+
+    def close(self):
+        """Stop after writing what is already queued."""
+        self._queue.close()
+
+    # --- Writer thread ---
+    def _write_loop(self):
+        try:
+            while True:
+                item = self._queue.get(timeout=self.flush_interval)
+                if item is None:
+                    if self._queue.closed and not len(self._queue):
+                        break
+                    self._flush()
+                    continue
+                try:
+                    self._write(*item)
+                except OSError as e:
+                    self.errors += 1
+                    print(f"Recorder write failed: {e}")
+                    self._close_segment()
+        finally:
+            self._close_segment()
+
+    def _write(self, ts, jpeg):
+        if self._data is None or ts - self._segment_start >= self.segment_seconds:
+            self._rotate(ts)
+        self._data.write(jpeg)
+        self._index.write(np.array([(ts, self._offset, len(jpeg))], dtype=INDEX_DTYPE).tobytes())
+        self._offset += len(jpeg)
+        self.frames += 1
+        self.bytes += len(jpeg)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    def _flush(self):
+        # Data before index, so an index entry never points past the flushed data
+        if self._data is not None:
+            self._data.flush()
+            self._index.flush()
+        self._last_flush = time.monotonic()
+
+    def _rotate(self, ts):
+        self._close_segment()
+        name = str(int(ts * 1000))
+        self._data = open(os.path.join(self.directory, name + SEGMENT_EXT), 'ab', buffering=1 << 20)
+        self._index = open(os.path.join(self.directory, name + INDEX_EXT), 'ab', buffering=64 << 10)
+        self._segment_start = ts
+        self._offset = self._data.tell()
+        self.segments += 1
+        enforce_quota(self.root, self.quota_bytes)
+
+    def _close_segment(self):
+        if self._data is not None:
+            self._flush()
+            self._data.close()
+            self._index.close()
+            self._data = self._index = None
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "segments": self.segments,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+_quota_lock = Lock()
+
+
+def enforce_quota(root, quota_bytes):
+    """Delete the oldest segments under root until it fits in quota_bytes. Never deletes a stream's newest segment."""
+    if not quota_bytes:
+        return
+    with _quota_lock:
+        segments = []
+        total = 0
+        for sid in os.listdir(root):
+            directory = os.path.join(root, sid)
+            if not os.path.isdir(directory):
+                continue
+            names = sorted(int(n[:-len(SEGMENT_EXT)]) for n in os.listdir(directory)
+                           if n.endswith(SEGMENT_EXT) and n[:-len(SEGMENT_EXT)].isdigit())
+            for i, start in enumerate(names):
+                path = os.path.join(directory, str(start))
+                size = _size(path + SEGMENT_EXT) + _size(path + INDEX_EXT)
+                total += size
+                if i < len(names) - 1:
+                    segments.append((start, path, size))
+
+        for start, path, size in sorted(segments):
+            if total <= quota_bytes:
+                break
+            for ext in (SEGMENT_EXT, INDEX_EXT):
+                try:
+                    os.remove(path + ext)
+                except OSError:
+                    pass
+            total -= size
+            print(f"Recorder quota: removed segment {path}")
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class RecordingStore:
+    """Read side of the recordings directory: listing, seeking and reading frames without decoding."""
+    def __init__(self, root):
+        self.root = root
+
+    def _directory(self, sid):
+        # Only ids we generated (hex) are valid path components
+        if not sid or not all(c in '0123456789abcdef' for c in sid):
+            return None
+        directory = os.path.join(self.root, sid)
+        return directory if os.path.isdir(directory) else None
+
+    def segment_ids(self, sid):
+        directory = self._directory(sid)
+        if directory is None:
+            return []
+        return sorted(int(n[:-len(SEGMENT_EXT)]) for n in os.listdir(directory)
+                      if n.endswith(SEGMENT_EXT) and n[:-len(SEGMENT_EXT)].isdigit())
+
+    def segment_path(self, sid, segment):
+        directory = self._directory(sid)
+        if directory is None or not str(segment).isdigit():
+            return None
+        path = os.path.join(directory, f"{int(segment)}{SEGMENT_EXT}")
+        return path if os.path.exists(path) else None
+
+    def read_index(self, sid, segment):
+        directory = self._directory(sid)
+        if directory is None:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        path = os.path.join(directory, f"{int(segment)}{INDEX_EXT}")
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        # Ignore a partially written trailing record
+        usable = len(data) - len(data) % INDEX_DTYPE.itemsize
+        return np.frombuffer(data[:usable], dtype=INDEX_DTYPE)
+
+    def streams(self):
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for sid in sorted(os.listdir(self.root)):
+            if self._directory(sid) is None:
+                continue
+            try:
+                with open(os.path.join(self.root, sid, 'stream.json')) as f:
+                    source = json.load(f).get("source")
+            except (OSError, ValueError):
+                source = None
+            segments = []
+            for segment in self.segment_ids(sid):
+                index = self.read_index(sid, segment)
+                segments.append({
+                    "id": segment,
+                    "start": float(index['ts'][0]) if len(index) else segment / 1000.0,
+                    "end": float(index['ts'][-1]) if len(index) else None,
+                    "frames": len(index),
+                    "bytes": _size(self.segment_path(sid, segment)),
+                })
+            result.append({"stream": sid, "source": source, "segments": segments})
+        return result
+
+    def seek(self, sid, ts):
+        """(segment, position in its index) of the first frame at or after ts, or None."""
+        for segment in self.segment_ids(sid):
+            index = self.read_index(sid, segment)
+            if len(index) and index['ts'][-1] >= ts:
+                return segment, int(np.searchsorted(index['ts'], ts, side='left'))
+        return None
+
+    def frames(self, sid, ts=0.0):
+        """Yield (ts, jpeg bytes) from ts onwards across segments, read straight from disk."""
+        start = self.seek(sid, ts)
+        if start is None:
+            return
+        first_segment, position = start
+        for segment in self.segment_ids(sid):
+            if segment < first_segment:
+                continue
+            path = self.segment_path(sid, segment)
+            index = self.read_index(sid, segment)
+            if path is None:
+                continue
+            with open(path, 'rb') as f:
+                for record in index[position:]:
+                    f.seek(int(record['offset']))
+                    yield float(record['ts']), f.read(int(record['length']))
+            position = 0
@@ -0,0 +1,100 @@
+import time
+from threading import Event, Lock, Thread
+
+
+class _Entry:
+    __slots__ = ('resolved', 'ok', 'expires', 'stale_until', 'refreshing', 'ready')
+
+    def __init__(self):
+        self.resolved = None
+        self.ok = False
+        self.expires = 0.0
+        self.stale_until = 0.0
+        self.refreshing = False
+        self.ready = Event()
+
+
+class StreamResolver:
+    """
+    Caches page URL -> stream URL lookups.
+
+    Successful lookups are fresh for `ttl` seconds. After that they are
+    served stale for up to `stale_ttl` more seconds while a background
+    thread revalidates them. Failed lookups are cached for `negative_ttl`
+    seconds, resolving to the original URL. Concurrent requests for the
+    same URL share a single lookup.
+    """
+    def __init__(self, resolve_fn, ttl=300.0, stale_ttl=3600.0, negative_ttl=10.0):
+        # resolve_fn(url) -> stream url; raises on failure
+        self.resolve_fn = resolve_fn
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, url):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry.ready.is_set():
+                if now < entry.expires:
+                    self.hits += 1
+                    return entry.resolved
+                if entry.ok and now < entry.stale_until:
+                    # Serve stale immediately, refresh in the background
+                    self.hits += 1
+                    if not entry.refreshing:
+                        entry.refreshing = True
+                        Thread(target=self._refresh, args=(url, entry), daemon=True).start()
+                    return entry.resolved
+                entry = None
+
+            if entry is None:
+                # Nobody is resolving this URL yet: we will
+                self.misses += 1
+                entry = _Entry()
+                entry.refreshing = True
+                self._entries[url] = entry
+                owner = True
+            else:
+                # Another request is already resolving it: wait for that one
+                owner = False
+
+        if owner:
+            self._refresh(url, entry)
+        else:
+            entry.ready.wait()
+        return entry.resolved
+
+    def _refresh(self, url, entry):
+        try:
+            resolved = self.resolve_fn(url)
+            ok = True
+        except Exception as e:
+            print(f"Stream URL lookup failed for {url}: {e}")
+            resolved = url
+            ok = False
+
+        now = time.monotonic()
+        with self._lock:
+            if ok or not entry.ok:
+                entry.resolved = resolved
+                entry.ok = ok
+                entry.expires = now + (self.ttl if ok else self.negative_ttl)
+                entry.stale_until = entry.expires + self.stale_ttl if ok else entry.expires
+            else:
+                # Revalidation failed: keep serving the last good answer until it goes stale
+                entry.expires = now + self.negative_ttl
+            entry.refreshing = False
+        entry.ready.set()
+
+    def invalidate(self, url=None):
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
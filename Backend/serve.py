@@ -0,0 +1,168 @@
+"""
+Pre-fork server for the backend.
+
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 5000] [--server flask|async]
+                    [--threads N] [--pool-size N] [--model PATH] [--warmup]
+
+The parent binds the listening socket, reads the model file into the page
+cache and forks N workers that accept on the shared socket. Nothing
+model-related is loaded before the fork: each worker imports app.py and
+builds its own interpreter pool (lazily, or right away with --warmup) from
+the memory-mapped model file, so the weights are shared through the page
+cache and a worker starts in well under a second. Workers that die are
+replaced.
+
+Every source is owned by one worker, chosen by hashing its stream id
+(app.stream_owner). Each worker also listens on its own loopback socket, and
+a worker that receives /process-video, /detections or /ws/video for a source
+it does not own relays the request to the owner. So a source is still
+decoded and run through the detector once however many viewers it has, and
+the robot gets steering datagrams from one publisher with one seq counter.
+Other per-process state (/stream-status, /metrics, the model) is per worker.
+
+--server async runs async_server.py's aiohttp app in every worker instead of
+the threaded werkzeug server. Without os.fork (Windows) only one worker runs.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from config import Config
+from detector import preload_model_file
+
+# A worker that exits sooner than this after starting is not restarted in a tight loop
+RESTART_BACKOFF = 1.0
+
+
+def listen(host, port):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index, sock, server, internal=None):
+    """
+    Child process: import the backend (after the fork) and serve on the
+    inherited socket, plus `internal`, where other workers relay the
+    streams this one owns.
+    """
+    os.environ["ASAR_WORKER_INDEX"] = str(index)
+    import app as backend
+    print(f"Worker {index} (pid {os.getpid()}) serving on {sock.getsockname()}")
+    sockets = [sock] if internal is None else [sock, internal]
+    if server == 'async':
+        from aiohttp import web
+        import async_server
+        web.run_app(async_server.make_app(), sock=sockets, print=None)
+    else:
+        from werkzeug.serving import make_server
+        servers = [make_server(*s.getsockname()[:2], backend.app, threaded=True, fd=s.fileno()) for s in sockets]
+        for extra in servers[1:]:
+            threading.Thread(target=extra.serve_forever, daemon=True).start()
+        servers[0].serve_forever()
+
+
+def spawn(index, sock, server, internal=None):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            run_worker(index, sock, server, internal)
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            print(f"Worker {index} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the backend with several worker processes")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--server', choices=('flask', 'async'), default='flask')
+    parser.add_argument('--threads', type=int, help="Interpreter threads (default ASAR_INTERPRETER_THREADS or 1)")
+    parser.add_argument('--pool-size', type=int,
+                        help="Interpreters per worker (default: the cores divided between the workers)")
+    parser.add_argument('--model', help="Model file (default ASAR_MODEL_PATH or the bundled SSD)")
+    parser.add_argument('--warmup', action='store_true', help="Load the model as soon as each worker starts")
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    if not hasattr(os, 'fork') and workers > 1:
+        print("os.fork is not available here, running a single worker")
+        workers = 1
+
+    config = Config.from_env(model_path=args.model, interpreter_threads=args.threads,
+                             warmup=args.warmup or None)
+    pool_size = args.pool_size or (int(os.environ["ASAR_POOL_SIZE"]) if os.environ.get("ASAR_POOL_SIZE") else None)
+    if pool_size is None:
+        # Split the cores between the workers instead of giving each all of them
+        pool_size = max(1, (os.cpu_count() or 1) // (workers * config.interpreter_threads))
+    config.pool_size = pool_size
+
+    size = preload_model_file(config.model_path)
+    if size:
+        print(f"Model {config.model_path} ({size / (1 << 20):.1f} MB) in page cache")
+
+    sock = listen(args.host, args.port)
+    # One loopback socket per worker, bound here so a restarted worker gets the same address
+    internal = [listen('127.0.0.1', 0) for _ in range(workers)] if workers > 1 else [None]
+    config.stream_peers = [f"http://127.0.0.1:{s.getsockname()[1]}" for s in internal if s]
+    # Workers rebuild the config from the environment when they import app.py
+    os.environ.update(config.environ())
+    print(f"Listening on {args.host}:{args.port} with {workers} {args.server} worker(s), "
+          f"{config.pool_size} x {config.interpreter_threads} interpreter thread(s) each")
+
+    if workers == 1 and not hasattr(os, 'fork'):
+        run_worker(0, sock, args.server)
+        return
+
+    children = {}
+    for index in range(workers):
+        children[spawn(index, sock, args.server, internal[index])] = (index, time.monotonic())
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index, started = children.pop(pid, (None, None))
+        if index is None or stopping:
+            continue
+        print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+        if time.monotonic() - started < RESTART_BACKOFF:
+            time.sleep(RESTART_BACKOFF)
+        children[spawn(index, sock, args.server, internal[index])] = (index, time.monotonic())
+    sock.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import socket
+import struct
+import time
+from threading import Lock
+
+# Datagram layout (network byte order, 25 bytes):
+#   magic    2s  b'AS'
+#   version  B   STEERING_VERSION
+#   flags    B   bit 0 = heartbeat (command unchanged since the last datagram)
+#   seq      I   increments by one per datagram sent to a target set
+#   ts_ms    Q   capture time of the frame the decision came from (unix ms)
+#   command  B   see COMMANDS
+#   box      4H  target [ymin, xmin, ymax, xmax] scaled to 0..65535 (zeros if none)
+STEERING_FORMAT = struct.Struct('!2sBBIQB4H')
+STEERING_MAGIC = b'AS'
+STEERING_VERSION = 1
+FLAG_HEARTBEAT = 0x01
+
+COMMANDS = {None: 0, "forward": 1, "left": 2, "right": 3}
+COMMAND_NAMES = {code: name for name, code in COMMANDS.items()}
+
+
+def pack_command(seq, ts, direction, box=None, heartbeat=False):
+    if box is None:
+        scaled = (0, 0, 0, 0)
+    else:
+        scaled = tuple(int(min(max(v, 0.0), 1.0) * 65535) for v in box)
+    return STEERING_FORMAT.pack(STEERING_MAGIC, STEERING_VERSION, FLAG_HEARTBEAT if heartbeat else 0,
+                                seq & 0xFFFFFFFF, int(ts * 1000), COMMANDS.get(direction, 0), *scaled)
+
+
+def unpack_command(data):
+    """Decode a datagram into a dict, or None if it is not a steering datagram."""
+    if len(data) != STEERING_FORMAT.size:
+        return None
+    magic, version, flags, seq, ts_ms, command, *box = STEERING_FORMAT.unpack(data)
+    if magic != STEERING_MAGIC or version != STEERING_VERSION:
+        return None
+    return {
+        "seq": seq,
+        "ts": ts_ms / 1000.0,
+        "direction": COMMAND_NAMES.get(command),
+        "box": [v / 65535.0 for v in box],
+        "heartbeat": bool(flags & FLAG_HEARTBEAT),
+    }
+
+
+class SteeringPublisher:
+    """
+    Sends one steering decision per frame to every registered UDP target.
+    A command that has not changed is suppressed and only repeated as a
+    heartbeat every heartbeat_interval seconds. All sends are capped at
+    max_rate per second. Each datagram carries a sequence number and the
+    frame timestamp, so the robot can drop stale or reordered commands.
+    """
+    def __init__(self, heartbeat_interval=1.0, max_rate=20.0):
+        self.heartbeat_interval = heartbeat_interval
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+
+        self._lock = Lock()
+        self._targets = {}  # address -> refcount
+        self._sock = None
+
+        self.seq = 0
+        self.last_direction = None
+        self.last_sent = None
+        self.counters = {"sent": 0, "heartbeats": 0, "suppressed": 0, "rate_limited": 0, "errors": 0}
+
+    # --- Targets ---
+    def add_target(self, target_address):
+        with self._lock:
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._targets[target_address] = self._targets.get(target_address, 0) + 1
+
+    def remove_target(self, target_address):
+        with self._lock:
+            count = self._targets.get(target_address, 0) - 1
+            if count > 0:
+                self._targets[target_address] = count
+            else:
+                self._targets.pop(target_address, None)
+
+    @property
+    def has_targets(self):
+        return bool(self._targets)
+
+    def close(self):
+        with self._lock:
+            if self._sock:
+                self._sock.close()
+                self._sock = None
+            self._targets.clear()
+
+    # --- Publishing ---
+    def publish(self, direction, box=None, ts=None):
+        """Offer this frame's decision. Returns True if a datagram was sent."""
+        with self._lock:
+            if not self._targets:
+                return False
+            now = time.monotonic()
+            changed = direction != self.last_direction
+            since = None if self.last_sent is None else now - self.last_sent
+
+            if not changed and since is not None and since < self.heartbeat_interval:
+                self.counters["suppressed"] += 1
+                return False
+            if since is not None and since < self.min_interval:
+                # Too soon; a changed command stays "changed" and goes out on a later frame
+                self.counters["rate_limited"] += 1
+                return False
+
+            self.seq += 1
+            heartbeat = not changed and self.last_sent is not None
+            data = pack_command(self.seq, ts if ts is not None else time.time(), direction, box, heartbeat)
+            for address in self._targets:
+                try:
+                    self._sock.sendto(data, address)
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    print(f"Socket send error: {e}")
+
+            if changed:
+                print(f"Action: {direction or 'none'}")
+            self.counters["heartbeats" if heartbeat else "sent"] += 1
+            self.last_direction = direction
+            self.last_sent = now
+            return True
@@ -0,0 +1,461 @@
+import time
+from threading import Condition, Lock, Thread
+
+import cv2
+
+from delivery import VariantCache
+from frame_ring import RingFrame, detach
+from metrics import StreamMetrics
+from mjpeg import MjpegReader
+from pipeline import FramePacket, LatestQueue
+from profiler import profiler
+from steering import SteeringPublisher
+
+
+class SourceStream:
+    """
+    One capture -> inference -> encode pipeline for a single (resolved) source URL.
+    Each stage runs on its own thread, connected by LatestQueues, so encoding
+    and network sends overlap with inference and capture never falls behind
+    the camera. The latest encoded packet is broadcast to every subscriber,
+    so adding viewers does not add decodes or inferences.
+    """
+    def __init__(self, hub, source_url, process_frame, steering, recorder=None, capture=None):
+        self.hub = hub
+        self.source_url = source_url
+        # Called as process_frame(packet, draw): fills packet.detections / packet.target /
+        # packet.direction and draws onto packet.frame when draw is True
+        self.process_frame = process_frame
+
+        self.subscribers = 0
+        # Subscribers that want JPEG video (the rest only read detections)
+        self.video_subscribers = 0
+        self.frame_count = 0
+        self.last_latency = None
+        # Stage latency histograms and FPS; each stage thread writes its own histograms
+        self.metrics = StreamMetrics()
+
+        # Stage queues: capture keeps only the freshest frame for inference
+        self._to_infer = LatestQueue(maxsize=1)
+        self._to_encode = LatestQueue(maxsize=1)
+
+        # Latest encoded packet, guarded by the condition
+        self._cond = Condition()
+        self._latest = None
+        self._finished = False
+        self._stopped = False
+        # Callbacks run on the encode thread for every published packet (None when
+        # the stream ends); used by the asyncio server instead of a waiting thread
+        self._listeners = []
+
+        # One coalesced UDP steering decision per frame for every subscriber's target
+        self.steering = steering
+        # Re-encoded lower quality / scale variants of the latest packet, shared by adaptive viewers
+        self.variants = VariantCache()
+        # Optional Recorder: gets every published frame's JPEG, written off the hot path
+        self.recorder = recorder
+        # Optional frame_ring.CaptureProcess: decodes in another process into shared memory
+        self.capture = capture
+
+        self._threads = [
+            Thread(target=self._capture_loop, daemon=True),
+            Thread(target=self._infer_loop, daemon=True),
+            Thread(target=self._encode_loop, daemon=True),
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+
+    @property
+    def draws(self):
+        """Whether frames need overlays drawn: someone watches the video or it is being recorded annotated."""
+        return self.video_subscribers > 0 or (self.recorder is not None and self.recorder.annotated)
+
+    def _needs_jpeg(self, packet):
+        if self.draws:
+            return True
+        # Raw recording of a source that has no JPEG of its own
+        return self.recorder is not None and packet.source_jpeg is None
+
+    @property
+    def thread_ids(self):
+        return [thread.ident for thread in self._threads]
+
+    @property
+    def frames_dropped(self):
+        return self._to_infer.dropped + self._to_encode.dropped
+
+    # --- Pipeline stages ---
+    def _capture_loop(self):
+        print(f"Opening shared video stream: {self.source_url}")
+        try:
+            if self.capture is not None:
+                self._capture_ring()
+                return
+            # Native MJPEG first: no FFmpeg probing and no decode until inference wants the frame
+            reader = MjpegReader(self.source_url)
+            if self.source_url.startswith(('http://', 'https://')) and reader.open():
+                print("MJPEG stream detected. Reading JPEG parts directly...")
+                try:
+                    self._capture_mjpeg(reader)
+                finally:
+                    reader.close()
+            else:
+                self._capture_ffmpeg()
+        finally:
+            self._to_infer.close()
+
+    def _capture_mjpeg(self, reader):
+        seq = 0
+        start = time.perf_counter()
+        for jpeg in reader:
+            if self._stopped:
+                break
+            self.metrics.observe('capture', time.perf_counter() - start)
+            seq += 1
+            # Overwrites the pending frame if inference is still busy
+            self._to_infer.put(FramePacket(seq, source_jpeg=jpeg))
+            start = time.perf_counter()
+        print("MJPEG stream ended.")
+
+    def _capture_ring(self):
+        frames = self.capture.frames()
+        start = time.perf_counter()
+        try:
+            for seq, ts, frame in frames:
+                if self._stopped:
+                    break
+                self.metrics.observe('capture', time.perf_counter() - start)
+                # Decoded frame, still a view on the capture process's shared ring
+                self._to_infer.put(FramePacket(seq, frame, capture_ts=ts))
+                start = time.perf_counter()
+        finally:
+            frames.close()
+        print("Capture process ended.")
+
+    def _capture_ffmpeg(self):
+        # Force FFMPEG backend which is often more robust for network streams
+        cap = cv2.VideoCapture(self.source_url, cv2.CAP_FFMPEG)
+
+        if not cap.isOpened():
+            print(f"Failed to open video capture for URL: {self.source_url}")
+            return
+
+        print("Video capture opened successfully. Starting frame loop...")
+        seq = 0
+        try:
+            while not self._stopped:
+                start = time.perf_counter()
+                success, frame = cap.read()
+                if not success:
+                    print("Failed to read frame or stream ended.")
+                    break
+                self.metrics.observe('capture', time.perf_counter() - start)
+                seq += 1
+                # Overwrites the pending frame if inference is still busy
+                self._to_infer.put(FramePacket(seq, frame))
+        finally:
+            cap.release()
+            print("Video capture released.")
+
+    def _infer_loop(self):
+        # Processors may opt out of frames that would get no new annotations;
+        # those are forwarded as the original JPEG bytes when available
+        wants_frame = getattr(self.process_frame, 'wants_frame', None)
+        while True:
+            packet = self._to_infer.get()
+            if packet is None:
+                break
+
+            # optional: limit log rate
+            if self.frame_count % 30 == 0:
+                print(f"Processing frame {packet.seq} ({self.subscribers} viewers, "
+                      f"{self.frames_dropped} dropped, latency {self.last_latency or 0:.3f}s)")
+            self.frame_count += 1
+
+            if packet.source_jpeg is not None and wants_frame is not None and not wants_frame(packet):
+                self._steer(packet)
+                self._to_encode.put(packet)
+                continue
+
+            if packet.frame is None:
+                start = time.perf_counter()
+                if packet.decode() is None:
+                    print("Failed to decode frame.")
+                    continue
+                self.metrics.observe('decode', time.perf_counter() - start)
+
+            # Run detection once for all viewers; skip drawing if nobody watches video
+            try:
+                self.process_frame(packet, draw=self.draws)
+            except Exception as e:
+                print(f"Error during detection: {e}")
+            if packet.inference_time is not None:
+                self.metrics.observe('inference', packet.inference_time)
+            if packet.draw_time is not None:
+                self.metrics.observe('draw', packet.draw_time)
+
+            if isinstance(packet.frame, RingFrame):
+                # Only keep a ring slot's pixels if they will be encoded; the slot gets reused.
+                # A slot already reused has no frame left to show: its detections still go out.
+                packet.frame = detach(packet.frame) if self._needs_jpeg(packet) else None
+
+            self._steer(packet)
+            self._to_encode.put(packet)
+        self._to_encode.close()
+
+    def _steer(self, packet):
+        if not self.steering.has_targets:
+            return
+        target = packet.target
+        box = None if target is None else (target['ymin'], target['xmin'], target['ymax'], target['xmax'])
+        self.steering.publish(packet.direction, box, packet.capture_ts)
+
+    def _encode_loop(self):
+        try:
+            while True:
+                packet = self._to_encode.get()
+                if packet is None:
+                    break
+
+                if packet.frame is None:
+                    # Untouched MJPEG frame: pass the original bytes through
+                    packet.jpeg = packet.source_jpeg
+                elif not self._needs_jpeg(packet):
+                    # Detections-only consumers: nothing to encode
+                    pass
+                else:
+                    # Encode once for all viewers
+                    start = time.perf_counter()
+                    with profiler.section('cv2.imencode'):
+                        ret, buffer = cv2.imencode('.jpg', packet.frame)
+                    if not ret:
+                        print("Failed to encode frame.")
+                        continue
+                    packet.jpeg = buffer.tobytes()
+                    self.metrics.observe('encode', time.perf_counter() - start)
+                packet.encoded_ts = time.time()
+                self.metrics.frame_done()
+                if self.recorder is not None:
+                    self._record(packet)
+                self.last_latency = packet.latency
+
+                with self._cond:
+                    self._latest = packet
+                    self._cond.notify_all()
+                self._notify(packet)
+        finally:
+            self._finish()
+
+    def _record(self, packet):
+        if self.recorder.annotated or packet.source_jpeg is None:
+            self.recorder.record(packet.capture_ts, packet.jpeg)
+        else:
+            self.recorder.record(packet.capture_ts, packet.source_jpeg)
+
+    def _notify(self, packet):
+        for listener in self._listeners:
+            try:
+                listener(packet)
+            except Exception as e:
+                print(f"Stream listener failed: {e}")
+
+    def add_listener(self, callback):
+        """Call callback(packet) after each published packet and callback(None) when the stream ends."""
+        # Copy-on-write so the encode thread iterates without a lock
+        self._listeners = self._listeners + [callback]
+        if self._finished:
+            callback(None)
+
+    def remove_listener(self, callback):
+        self._listeners = [l for l in self._listeners if l is not callback]
+
+    @property
+    def latest(self):
+        return self._latest
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def _finish(self):
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+        self._notify(None)
+        self.steering.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.hub._discard(self)
+
+    def packets(self, timeout=5.0):
+        """Yield encoded FramePackets as they are produced. Slow viewers skip to the newest one."""
+        last_seq = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: (self._latest is not None and self._latest.seq != last_seq)
+                                    or self._finished, timeout=timeout)
+                packet = self._latest
+                if packet is None or packet.seq == last_seq:
+                    # Finished, or nothing new within the timeout
+                    if self._finished:
+                        return
+                    continue
+                last_seq = packet.seq
+            yield packet
+
+    def frames(self, timeout=5.0):
+        """Yield encoded JPEG bytes (see packets())."""
+        for packet in self.packets(timeout):
+            # Packets produced while only detection consumers were attached carry no JPEG
+            if packet.jpeg is not None:
+                yield packet.jpeg
+
+
+class Subscription:
+    """A single viewer of a SourceStream. Iterate for frames, close() when done."""
+    def __init__(self, hub, stream, target_address=None, video=True):
+        self.hub = hub
+        self.stream = stream
+        self.target_address = target_address
+        self.video = video
+        self.closed = False
+        self._queue = None
+        self._listener = None
+
+    def __iter__(self):
+        return self.stream.frames()
+
+    def packets(self):
+        return self.stream.packets()
+
+    def queued_packets(self, maxsize=2, timeout=5.0):
+        """
+        Packets through this subscriber's own send queue. The encode thread
+        fills it and drops the oldest packet when this viewer falls behind,
+        so a slow viewer never delays the stream or the other viewers.
+        """
+        self._queue = LatestQueue(maxsize=maxsize)
+
+        def enqueue(packet):
+            if packet is None:
+                self._queue.close()
+            else:
+                self._queue.put(packet)
+        self._listener = enqueue
+        self.stream.add_listener(enqueue)
+
+        while True:
+            packet = self._queue.get(timeout=timeout)
+            if packet is None:
+                if self._queue.closed or self.closed:
+                    return
+                continue
+            yield packet
+
+    @property
+    def dropped(self):
+        return self._queue.dropped if self._queue is not None else 0
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._listener is not None:
+            self.stream.remove_listener(self._listener)
+            self._queue.close()
+        if self.target_address:
+            self.stream.steering.remove_target(self.target_address)
+        self.hub._unsubscribe(self.stream, self.video)
+
+
+class StreamHub:
+    """
+    Registry of SourceStreams keyed by resolved source URL.
+    The first subscriber starts the loop and the last one to leave stops it.
+    make_processor() is called once per stream, so per-source state
+    (e.g. a tracker) is never shared between sources.
+    make_recorder(source_url), if given, may return a Recorder for the stream.
+    make_capture(source_url), if given, may return a frame_ring.CaptureProcess
+    that decodes the source in its own process. on_packet(source_url, packet),
+    if given, sees every published packet of every stream (None at the end).
+    """
+    def __init__(self, make_processor, make_steering=SteeringPublisher, make_recorder=None, make_capture=None,
+                 on_packet=None):
+        self.make_processor = make_processor
+        self.make_steering = make_steering
+        self.make_recorder = make_recorder
+        self.make_capture = make_capture
+        self.on_packet = on_packet
+        self._streams = {}
+        self._lock = Lock()
+
+    def subscribe(self, source_url, target_address=None, video=True):
+        with self._lock:
+            stream = self._streams.get(source_url)
+            if stream is None:
+                recorder = self.make_recorder(source_url) if self.make_recorder else None
+                capture = self.make_capture(source_url) if self.make_capture else None
+                stream = SourceStream(self, source_url, self.make_processor(), self.make_steering(), recorder,
+                                      capture)
+                self._streams[source_url] = stream
+                if self.on_packet is not None:
+                    stream.add_listener(lambda packet, url=source_url: self.on_packet(url, packet))
+                stream.start()
+            stream.subscribers += 1
+            if video:
+                stream.video_subscribers += 1
+        if target_address:
+            stream.steering.add_target(target_address)
+        print(f"Viewer joined {source_url} ({stream.subscribers} total)")
+        return Subscription(self, stream, target_address, video)
+
+    def _unsubscribe(self, stream, video=True):
+        with self._lock:
+            stream.subscribers -= 1
+            if video:
+                stream.video_subscribers -= 1
+            remaining = stream.subscribers
+            if remaining <= 0:
+                # Last viewer left: stop the loop and forget the stream
+                if self._streams.get(stream.source_url) is stream:
+                    del self._streams[stream.source_url]
+                stream.stop()
+        print(f"Viewer left {stream.source_url} ({max(remaining, 0)} remaining)")
+
+    def _discard(self, stream):
+        # Called when a stream ends on its own (source closed / failed to open)
+        with self._lock:
+            if self._streams.get(stream.source_url) is stream:
+                del self._streams[stream.source_url]
+
+    def active_streams(self):
+        with self._lock:
+            return {url: s.subscribers for url, s in self._streams.items()}
+
+    def streams(self):
+        with self._lock:
+            return list(self._streams.values())
+
+    def stats(self):
+        streams = self.streams()
+        return [{
+            "source": s.source_url,
+            "subscribers": s.subscribers,
+            "video_subscribers": s.video_subscribers,
+            "frames": s.frame_count,
+            "dropped": s.frames_dropped,
+            "latency_ms": round(1000 * s.last_latency, 1) if s.last_latency is not None else None,
+            "fps": round(s.metrics.fps, 2),
+            "steering": dict(s.steering.counters),
+            "processor": s.process_frame.stats() if hasattr(s.process_frame, 'stats') else {},
+            "recorder": s.recorder.stats() if s.recorder is not None else None,
+            "variants": {"encodes": s.variants.encodes, "hits": s.variants.hits},
+            "capture": {"ring_slots": s.capture.ring.slots, "missed": s.capture.missed,
+                        "torn": s.capture.ring.torn} if s.capture else None,
+        } for s in streams]
@@ -0,0 +1,25 @@
+import os
+import sys
+
+# Tests import the backend modules the way app.py does: from the Backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def stub_app(monkeypatch):
+    """app.py with a StubInterpreter pool loaded in place of the model."""
+    import app
+    from bench.stub import StubInterpreter
+    from detector import DetectorSession
+    from interpreter_pool import InterpreterPool
+    from postprocess import PostProcessor
+
+    labels = ['person', 'bicycle', 'car']
+    monkeypatch.setattr(app, 'detector_pool', InterpreterPool([DetectorSession(StubInterpreter(), labels)]))
+    monkeypatch.setattr(app, 'batch_scheduler', None)
+    monkeypatch.setattr(app, 'labels', labels)
+    monkeypatch.setattr(app, 'postprocessor', PostProcessor(labels, app.TARGET_CLASSES,
+                                                            score_threshold=app.SCORE_THRESHOLD))
+    return app
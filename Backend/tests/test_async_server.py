@@ -0,0 +1,82 @@
+from urllib.parse import quote
+
+from aiohttp.test_utils import make_mocked_request
+from werkzeug.wrappers import Request
+
+from async_server import wsgi_environ
+
+
+def test_query_string_keeps_escapes():
+    source = 'http://robot.local/cam?user=a&pass=b%c d&name=中'
+    request = make_mocked_request('GET', f"/replay?url={quote(source, safe='')}&t=5")
+
+    args = Request(wsgi_environ(request, b'')).args
+    assert args['url'] == source
+    assert args['t'] == '5'
+
+
+def read_parts(monkeypatch, path, parts, **backend_attrs):
+    """GET path from async_server's app and return its first `parts` MJPEG parts."""
+    import asyncio
+
+    from aiohttp.test_utils import TestClient, TestServer
+
+    import async_server
+
+    for name, value in backend_attrs.items():
+        monkeypatch.setattr(async_server.backend, name, value)
+
+    async def run():
+        async with TestClient(TestServer(async_server.make_app())) as client:
+            response = await client.get(path)
+            assert response.status == 200
+            received = b''
+            while received.count(b'--frame') < parts:
+                received += await asyncio.wait_for(response.content.readany(), 2)
+            response.close()
+            return received
+
+    return asyncio.run(run())
+
+
+def endless_frames(closed):
+    try:
+        seq = 0
+        while True:
+            seq += 1
+            yield seq
+    finally:
+        closed.set()
+
+
+def test_bridge_streams_endless_responses(monkeypatch):
+    import threading
+
+    from flask import Flask, Response
+
+    closed = threading.Event()
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/endless')
+    def endless():
+        parts = (b'--frame\r\n\r\n%d\r\n' % seq for seq in endless_frames(closed))
+        return Response(parts, mimetype='multipart/x-mixed-replace; boundary=frame')
+
+    assert read_parts(monkeypatch, '/endless', 3, app=flask_app).startswith(b'--frame\r\n\r\n1\r\n')
+    # The client went away: the generator is closed, not left running in a thread
+    assert closed.wait(2)
+
+
+def test_replay_is_served_on_the_loop(monkeypatch):
+    import threading
+
+    closed = threading.Event()
+
+    class Recordings:
+        def frames(self, sid, ts):
+            assert (sid, ts) == ('abc', 5.0)
+            return ((seq / 100.0, b'jpeg%d' % seq) for seq in endless_frames(closed))
+
+    received = read_parts(monkeypatch, '/replay?stream=abc&t=5&speed=2', 3, recordings=Recordings())
+    assert b'jpeg1' in received and b'jpeg2' in received
+    assert closed.wait(2)
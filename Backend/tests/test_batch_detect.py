@@ -0,0 +1,87 @@
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import batch_detect
+
+FRAMES = 10
+
+
+def write_video(path):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (160, 120))
+    for i in range(FRAMES):
+        writer.write(np.full((120, 160, 3), 20 * i, dtype=np.uint8))
+    writer.release()
+
+
+def detected_frames(out_dir):
+    with open(os.path.join(out_dir, 'detections.jsonl')) as f:
+        return [json.loads(line)['frame'] for line in f]
+
+
+STUB_RUNTIME = """
+from bench.stub import StubInterpreter
+
+
+class Interpreter(StubInterpreter):
+    def __init__(self, model_path=None, model_content=None, num_threads=None, **kwargs):
+        super().__init__()
+"""
+
+
+@pytest.fixture
+def stub_workers(stub_app, tmp_path, monkeypatch):
+    """
+    Spawned workers import app.py afresh, so they get the stub through a
+    tflite_runtime package on sys.path (which spawn passes on) and a dummy
+    model file; this process uses stub_app's pool.
+    """
+    package = tmp_path / 'runtime' / 'tflite_runtime'
+    package.mkdir(parents=True)
+    (package / '__init__.py').write_text('')
+    (package / 'interpreter.py').write_text(STUB_RUNTIME)
+    model = tmp_path / 'model.tflite'
+    model.write_bytes(b'stub')
+    monkeypatch.syspath_prepend(str(tmp_path / 'runtime'))
+    monkeypatch.setenv('ASAR_MODEL_PATH', str(model))
+    monkeypatch.setenv('ASAR_LABELS_PATH', os.path.join(os.path.dirname(batch_detect.__file__),
+                                                        'models', 'coco_labels.txt'))
+    return stub_app
+
+
+def test_rerun_with_another_stride_is_not_skipped(stub_workers, tmp_path):
+    video = str(tmp_path / 'clip.avi')
+    write_video(video)
+    out = str(tmp_path / 'out')
+
+    assert batch_detect.main([video, '--out', out, '--workers', '1']) == 0
+    assert detected_frames(out) == list(range(FRAMES))
+
+    assert batch_detect.main([video, '--out', out, '--workers', '1', '--stride', '2']) == 0
+    assert detected_frames(out) == list(range(0, FRAMES, 2))
+
+
+def test_stride_does_not_depend_on_chunks(tmp_path):
+    video = str(tmp_path / 'clip.avi')
+    write_video(video)
+
+    whole = [(index, ts) for index, ts, _ in batch_detect.video_frames(video, 0, None, 3)]
+    chunked = [(index, ts) for start in range(0, FRAMES, 4)
+               for index, ts, _ in batch_detect.video_frames(video, start, min(start + 4, FRAMES), 3)]
+    assert [index for index, _ in whole] == [0, 3, 6, 9]
+    assert chunked == whole
+    # Written at 10 fps: frame i is at i / 10 s
+    assert [ts for _, ts in whole] == [0.0, 0.3, 0.6, 0.9]
+
+
+def test_missing_model_fails_without_starting_workers(stub_app, tmp_path, monkeypatch):
+    video = str(tmp_path / 'clip.avi')
+    write_video(video)
+    monkeypatch.setattr(stub_app, 'detector_pool', None)
+    monkeypatch.setattr(stub_app, 'MODEL_PATH', str(tmp_path / 'missing.tflite'))
+    monkeypatch.setattr(stub_app, 'model_state', dict(stub_app.model_state, failed_at=None))
+
+    assert batch_detect.main([video, '--out', str(tmp_path / 'out'), '--workers', '2']) == 1
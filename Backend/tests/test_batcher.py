@@ -0,0 +1,64 @@
+import threading
+import time
+
+import numpy as np
+
+from batcher import BatchScheduler
+from bench.stub import StubInterpreter
+from detector import DetectorSession
+from interpreter_pool import InterpreterPool
+
+
+class BatchOneInterpreter(StubInterpreter):
+    """Like SSD models with the detection post-process op: the input cannot be resized."""
+    def resize_tensor_input(self, index, shape):
+        if int(shape[0]) != 1:
+            raise ValueError("batch size is fixed at 1")
+
+
+def make_pool(interpreter_cls, size=2):
+    return InterpreterPool([DetectorSession(interpreter_cls(), ['person']) for _ in range(size)])
+
+
+def test_batch_of_one_dispatches_immediately():
+    scheduler = BatchScheduler(make_pool(BatchOneInterpreter), max_batch=4, max_wait=0.5)
+    assert scheduler.max_batch == 1
+
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    boxes, classes, scores = scheduler.detect(frame)
+    assert time.perf_counter() - start < 0.1
+    assert scores[0] > 0
+    assert (scheduler.batches, scheduler.frames) == (1, 1)
+
+
+def test_concurrent_streams_share_a_batch():
+    scheduler = BatchScheduler(make_pool(StubInterpreter, size=1), max_batch=4, max_wait=0.2)
+    assert scheduler.max_batch == 4
+
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    threads = [threading.Thread(target=scheduler.detect, args=(frame,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.stop()
+    assert scheduler.frames == 4
+    assert scheduler.batches < 4
+
+
+def test_direct_dispatch_counts_every_frame():
+    scheduler = BatchScheduler(make_pool(BatchOneInterpreter, size=4), max_batch=1)
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+
+    def run():
+        for _ in range(25):
+            scheduler.detect(frame)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (scheduler.batches, scheduler.frames) == (200, 200)
+    assert scheduler.average_batch == 1.0
@@ -0,0 +1,12 @@
+import json
+
+from bench import run
+
+
+def test_stdout_holds_only_the_json(capsys):
+    run.main(['--iterations', '2', '--warmup', '1', '--resolutions', '320x240',
+              '--persons', '0', '--paths', 'app'])
+    captured = capsys.readouterr()
+    results = json.loads(captured.out)
+    assert [case["path"] for case in results["cases"]] == ['app']
+    assert 'persons=0' in captured.err
@@ -0,0 +1,37 @@
+from config import Config
+
+
+def test_environ_round_trips():
+    config = Config.from_env({
+        "ASAR_TILES": "3x2", "ASAR_MOTION_GATE": "1", "ASAR_MOTION_ROI": "0,0.5,1,1",
+        "ASAR_RECORD_DIR": "/data/rec", "ASAR_RECORD_MODE": "raw", "ASAR_NMS_IOU": "0.4",
+        "ASAR_STREAM_PEERS": "http://127.0.0.1:7001,http://127.0.0.1:7002", "ASAR_WORKER_INDEX": "1",
+    })
+    assert config.tiles == (3, 2)
+    assert config.motion_roi == (0.0, 0.5, 1.0, 1.0)
+    assert not config.record_annotated
+    assert config.stream_peers == ["http://127.0.0.1:7001", "http://127.0.0.1:7002"]
+    assert Config.from_env(config.environ()).as_dict() == config.as_dict()
+
+
+def test_unset_features_stay_off():
+    config = Config.from_env({})
+    assert (config.tiles, config.record_dir, config.detection_log_dir, config.nms_iou) == (None, None, None, None)
+    assert config.stream_peers == []
+    assert Config.from_env(config.environ()).as_dict() == config.as_dict()
+
+
+def test_create_app_applies_pipeline_settings(stub_app, tmp_path):
+    original = stub_app.settings
+    try:
+        stub_app.create_app(Config(motion_gate=True, tiles=(2, 2), resolver_ttl=5,
+                                   detection_log_dir=str(tmp_path), stream_peers=["http://a", "http://b"]))
+        assert stub_app.MOTION_GATE_ENABLED and stub_app.TILES == (2, 2)
+        assert stub_app.stream_resolver.ttl == 5
+        assert stub_app.detection_log is not None and stub_app.detection_store is not None
+        assert stub_app.STREAM_PEERS == ["http://a", "http://b"]
+        processor = stub_app.make_frame_processor()
+        assert processor.gate is not None and processor.tiler is not None
+    finally:
+        stub_app.configure(original)
+    assert stub_app.detection_log is None
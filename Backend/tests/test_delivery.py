@@ -0,0 +1,63 @@
+import numpy as np
+
+from delivery import LEVELS, AdaptiveClient, VariantCache
+from pipeline import FramePacket
+
+
+def packet(seq):
+    p = FramePacket(seq, frame=np.full((120, 160, 3), seq * 10 % 255, dtype=np.uint8))
+    p.jpeg = b'original'
+    return p
+
+
+def test_level_zero_is_the_stream_jpeg():
+    cache = VariantCache()
+    assert cache.get(packet(1), 0) == b'original'
+    assert cache.encodes == 0
+
+
+def test_clients_at_one_level_share_an_encode():
+    cache = VariantCache()
+    p = packet(1)
+    first = cache.get(p, 3)
+    assert first[:2] == b'\xff\xd8'
+    assert cache.get(p, 3) is first
+    assert (cache.encodes, cache.hits) == (1, 1)
+    # A newer packet drops the old variants
+    cache.get(packet(2), 3)
+    assert cache.encodes == 2
+
+
+def test_a_slow_link_steps_down():
+    client = AdaptiveClient(VariantCache(), source_fps=lambda: 30.0)
+    # 50 KB took 100 ms: longer than a 30 fps frame interval
+    client.record_send(50_000, 0.1)
+    assert client.level == 1 and client.changes == 1
+    assert client.throughput == 500_000
+
+
+def test_fast_sends_step_back_up():
+    client = AdaptiveClient(VariantCache(), source_fps=lambda: 30.0, upgrade_after=5)
+    client.level = 2
+    for _ in range(5):
+        # Straight into the socket buffer: nothing learnt about the link, so probe upwards
+        client.record_send(10_000, 0.0001)
+    assert client.level == 1
+
+
+def test_level_fps_caps_skip_frames():
+    client = AdaptiveClient(VariantCache(), source_fps=lambda: 30.0)
+    client.level = len(LEVELS) - 1
+    max_fps = LEVELS[client.level][2]
+    client.record_send(1000, 0.0001)
+    now = client._last_sent
+    assert not client.wants(now + 0.5 / max_fps)
+    assert client.wants(now + 1.0 / max_fps)
+    assert client.skipped == 1
+
+
+def test_levels_never_leave_the_ladder():
+    client = AdaptiveClient(VariantCache(), source_fps=lambda: 30.0)
+    for _ in range(len(LEVELS) + 3):
+        client.record_send(1_000_000, 1.0)
+    assert client.level == len(LEVELS) - 1
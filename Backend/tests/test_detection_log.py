@@ -0,0 +1,32 @@
+import time
+
+import numpy as np
+
+from detection_log import DetectionLog, DetectionStore
+from pipeline import FramePacket
+from postprocess import DETECTION_DTYPE
+from resolver import StreamResolver
+
+PAGE_URL = 'http://192.168.1.20:8080/'
+SOURCE_URL = 'http://192.168.1.20:8080/video_feed'
+
+
+def test_query_by_url_uses_the_resolved_source(stub_app, monkeypatch, tmp_path):
+    log = DetectionLog(str(tmp_path), flush_interval=0.05)
+    ts = time.time()
+    for seq in range(3):
+        packet = FramePacket(seq, capture_ts=ts + seq)
+        packet.detections = np.zeros(seq, dtype=DETECTION_DTYPE)
+        log.append(SOURCE_URL, packet)
+    log.close()
+    log._thread.join(2)
+
+    resolver = StreamResolver(lambda url: SOURCE_URL if url == PAGE_URL else url)
+    monkeypatch.setattr(stub_app, 'stream_resolver', resolver)
+    monkeypatch.setattr(stub_app, 'detection_store', DetectionStore(str(tmp_path)))
+
+    client = stub_app.app.test_client()
+    result = client.get('/detection-log/query', query_string={
+        'url': PAGE_URL, 't0': ts - 1, 't1': ts + 10, 'min_persons': 1}).get_json()
+    assert result['matches'] == 2
+    assert [frame['persons'] for frame in result['frames']] == [1, 2]
@@ -0,0 +1,71 @@
+import numpy as np
+
+from pipeline import FramePacket
+
+
+def test_motion_gate_checks_each_frame_once(stub_app, monkeypatch):
+    monkeypatch.setattr(stub_app, 'MOTION_GATE_ENABLED', True)
+    monkeypatch.setattr(stub_app, 'TILES', None)
+    processor = stub_app.FrameProcessor()
+
+    frames = 10
+    for seq in range(frames):
+        # Every frame differs from the last, so the detector runs on all of them
+        frame = np.full((240, 320, 3), 200 * (seq % 2), dtype=np.uint8)
+        processor(FramePacket(seq, frame=frame), draw=False)
+
+    stats = processor.gate.stats()
+    assert stats["checks"] == frames
+    assert stats["skips"] == 0
+
+
+def test_motion_gate_skips_static_frames(stub_app, monkeypatch):
+    monkeypatch.setattr(stub_app, 'MOTION_GATE_ENABLED', True)
+    monkeypatch.setattr(stub_app, 'TILES', None)
+    processor = stub_app.FrameProcessor()
+
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    packets = [FramePacket(seq, frame=frame.copy()) for seq in range(5)]
+    for packet in packets:
+        processor(packet, draw=False)
+
+    assert [packet.reused for packet in packets] == [False, True, True, True, True]
+    assert processor.gate.stats()["checks"] == 5
+
+
+def test_motion_gate_cost_includes_preparing_the_frame(monkeypatch):
+    import time
+    from motion_gate import MotionGate
+
+    gate = MotionGate()
+    prepare = gate.prepare
+
+    def slow_prepare(frame):
+        time.sleep(0.01)
+        return prepare(frame)
+
+    monkeypatch.setattr(gate, 'prepare', slow_prepare)
+    gate.changed(np.zeros((240, 320, 3), dtype=np.uint8))
+    assert gate.cost >= 0.01
+
+
+def test_metrics_export_motion_gate_counters(stub_app, monkeypatch):
+    from types import SimpleNamespace
+    from metrics import StreamMetrics
+
+    monkeypatch.setattr(stub_app, 'MOTION_GATE_ENABLED', True)
+    monkeypatch.setattr(stub_app, 'TILES', None)
+    processor = stub_app.FrameProcessor()
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    for seq in range(3):
+        processor(FramePacket(seq, frame=frame.copy()), draw=False)
+
+    stream = SimpleNamespace(source_url='http://cam/video', metrics=StreamMetrics(), frame_count=3,
+                             frames_dropped=0, subscribers=1, video_subscribers=0, last_latency=None,
+                             steering=SimpleNamespace(counters={}), process_frame=processor)
+    monkeypatch.setattr(stub_app.stream_hub, 'streams', lambda: [stream])
+    client = stub_app.create_app().test_client()
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'asar_motion_gate_checks_total{stream="http://cam/video"} 3' in text
+    assert 'asar_motion_gate_skips_total{stream="http://cam/video"} 2' in text
+    assert 'asar_motion_gate_cost_seconds_total{stream="http://cam/video"}' in text
@@ -0,0 +1,60 @@
+import numpy as np
+
+from frame_ring import FrameRing, RingFrame, detach
+
+
+def make_ring(slots=1):
+    return FrameRing.create(slots=slots, max_shape=(4, 6, 3))
+
+
+def test_frame_checks_the_slot_seq():
+    ring = make_ring(slots=2)
+    try:
+        slot = ring.write(np.full((4, 6, 3), 7, np.uint8), seq=1, ts=0.5)
+        frame = ring.frame(slot, 1)
+        assert isinstance(frame, RingFrame)
+        assert (frame.ring_name, frame.slot, frame.seq) == (ring.name, slot, 1)
+        assert ring.frame(slot, 2) is None
+        assert ring.valid(slot, 1)
+    finally:
+        ring.close()
+
+
+def test_oversized_frames_are_resized_into_the_slot():
+    ring = make_ring()
+    try:
+        slot = ring.write(np.zeros((8, 12, 3), np.uint8), seq=1, ts=0.0)
+        assert ring.frame(slot, 1).shape == (4, 6, 3)
+        assert ring.resized == 1
+    finally:
+        ring.close()
+
+
+def test_detach_copies_a_valid_frame():
+    ring = make_ring()
+    try:
+        slot = ring.write(np.full((4, 6, 3), 3, np.uint8), seq=1, ts=0.0)
+        copy = detach(ring.frame(slot, 1))
+        assert type(copy) is np.ndarray
+        ring.write(np.full((4, 6, 3), 9, np.uint8), seq=2, ts=0.1)
+        assert (copy == 3).all()
+    finally:
+        ring.close()
+
+
+def test_detach_drops_a_frame_whose_slot_was_reused():
+    ring = make_ring()
+    try:
+        slot = ring.write(np.full((4, 6, 3), 3, np.uint8), seq=1, ts=0.0)
+        frame = ring.frame(slot, 1)
+        ring.write(np.full((4, 6, 3), 9, np.uint8), seq=2, ts=0.1)
+        assert detach(frame) is None
+        assert ring.torn == 1
+    finally:
+        ring.close()
+
+
+def test_detach_passes_other_frames_through():
+    frame = np.zeros((2, 2, 3), np.uint8)
+    assert detach(frame) is frame
+    assert detach(None) is None
@@ -0,0 +1,73 @@
+import threading
+
+from bench.stub import StubInterpreter
+from detector import DetectorSession
+from interpreter_pool import InterpreterPool
+from metrics import Histogram, MetricsWriter
+
+
+def test_histogram_buckets_are_upper_bounds():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(seconds)
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+    assert histogram.count == 4
+    assert abs(histogram.sum - 2.65) < 1e-9
+
+
+def test_merged_sums_histograms():
+    a, b = Histogram(buckets=(1.0,)), Histogram(buckets=(1.0,))
+    a.observe(0.5)
+    b.observe(0.5)
+    b.observe(3.0)
+    merged = Histogram.merged([a, b])
+    assert merged.cumulative() == [(1.0, 2), (float('inf'), 3)]
+    assert merged.count == 3
+    assert Histogram.merged([]).count == 0
+
+
+def test_writer_groups_families_and_escapes_labels():
+    out = MetricsWriter()
+    out.gauge('asar_fps', "Frames per second", 1.5, {'stream': 'a"b'})
+    out.counter('asar_frames_total', "Frames", 3, {'stream': 'a"b'})
+    out.gauge('asar_fps', "Frames per second", 2, {'stream': 'c'})
+    lines = out.render().splitlines()
+    assert lines == [
+        '# HELP asar_fps Frames per second',
+        '# TYPE asar_fps gauge',
+        'asar_fps{stream="a\\"b"} 1.5',
+        'asar_fps{stream="c"} 2',
+        '# HELP asar_frames_total Frames',
+        '# TYPE asar_frames_total counter',
+        'asar_frames_total{stream="a\\"b"} 3',
+    ]
+
+
+def test_writer_histogram_count_matches_inf_bucket():
+    histogram = Histogram(buckets=(0.5,))
+    histogram.observe(0.25)
+    histogram.observe(1.0)
+    out = MetricsWriter()
+    out.histogram('asar_wait_seconds', "Wait", histogram, {'stage': 'x'})
+    text = out.render()
+    assert 'asar_wait_seconds_bucket{stage="x",le="0.5"} 1' in text
+    assert 'asar_wait_seconds_bucket{stage="x",le="+Inf"} 2' in text
+    assert 'asar_wait_seconds_count{stage="x"} 2' in text
+    assert 'asar_wait_seconds_sum{stage="x"} 1.25' in text
+
+
+def test_pool_wait_histogram_counts_every_checkout():
+    pool = InterpreterPool([DetectorSession(StubInterpreter(), ['person']) for _ in range(2)])
+
+    def borrow():
+        for _ in range(50):
+            with pool.checkout():
+                pass
+
+    threads = [threading.Thread(target=borrow) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.wait_histogram.count == 200
+    assert pool.stats()["checkouts"] == 200
@@ -0,0 +1,60 @@
+import socket
+import threading
+import time
+
+from mjpeg import MjpegReader
+
+FRAME = b'\xff\xd8' + b'\x00' * (8 * 1024) + b'\xff\xd9'
+PAUSE = 1.0
+
+
+def serve_once(chunked):
+    """One-shot MJPEG server: a frame, then PAUSE seconds of silence, then a second frame."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def send(conn, data):
+        conn.sendall(b'%x\r\n%s\r\n' % (len(data), data) if chunked else data)
+
+    def run():
+        conn, _ = listener.accept()
+        with conn:
+            conn.recv(4096)
+            headers = 'HTTP/1.1 200 OK\r\n' if chunked else 'HTTP/1.0 200 OK\r\n'
+            headers += 'Content-Type: multipart/x-mixed-replace; boundary=frame\r\n'
+            headers += 'Transfer-Encoding: chunked\r\n\r\n' if chunked else '\r\n'
+            conn.sendall(headers.encode())
+            part = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n%s\r\n' % (len(FRAME), FRAME)
+            send(conn, part)
+            time.sleep(PAUSE)
+            send(conn, part)
+            if chunked:
+                conn.sendall(b'0\r\n\r\n')
+        listener.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    return f'http://127.0.0.1:{listener.getsockname()[1]}/'
+
+
+def first_frame_delay(chunked):
+    reader = MjpegReader(serve_once(chunked))
+    assert reader.open()
+    start = time.monotonic()
+    try:
+        frames = iter(reader)
+        assert next(frames) == FRAME
+        delay = time.monotonic() - start
+        assert next(frames) == FRAME
+    finally:
+        reader.close()
+    return delay
+
+
+def test_frame_yielded_before_pause_ends():
+    # HTTP/1.0 stream without chunked encoding: a frame is much smaller than chunk_size
+    assert first_frame_delay(chunked=False) < PAUSE / 2
+
+
+def test_chunked_frame_yielded_before_pause_ends():
+    assert first_frame_delay(chunked=True) < PAUSE / 2
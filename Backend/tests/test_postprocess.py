@@ -0,0 +1,73 @@
+import numpy as np
+
+from postprocess import DETECTION_DTYPE, PostProcessor, compile_target_classes, iou_matrix, nms, parse_labels
+
+LABELS = ['0  person', '1  bicycle', '2  car']
+
+
+def test_iou_of_empty_inputs_is_empty():
+    boxes = np.array([[0, 0, 1, 1]], dtype=np.float32)
+    assert iou_matrix(np.zeros((0, 4), np.float32), boxes).shape == (0, 1)
+    assert iou_matrix(boxes, np.zeros((0, 4), np.float32)).shape == (1, 0)
+
+
+def test_iou_values():
+    a = np.array([[0.0, 0.0, 0.5, 0.5]], dtype=np.float32)
+    b = np.array([[0.0, 0.0, 0.5, 0.5], [0.0, 0.25, 0.5, 0.75], [0.5, 0.5, 1.0, 1.0],
+                  [0.2, 0.2, 0.2, 0.2]], dtype=np.float32)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1.0, 1 / 3, 0.0, 0.0]], atol=1e-6)
+
+
+def test_nms_handles_empty_and_single_inputs():
+    assert len(nms(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), 0.5)) == 0
+    assert list(nms(np.array([[0, 0, 1, 1]], np.float32), np.array([0.9], np.float32), 0.5)) == [0]
+
+
+def test_nms_suppresses_overlaps_highest_score_first():
+    boxes = np.array([[0, 0, 0.5, 0.5], [0.01, 0.01, 0.5, 0.5], [0.6, 0.6, 1, 1]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.7], dtype=np.float32)
+    assert list(nms(boxes, scores, 0.5)) == [1, 2]
+
+
+def test_nms_ties_keep_the_first_box():
+    boxes = np.array([[0, 0, 0.5, 0.5], [0, 0, 0.5, 0.5]], dtype=np.float32)
+    scores = np.array([0.8, 0.8], dtype=np.float32)
+    assert list(nms(boxes, scores, 0.5)) == [0]
+
+
+def test_target_classes_from_labels():
+    mask = compile_target_classes(LABELS, ['person', 'car'])
+    assert list(np.flatnonzero(mask)) == [0, 2]
+    assert parse_labels(['person', 'bicycle']) == {0: 'person', 1: 'bicycle'}
+    # No label file: COCO person is class 0
+    assert list(np.flatnonzero(compile_target_classes([], ['person']))) == [0]
+
+
+def test_postprocessor_filters_sorts_and_converts():
+    processor = PostProcessor(LABELS, ['person'], score_threshold=0.3)
+    boxes = np.array([[0.1, 0.1, 0.5, 0.3], [0.2, 0.6, 0.8, 1.0], [0, 0, 1, 1], [0, 0, 0.1, 0.1]],
+                     dtype=np.float32)
+    classes = np.array([0, 0, 2, 0], dtype=np.float32)
+    scores = np.array([0.5, 0.9, 0.99, 0.2], dtype=np.float32)
+    detections = processor(boxes, classes, scores, 200, 100)
+
+    assert detections.dtype == DETECTION_DTYPE
+    np.testing.assert_allclose(detections['score'], [0.9, 0.5])
+    first = detections[0]
+    assert (first['left'], first['top'], first['right'], first['bottom']) == (120, 20, 200, 80)
+    assert first['area'] == 80 * 60
+    assert abs(first['x_deviation'] - (0.5 - 0.8)) < 1e-6
+
+
+def test_postprocessor_with_nothing_kept():
+    processor = PostProcessor(LABELS, ['person'], nms_iou=0.5, top_k=1)
+    detections = processor(np.zeros((3, 4), np.float32), np.zeros(3, np.float32),
+                           np.zeros(3, np.float32), 320, 240)
+    assert len(detections) == 0 and detections.dtype == DETECTION_DTYPE
+
+
+def test_postprocessor_nms_and_top_k():
+    processor = PostProcessor(LABELS, ['person'], nms_iou=0.5, top_k=1)
+    boxes = np.array([[0, 0, 0.5, 0.5], [0, 0, 0.5, 0.5], [0.6, 0.6, 1, 1]], dtype=np.float32)
+    detections = processor(boxes, np.zeros(3, np.float32), np.array([0.6, 0.9, 0.7], np.float32), 100, 100)
+    np.testing.assert_allclose(detections['score'], [0.9])
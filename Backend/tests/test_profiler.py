@@ -0,0 +1,61 @@
+import threading
+import time
+
+from profiler import Profile, Profiler
+
+
+def test_sections_are_free_while_disabled():
+    profiler = Profiler()
+    assert profiler.section('a') is profiler.section('b')
+    assert profiler.track('request') is None
+
+
+def test_collapsed_stacks_and_summary():
+    profile = Profile('GET /x', 'request', 0.005)
+    profile.add_samples(['main;work;inner', 'main;work;inner', 'main;other'])
+    profile.add_section('detect_objects', 0.25)
+    profile.add_section('detect_objects', 0.25)
+    assert profile.collapsed() == "main;work;inner 2\nmain;other 1\n"
+    summary = profile.summary()
+    assert summary["samples"] == 3
+    assert summary["sections"] == {"detect_objects": {"ms": 500.0, "count": 2}}
+    assert summary["top"][0] == {"frame": "inner", "samples": 2}
+
+
+def test_snapshot_is_a_copy():
+    profile = Profile('stream', 'stream', 0.005)
+    profile.add_samples(['a'])
+    samples, _ = profile.snapshot()
+    profile.add_samples(['a'])
+    assert samples['a'] == 1
+
+
+def busy(profiler, stop):
+    with profiler.section('hot_loop'):
+        while not stop.is_set():
+            sum(range(1000))
+
+
+def test_sampled_stacks_show_sections():
+    profiler = Profiler(interval_ms=1, window=60)
+    profiler.enable()
+    stop = threading.Event()
+    try:
+        worker = threading.Thread(target=busy, args=(profiler, stop))
+        worker.start()
+        handle = profiler.track('worker', 'stream', [worker.ident])
+        time.sleep(0.2)
+        stop.set()
+        worker.join()
+        profiler.untrack(handle)
+    finally:
+        stop.set()
+        profiler.disable()
+
+    [profile] = profiler.history
+    samples, sections = profile.snapshot()
+    assert samples
+    # The section shows up as a frame under the function that entered it
+    assert any(stack.split(';')[-2].startswith('busy (') and stack.endswith(';[hot_loop]') for stack in samples)
+    assert sections["hot_loop"][1] == 1
+    assert profiler.get(profile.id) is profile
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+
+from recorder import INDEX_DTYPE, INDEX_EXT, SEGMENT_EXT, Recorder, RecordingStore, enforce_quota, stream_id
+
+SOURCE = 'http://10.0.0.5:8080/video'
+
+
+def record(root, frames, **kwargs):
+    recorder = Recorder(str(root), SOURCE, **kwargs)
+    for ts, jpeg in frames:
+        recorder.record(ts, jpeg)
+    recorder.close()
+    recorder._thread.join(5)
+    return recorder
+
+
+def test_index_layout_is_fixed_width_little_endian():
+    assert INDEX_DTYPE.itemsize == 20
+    record = np.array([(1.5, 7, 3)], dtype=INDEX_DTYPE).tobytes()
+    assert record == np.float64(1.5).tobytes() + (7).to_bytes(8, 'little') + (3).to_bytes(4, 'little')
+
+
+def test_frames_are_indexed_and_read_back(tmp_path):
+    frames = [(100.0 + i, bytes([i]) * (10 + i)) for i in range(5)]
+    recorder = record(tmp_path, frames)
+    assert recorder.stats()["frames"] == 5
+
+    store = RecordingStore(str(tmp_path))
+    sid = stream_id(SOURCE)
+    [segment] = store.segment_ids(sid)
+    index = store.read_index(sid, segment)
+    assert list(index['ts']) == [ts for ts, _ in frames]
+    assert list(index['offset']) == [0, 10, 21, 33, 46]
+    assert list(store.frames(sid, 102.0)) == frames[2:]
+    assert store.seek(sid, 102.5) == (segment, 3)
+    assert store.seek(sid, 200.0) is None
+    assert store.streams()[0]["source"] == SOURCE
+
+
+def test_segments_rotate_and_reads_cross_them(tmp_path):
+    frames = [(100.0 + i, b'x' * 8) for i in range(6)]
+    record(tmp_path, frames, segment_seconds=2)
+    store = RecordingStore(str(tmp_path))
+    sid = stream_id(SOURCE)
+    assert store.segment_ids(sid) == [100000, 102000, 104000]
+    assert [ts for ts, _ in store.frames(sid, 101.0)] == [101.0, 102.0, 103.0, 104.0, 105.0]
+
+
+def test_partial_index_records_are_ignored(tmp_path):
+    record(tmp_path, [(100.0, b'abc'), (101.0, b'def')])
+    store = RecordingStore(str(tmp_path))
+    sid = stream_id(SOURCE)
+    [segment] = store.segment_ids(sid)
+    with open(os.path.join(tmp_path, sid, f"{segment}{INDEX_EXT}"), 'ab') as f:
+        f.write(b'\x00' * 5)
+    assert len(store.read_index(sid, segment)) == 2
+
+
+def test_quota_removes_oldest_segments_but_keeps_the_newest(tmp_path):
+    record(tmp_path, [(100.0 + i, b'x' * 100) for i in range(3)], segment_seconds=1, quota_bytes=0)
+    sid = stream_id(SOURCE)
+    enforce_quota(str(tmp_path), 1)
+    names = sorted(os.listdir(os.path.join(tmp_path, sid)))
+    assert names == [f"102000{INDEX_EXT}", f"102000{SEGMENT_EXT}", 'stream.json']
+
+
+def test_store_rejects_foreign_ids(tmp_path):
+    store = RecordingStore(str(tmp_path))
+    assert store.segment_ids('../etc') == []
+    assert store.segment_path(stream_id(SOURCE), '1; rm') is None
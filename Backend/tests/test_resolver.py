@@ -0,0 +1,115 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import resolver
+from resolver import StreamResolver
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resolver, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+class Lookup:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self, url):
+        self.calls += 1
+        if self.fail:
+            raise IOError("page unreachable")
+        return f"{url}/stream{self.calls}"
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_fresh_answers_are_cached_for_ttl(clock):
+    lookup = Lookup()
+    cache = StreamResolver(lookup, ttl=10, stale_ttl=100)
+    assert cache.resolve('http://cam') == 'http://cam/stream1'
+    clock.now += 9
+    assert cache.resolve('http://cam') == 'http://cam/stream1'
+    assert (lookup.calls, cache.hits, cache.misses) == (1, 1, 1)
+
+
+def test_stale_answers_are_served_while_revalidating(clock):
+    lookup = Lookup()
+    cache = StreamResolver(lookup, ttl=10, stale_ttl=100)
+    cache.resolve('http://cam')
+    clock.now += 11
+    assert cache.resolve('http://cam') == 'http://cam/stream1'
+    wait_for(lambda: cache.resolve('http://cam') == 'http://cam/stream2')
+    assert lookup.calls == 2
+
+
+def test_expired_stale_answers_resolve_again(clock):
+    lookup = Lookup()
+    cache = StreamResolver(lookup, ttl=10, stale_ttl=100)
+    cache.resolve('http://cam')
+    clock.now += 111
+    assert cache.resolve('http://cam') == 'http://cam/stream2'
+    assert cache.misses == 2
+
+
+def test_failures_fall_back_to_the_page_for_negative_ttl(clock):
+    lookup = Lookup()
+    lookup.fail = True
+    cache = StreamResolver(lookup, ttl=10, negative_ttl=5)
+    assert cache.resolve('http://cam') == 'http://cam'
+    clock.now += 4
+    assert cache.resolve('http://cam') == 'http://cam'
+    assert lookup.calls == 1
+    lookup.fail = False
+    clock.now += 2
+    assert cache.resolve('http://cam') == 'http://cam/stream2'
+
+
+def test_failed_revalidation_keeps_the_last_good_answer(clock):
+    lookup = Lookup()
+    cache = StreamResolver(lookup, ttl=10, stale_ttl=100, negative_ttl=5)
+    cache.resolve('http://cam')
+    lookup.fail = True
+    clock.now += 11
+    assert cache.resolve('http://cam') == 'http://cam/stream1'
+    wait_for(lambda: lookup.calls == 2 and not cache._entries['http://cam'].refreshing)
+    assert cache.resolve('http://cam') == 'http://cam/stream1'
+
+
+def test_concurrent_misses_share_one_lookup():
+    release = threading.Event()
+    calls = []
+
+    def slow_lookup(url):
+        calls.append(url)
+        release.wait(2)
+        return url + '/stream'
+
+    cache = StreamResolver(slow_lookup)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.resolve('http://cam'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: calls)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ['http://cam'] and results == ['http://cam/stream'] * 4
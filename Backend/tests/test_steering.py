@@ -0,0 +1,47 @@
+import socket
+
+from steering import STEERING_FORMAT, SteeringPublisher, pack_command, unpack_command
+
+
+def test_datagram_round_trips():
+    data = pack_command(7, 1700000000.123, "left", box=[0.1, 0.2, 0.6, 0.9], heartbeat=True)
+    assert len(data) == STEERING_FORMAT.size == 25
+    decoded = unpack_command(data)
+    assert decoded["seq"] == 7
+    assert decoded["ts"] == 1700000000.123
+    assert decoded["direction"] == "left"
+    assert decoded["heartbeat"] is True
+    assert all(abs(a - b) < 1 / 65535 for a, b in zip(decoded["box"], [0.1, 0.2, 0.6, 0.9]))
+
+
+def test_no_target_and_clamped_box():
+    decoded = unpack_command(pack_command(2 ** 32 + 3, 0, None, box=[-1, 0, 2, 1]))
+    assert decoded["seq"] == 3
+    assert decoded["direction"] is None and decoded["heartbeat"] is False
+    assert decoded["box"] == [0.0, 0.0, 1.0, 1.0]
+    assert unpack_command(pack_command(1, 0, "forward"))["box"] == [0.0] * 4
+
+
+def test_foreign_datagrams_are_rejected():
+    data = pack_command(1, 0, "right")
+    assert unpack_command(data[:-1]) is None
+    assert unpack_command(b'XX' + data[2:]) is None
+    assert unpack_command(data[:2] + b'\x09' + data[3:]) is None
+
+
+def test_publisher_suppresses_repeats_and_sends_changes():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(1)
+    publisher = SteeringPublisher(heartbeat_interval=60, max_rate=0)
+    publisher.add_target(receiver.getsockname())
+    try:
+        assert publisher.publish("left", ts=1.0)
+        assert not publisher.publish("left", ts=2.0)
+        assert publisher.publish("right", ts=3.0)
+        received = [unpack_command(receiver.recv(64)) for _ in range(2)]
+        assert [(r["seq"], r["direction"], r["ts"]) for r in received] == [(1, "left", 1.0), (2, "right", 3.0)]
+        assert publisher.counters["sent"] == 2 and publisher.counters["suppressed"] == 1
+    finally:
+        publisher.close()
+        receiver.close()
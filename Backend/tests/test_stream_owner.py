@@ -0,0 +1,47 @@
+from recorder import stream_id
+
+PEERS = ['http://127.0.0.1:7001', 'http://127.0.0.1:7002', 'http://127.0.0.1:7003']
+SOURCES = [f'http://10.0.0.{i}:8080/video' for i in range(30)]
+
+
+def owners(app, monkeypatch, index):
+    monkeypatch.setattr(app, 'STREAM_PEERS', PEERS)
+    monkeypatch.setattr(app, 'WORKER_INDEX', index)
+    return [app.stream_owner(source) for source in SOURCES]
+
+
+def test_every_source_has_exactly_one_owner(stub_app, monkeypatch):
+    local = [[peer is None for peer in owners(stub_app, monkeypatch, index)] for index in range(len(PEERS))]
+    # Each source is served locally by one worker and relayed by the others
+    assert all(sum(column) == 1 for column in zip(*local))
+    # ...and the others all relay to that same worker
+    for source_index, source in enumerate(SOURCES):
+        owner = int(stream_id(source), 16) % len(PEERS)
+        assert local[owner][source_index]
+
+
+def test_relayed_requests_are_served_locally(stub_app, monkeypatch):
+    monkeypatch.setattr(stub_app, 'STREAM_PEERS', PEERS)
+    assert all(stub_app.stream_owner(source, relayed=True) is None for source in SOURCES)
+
+
+def test_single_worker_owns_everything(stub_app, monkeypatch):
+    monkeypatch.setattr(stub_app, 'STREAM_PEERS', [])
+    assert all(stub_app.stream_owner(source) is None for source in SOURCES)
+
+
+def test_unreachable_owner_is_a_json_503(stub_app, monkeypatch):
+    import socket
+
+    # A port nothing listens on
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    peers = [f'http://127.0.0.1:{port}', f'http://127.0.0.1:{port}']
+    monkeypatch.setattr(stub_app, 'STREAM_PEERS', peers)
+    source = next(s for s in SOURCES if int(stream_id(s), 16) % 2 == 1)
+    monkeypatch.setattr(stub_app, 'WORKER_INDEX', 0)
+
+    response = stub_app.create_app().test_client().get('/detections', query_string={'url': source})
+    assert response.status_code == 503
+    assert response.get_json() == {"error": "Stream owner unavailable"}
@@ -0,0 +1,75 @@
+import numpy as np
+
+from postprocess import PostProcessor
+from tiling import TiledDetector, tile_grid
+
+WIDTH, HEIGHT = 200, 100
+
+
+def test_grid_covers_the_frame_with_overlap():
+    rects = tile_grid(WIDTH, HEIGHT, cols=2, rows=2, overlap=0.2)
+    assert len(rects) == 4
+    assert rects[0][:2] == (0, 0)
+    assert max(r[2] for r in rects) == WIDTH and max(r[3] for r in rects) == HEIGHT
+    # Neighbours overlap by about a fifth of a tile
+    left, right = rects[0], rects[1]
+    assert right[0] < left[2]
+    assert abs((left[2] - right[0]) - 0.2 * (left[2] - left[0])) <= 1
+
+
+def test_single_tile_is_the_whole_frame():
+    assert tile_grid(WIDTH, HEIGHT, cols=1, rows=1) == [(0, 0, WIDTH, HEIGHT)]
+
+
+def detector_seeing(person, cols, rows):
+    """A TiledDetector whose fake model finds `person` (frame pixels x0, y0, x1, y1) wherever it is visible."""
+    processor = PostProcessor(['person'], ['person'], score_threshold=0.3)
+    grid = [(0, 0, WIDTH, HEIGHT)] + tile_grid(WIDTH, HEIGHT, cols, rows, 0.2)
+
+    def run_batch(images):
+        outputs = []
+        for image, (x0, y0, x1, y1) in zip(images, grid):
+            assert image.shape[:2] == (y1 - y0, x1 - x0)
+            px0, py0, px1, py1 = person
+            visible = px0 >= x0 and px1 <= x1 and py0 >= y0 and py1 <= y1
+            # The full frame pass misses the (small) person
+            if visible and (x0, y0, x1, y1) != (0, 0, WIDTH, HEIGHT):
+                box = [(py0 - y0) / (y1 - y0), (px0 - x0) / (x1 - x0), (py1 - y0) / (y1 - y0), (px1 - x0) / (x1 - x0)]
+                outputs.append((np.array([box], np.float32), np.zeros(1, np.float32), np.array([0.9], np.float32)))
+            else:
+                outputs.append((np.zeros((1, 4), np.float32), np.zeros(1, np.float32), np.zeros(1, np.float32)))
+        return outputs
+
+    tiler = TiledDetector(run_batch, lambda frame, b, c, s: processor(b, c, s, WIDTH, HEIGHT),
+                          cols=cols, rows=rows, budget_ms=60.0)
+    # Pretend the images are cheap so every tile fits in the budget
+    tiler.per_image = 0.001
+    return tiler
+
+
+def test_tile_boxes_map_back_to_frame_coordinates():
+    tiler = detector_seeing((10, 10, 30, 40), cols=2, rows=2)
+    detections = tiler(np.zeros((HEIGHT, WIDTH, 3), np.uint8))
+    assert tiler.tiles_run == 4
+    assert len(detections) == 1
+    d = detections[0]
+    np.testing.assert_allclose([d['xmin'], d['ymin'], d['xmax'], d['ymax']],
+                               [10 / WIDTH, 10 / HEIGHT, 30 / WIDTH, 40 / HEIGHT], atol=1e-5)
+
+
+def test_overlapping_tiles_report_a_person_once():
+    # In the overlap between the two columns: both tiles see it
+    tiler = detector_seeing((95, 40, 105, 60), cols=2, rows=1)
+    detections = tiler(np.zeros((HEIGHT, WIDTH, 3), np.uint8))
+    assert len(detections) == 1
+    np.testing.assert_allclose([detections[0]['xmin'], detections[0]['xmax']], [95 / WIDTH, 105 / WIDTH], atol=1e-5)
+
+
+def test_tiles_rotate_within_the_budget():
+    tiler = detector_seeing((10, 10, 30, 40), cols=2, rows=2)
+    assert tiler.tiles_per_frame() == 4
+    tiler.per_image = 0.02  # full frame plus two tiles fit in 60 ms
+    assert tiler.tiles_per_frame() == 2
+    first = tiler._choose_tiles(WIDTH, HEIGHT)
+    second = tiler._choose_tiles(WIDTH, HEIGHT)
+    assert set(first + second) == set(tile_grid(WIDTH, HEIGHT, 2, 2, 0.2))
@@ -0,0 +1,83 @@
+import numpy as np
+
+from postprocess import to_detections
+from tracker import AdaptiveCadence, BoxTracker
+
+WIDTH, HEIGHT = 320, 240
+
+
+def detections(*boxes, score=0.9):
+    boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+    return to_detections(boxes, np.full(len(boxes), score, np.float32), np.zeros(len(boxes), np.int16),
+                         WIDTH, HEIGHT)
+
+
+def blank():
+    return np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def test_matched_boxes_move_at_their_velocity():
+    tracker = BoxTracker(use_flow=False, decay=0.5)
+    tracker.update(blank(), detections([0.1, 0.1, 0.3, 0.3]))
+    tracker.propagate(blank())
+    tracker.propagate(blank())
+    # Keyframe two frames later, 0.1 further right: 0.05 per frame
+    tracker.update(blank(), detections([0.1, 0.2, 0.3, 0.4]))
+    tracked = tracker.propagate(blank())
+    np.testing.assert_allclose([tracked['xmin'][0], tracked['xmax'][0]], [0.25, 0.45], atol=1e-6)
+    assert tracker.confidence == 0.5
+
+
+def test_boxes_stay_inside_the_frame():
+    tracker = BoxTracker(use_flow=False)
+    tracker.update(blank(), detections([0.1, 0.8, 0.3, 0.95]))
+    tracker.velocity[:] = (0, 0.1, 0, 0.1)
+    tracked = tracker.propagate(blank())
+    assert tracked['xmax'][0] == 1.0
+
+
+def test_unmatched_detections_start_still():
+    tracker = BoxTracker(use_flow=False)
+    tracker.update(blank(), detections([0.1, 0.1, 0.2, 0.2]))
+    tracker.update(blank(), detections([0.6, 0.6, 0.9, 0.9]))
+    np.testing.assert_array_equal(tracker.velocity, np.zeros((1, 4)))
+
+
+def test_empty_tracker_returns_no_detections():
+    tracker = BoxTracker()
+    assert len(tracker.propagate(blank())) == 0
+    assert tracker.confidence == 1.0
+
+
+def test_flow_follows_a_moving_patch():
+    rng = np.random.default_rng(0)
+    patch = rng.integers(0, 255, (60, 60, 3), dtype=np.uint8)
+
+    def frame_with_patch(x):
+        frame = blank()
+        frame[90:150, x:x + 60] = patch
+        return frame
+
+    tracker = BoxTracker(use_flow=True, flow_scale=0.5)
+    tracker.update(frame_with_patch(100), detections([90 / HEIGHT, 100 / WIDTH, 150 / HEIGHT, 160 / WIDTH]))
+    tracked = tracker.propagate(frame_with_patch(108))
+    assert abs(tracked['xmin'][0] * WIDTH - 108) < 2
+    assert abs(tracked['ymin'][0] * HEIGHT - 90) < 2
+
+
+def test_cadence_follows_inference_latency():
+    cadence = AdaptiveCadence(target_fps=10, max_interval=4, smoothing=1.0)
+    cadence.record_inference(0.25)
+    assert cadence.interval == 3
+    assert [cadence.should_detect() for _ in range(6)] == [True, False, False, True, False, False]
+    cadence.record_inference(2.0)
+    assert cadence.interval == 4
+
+
+def test_low_tracker_confidence_forces_a_keyframe():
+    cadence = AdaptiveCadence(target_fps=10, max_interval=8, min_confidence=0.5, smoothing=1.0)
+    cadence.record_inference(0.5)
+    assert cadence.should_detect()
+    assert not cadence.should_detect(0.9)
+    assert cadence.should_detect(0.4)
+    assert (cadence.keyframes, cadence.tracked_frames) == (2, 1)
@@ -0,0 +1,40 @@
+import numpy as np
+
+from pipeline import FramePacket
+from postprocess import to_detections
+from video_protocol import VIDEO_HEADER, pack_frame, unpack_frame
+
+
+def make_packet(seq=42, reused=True):
+    packet = FramePacket(seq, capture_ts=1700000000.25)
+    packet.detections = to_detections(np.array([[0.1, 0.2, 0.5, 0.6]], np.float32), np.array([0.875], np.float32),
+                                      np.zeros(1, np.int16), 320, 240)
+    packet.direction = "left"
+    packet.reused = reused
+    return packet
+
+
+def test_frame_round_trips():
+    data = pack_frame(make_packet(), b'\xff\xd8jpeg\xff\xd9')
+    assert VIDEO_HEADER.size == 24
+    header, record, jpeg = unpack_frame(data)
+    assert header == {"seq": 42, "ts": 1700000000.25, "reused": True}
+    assert record["boxes"] == [[0.1, 0.2, 0.5, 0.6]]
+    assert record["scores"] == [0.875] and record["persons"] == 1 and record["direction"] == "left"
+    assert jpeg == b'\xff\xd8jpeg\xff\xd9'
+
+
+def test_seq_wraps_and_empty_payloads():
+    packet = FramePacket(2 ** 32 + 5, capture_ts=0.0)
+    header, record, jpeg = unpack_frame(pack_frame(packet, b''))
+    assert header == {"seq": 5, "ts": 0.0, "reused": False}
+    assert record["boxes"] == [] and jpeg == b''
+
+
+def test_malformed_messages_are_rejected():
+    data = pack_frame(make_packet(), b'jpeg')
+    assert unpack_frame(data[:VIDEO_HEADER.size - 1]) is None
+    assert unpack_frame(data[:-1]) is None
+    assert unpack_frame(data + b'x') is None
+    assert unpack_frame(b'XX' + data[2:]) is None
+    assert unpack_frame(data[:2] + b'\x02' + data[3:]) is None
@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+
+from postprocess import nms
+
+
+def tile_grid(width, height, cols=2, rows=2, overlap=0.2):
+    """Pixel rects (x0, y0, x1, y1) of a cols x rows grid whose neighbours overlap by `overlap` of a tile."""
+    tile_w = width / (cols - (cols - 1) * overlap)
+    tile_h = height / (rows - (rows - 1) * overlap)
+    rects = []
+    for r in range(rows):
+        for c in range(cols):
+            x0 = int(round(c * tile_w * (1 - overlap)))
+            y0 = int(round(r * tile_h * (1 - overlap)))
+            rects.append((x0, y0, min(width, int(round(x0 + tile_w))), min(height, int(round(y0 + tile_h)))))
+    return rects
+
+
+class TiledDetector:
+    """
+    Runs the detector on the whole frame plus overlapping tiles of it, so
+    distant people that shrink to a few pixels in the 300x300 input are seen
+    at a higher effective resolution.
+
+    The full frame and the chosen tiles go to run_batch() together (one
+    batched invoke where the interpreter supports it). Tile boxes are mapped
+    back to frame coordinates, filtered by postprocess() and merged with
+    cross-tile NMS. A per-frame latency budget decides how many tiles run:
+    the measured cost per image sets the count, and tiles rotate across
+    frames so every region is covered every few frames even when only
+    some fit.
+    """
+    def __init__(self, run_batch, postprocess, cols=2, rows=2, overlap=0.2, budget_ms=60.0,
+                 nms_iou=0.5, smoothing=0.2):
+        # run_batch(images) -> [(boxes, classes, scores)]; postprocess(frame, boxes, classes, scores) -> detections
+        self.run_batch = run_batch
+        self.postprocess = postprocess
+        self.cols = cols
+        self.rows = rows
+        self.overlap = overlap
+        self.budget = budget_ms / 1000.0
+        self.nms_iou = nms_iou
+        self.smoothing = smoothing
+
+        self._grid = None
+        self._grid_size = None
+        self._next_tile = 0
+        # Smoothed seconds per image in a batch; None until the first frame
+        self.per_image = None
+
+        self.frames = 0
+        self.tiles_run = 0
+
+    @property
+    def tile_count(self):
+        return self.cols * self.rows
+
+    def tiles_per_frame(self):
+        """How many tiles fit in the budget next to the full-frame pass."""
+        if self.per_image is None:
+            # Nothing measured yet: start with the full frame only
+            return 0
+        fits = int(self.budget / max(self.per_image, 1e-6)) - 1
+        return max(0, min(self.tile_count, fits))
+
+    def _choose_tiles(self, width, height):
+        if self._grid_size != (width, height):
+            self._grid = tile_grid(width, height, self.cols, self.rows, self.overlap)
+            self._grid_size = (width, height)
+        count = self.tiles_per_frame()
+        chosen = [self._grid[(self._next_tile + i) % self.tile_count] for i in range(count)]
+        self._next_tile = (self._next_tile + count) % self.tile_count
+        return chosen
+
+    def __call__(self, frame):
+        height, width = frame.shape[:2]
+        tiles = self._choose_tiles(width, height)
+        images = [frame] + [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+
+        start = time.perf_counter()
+        outputs = self.run_batch(images)
+        per_image = (time.perf_counter() - start) / len(images)
+        if self.per_image is None:
+            self.per_image = per_image
+        else:
+            self.per_image += self.smoothing * (per_image - self.per_image)
+        self.frames += 1
+        self.tiles_run += len(tiles)
+
+        if not tiles:
+            return self.postprocess(frame, *outputs[0])
+
+        # Map tile-normalised boxes into frame-normalised coordinates
+        all_boxes, all_classes, all_scores = [outputs[0][0]], [outputs[0][1]], [outputs[0][2]]
+        for (x0, y0, x1, y1), (boxes, classes, scores) in zip(tiles, outputs[1:]):
+            scale = np.array([(y1 - y0) / height, (x1 - x0) / width] * 2, dtype=np.float32)
+            offset = np.array([y0 / height, x0 / width] * 2, dtype=np.float32)
+            all_boxes.append(boxes * scale + offset)
+            all_classes.append(classes)
+            all_scores.append(scores)
+
+        detections = self.postprocess(frame, np.concatenate(all_boxes), np.concatenate(all_classes),
+                                      np.concatenate(all_scores))
+        if len(detections) > 1:
+            boxes = np.stack([detections['ymin'], detections['xmin'], detections['ymax'], detections['xmax']], axis=1)
+            detections = detections[nms(boxes, detections['score'], self.nms_iou)]
+        return detections
+
+    def stats(self):
+        return {
+            "grid": f"{self.cols}x{self.rows}",
+            "tiles_per_frame": self.tiles_per_frame(),
+            "avg_tiles": round(self.tiles_run / self.frames, 2) if self.frames else 0.0,
+            "per_image_ms": round(1000 * self.per_image, 2) if self.per_image is not None else None,
+        }
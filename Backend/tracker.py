@@ -0,0 +1,171 @@
+import math
+import time
+
+import cv2
+import numpy as np
+
+from postprocess import iou_matrix, to_detections
+
+
+class BoxTracker:
+    """
+    Cheap tracker that carries detector boxes across frames where the
+    detector does not run.
+
+    On keyframes, update() associates new detections with existing tracks by
+    IoU to estimate per-frame velocity. In between, propagate() moves each box
+    with sparse Lucas-Kanade optical flow on a downscaled grayscale frame
+    (or constant velocity when flow is disabled) and decays its confidence.
+    """
+    def __init__(self, iou_threshold=0.3, use_flow=True, flow_scale=0.25, decay=0.92):
+        self.iou_threshold = iou_threshold
+        self.use_flow = use_flow
+        self.flow_scale = flow_scale
+        self.decay = decay
+
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.scores = np.zeros((0,), dtype=np.float32)
+        self.class_ids = np.zeros((0,), dtype=np.int16)
+        self.velocity = np.zeros((0, 4), dtype=np.float32)
+        self.track_confidence = np.zeros((0,), dtype=np.float32)
+        self.frames_since_update = 0
+        self._prev_gray = None
+
+    @property
+    def confidence(self):
+        """Weakest track's confidence (1.0 when nothing is tracked)."""
+        if len(self.track_confidence) == 0:
+            return 1.0
+        return float(self.track_confidence.min())
+
+    def _gray(self, frame):
+        small = cv2.resize(frame, None, fx=self.flow_scale, fy=self.flow_scale,
+                           interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def update(self, frame, detections):
+        """Replace tracks with fresh detections (a DETECTION_DTYPE array), keeping velocity for matched boxes."""
+        boxes = np.stack([detections['ymin'], detections['xmin'],
+                          detections['ymax'], detections['xmax']], axis=1).astype(np.float32)
+        velocity = np.zeros_like(boxes)
+
+        # Greedy IoU association against where the tracks are now
+        ious = iou_matrix(boxes, self.boxes)
+        if ious.size:
+            elapsed = max(1, self.frames_since_update)
+            for _ in range(min(ious.shape)):
+                i, j = np.unravel_index(np.argmax(ious), ious.shape)
+                if ious[i, j] < self.iou_threshold:
+                    break
+                velocity[i] = (boxes[i] - self.boxes[j]) / elapsed
+                ious[i, :] = -1
+                ious[:, j] = -1
+
+        self.boxes = boxes
+        self.scores = detections['score'].copy()
+        self.class_ids = detections['class_id'].copy()
+        self.velocity = velocity
+        self.track_confidence = np.ones(len(boxes), dtype=np.float32)
+        self.frames_since_update = 0
+        if self.use_flow:
+            self._prev_gray = self._gray(frame)
+        return detections
+
+    def propagate(self, frame):
+        """Move tracks onto this frame without running the detector. Returns a DETECTION_DTYPE array."""
+        self.frames_since_update += 1
+        height, width = frame.shape[:2]
+        if len(self.boxes) == 0:
+            if self.use_flow:
+                self._prev_gray = self._gray(frame)
+            return to_detections(self.boxes, self.scores, self.class_ids, width, height)
+
+        if self.use_flow and self._prev_gray is not None:
+            gray = self._gray(frame)
+            self._flow(self._prev_gray, gray)
+            self._prev_gray = gray
+        else:
+            self.boxes = self.boxes + self.velocity
+
+        np.clip(self.boxes, 0.0, 1.0, out=self.boxes)
+        self.track_confidence *= self.decay
+        return to_detections(self.boxes, self.scores, self.class_ids, width, height)
+
+    def _flow(self, prev_gray, gray):
+        h, w = gray.shape
+        # 3x3 grid of points inside each box (in downscaled pixel coordinates)
+        grid = np.linspace(0.25, 0.75, 3, dtype=np.float32)
+        gy, gx = np.meshgrid(grid, grid, indexing='ij')
+        gy, gx = gy.ravel(), gx.ravel()
+        b = self.boxes
+        ys = (b[:, 0, None] + gy[None, :] * (b[:, 2] - b[:, 0])[:, None]) * h
+        xs = (b[:, 1, None] + gx[None, :] * (b[:, 3] - b[:, 1])[:, None]) * w
+        points = np.stack([xs.ravel(), ys.ravel()], axis=1).astype(np.float32).reshape(-1, 1, 2)
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None,
+                                                    winSize=(15, 15), maxLevel=2)
+        if moved is None:
+            self.track_confidence *= 0.5
+            return
+
+        delta = (moved - points).reshape(len(b), -1, 2)
+        valid = status.reshape(len(b), -1).astype(bool)
+        for t in range(len(b)):
+            ok = valid[t]
+            if not ok.any():
+                # Lost the track: leave the box but make the detector re-run soon
+                self.track_confidence[t] *= 0.5
+                continue
+            dx = float(np.median(delta[t, ok, 0])) / w
+            dy = float(np.median(delta[t, ok, 1])) / h
+            self.boxes[t] += (dy, dx, dy, dx)
+            self.track_confidence[t] *= ok.mean()
+
+
+class AdaptiveCadence:
+    """
+    Decides which frames get a full detector run.
+
+    The detector runs every `interval` frames, where interval is chosen so
+    the measured inference latency spread over the interval fits the frame
+    budget (1 / target_fps), capped at max_interval. A tracker confidence
+    below min_confidence forces an early keyframe.
+    """
+    def __init__(self, target_fps=15.0, max_interval=8, min_confidence=0.5, smoothing=0.2):
+        self.frame_budget = 1.0 / target_fps
+        self.max_interval = max_interval
+        self.min_confidence = min_confidence
+        self.smoothing = smoothing
+
+        self.interval = 1
+        self.latency = None
+        self.frames_since_keyframe = None
+        self.keyframes = 0
+        self.tracked_frames = 0
+
+    def should_detect(self, tracker_confidence=1.0):
+        if (self.frames_since_keyframe is None
+                or self.frames_since_keyframe + 1 >= self.interval
+                or tracker_confidence < self.min_confidence):
+            self.frames_since_keyframe = 0
+            self.keyframes += 1
+            return True
+        self.frames_since_keyframe += 1
+        self.tracked_frames += 1
+        return False
+
+    def record_inference(self, seconds):
+        """Feed the measured detector latency back into the interval."""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.smoothing * (seconds - self.latency)
+        interval = math.ceil(self.latency / self.frame_budget)
+        self.interval = max(1, min(self.max_interval, interval))
+
+    def timed(self, fn, *args):
+        """Call fn(*args) and record its duration as inference latency."""
+        start = time.perf_counter()
+        result = fn(*args)
+        self.record_inference(time.perf_counter() - start)
+        return result
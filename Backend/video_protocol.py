@@ -0,0 +1,38 @@
+import json
+import struct
+
+# One WebSocket binary message per frame (network byte order):
+#   magic      2s  b'AV'
+#   version    B   VIDEO_VERSION
+#   flags      B   bit 0 = reused (detections carried over from an earlier frame)
+#   seq        I   frame sequence number; the client acks it with {"ack": seq}
+#   ts_ms      Q   capture time (unix ms)
+#   meta_len   I   length of the JSON detection record that follows
+#   jpeg_len   I   length of the JPEG that follows the record
+# followed by the record (FramePacket.detection_record()) and the JPEG bytes.
+VIDEO_HEADER = struct.Struct('!2sBBIQII')
+VIDEO_MAGIC = b'AV'
+VIDEO_VERSION = 1
+FLAG_REUSED = 0x01
+
+
+def pack_frame(packet, jpeg):
+    meta = json.dumps(packet.detection_record(), separators=(',', ':')).encode()
+    header = VIDEO_HEADER.pack(VIDEO_MAGIC, VIDEO_VERSION, FLAG_REUSED if packet.reused else 0,
+                               packet.seq & 0xFFFFFFFF, int(packet.capture_ts * 1000), len(meta), len(jpeg))
+    return b''.join((header, meta, jpeg))
+
+
+def unpack_frame(data):
+    """(header dict, detection record, jpeg bytes), or None if data is not a video frame."""
+    if len(data) < VIDEO_HEADER.size:
+        return None
+    magic, version, flags, seq, ts_ms, meta_len, jpeg_len = VIDEO_HEADER.unpack_from(data)
+    if magic != VIDEO_MAGIC or version != VIDEO_VERSION:
+        return None
+    start = VIDEO_HEADER.size
+    if len(data) != start + meta_len + jpeg_len:
+        return None
+    header = {"seq": seq, "ts": ts_ms / 1000.0, "reused": bool(flags & FLAG_REUSED)}
+    record = json.loads(data[start:start + meta_len])
+    return header, record, data[start + meta_len:]
@@ -1,5 +1,57 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import requests
+from urllib.parse import quote
+
+def websocket_player(ws_url, fallback_url):
+    """
+    Canvas player for the backend's /ws/video endpoint (see Backend/video_protocol.py).
+    Each binary message is a header, a JSON detection record and a JPEG; every
+    frame is acked after drawing, so the backend only sends what we can show.
+    If the socket fails before the first frame, the MJPEG iframe is used instead.
+    """
+    return f"""
+    <div id="player" style="text-align: center;">
+        <canvas id="video" style="width: 100%; max-width: 800px; border-radius: 8px; border: 1px solid #444;"></canvas>
+        <p id="info" style="color: #888; font-size: 0.8em; margin-top: 5px; font-family: sans-serif;">Connecting...</p>
+    </div>
+    <script>
+    const canvas = document.getElementById("video");
+    const ctx = canvas.getContext("2d");
+    const info = document.getElementById("info");
+    let gotFrame = false;
+
+    function fallback() {{
+        document.getElementById("player").innerHTML =
+            '<iframe src="{fallback_url}" style="width: 100%; max-width: 800px; height: 600px; border-radius: 8px; border: 1px solid #444;" frameborder="0" allowfullscreen></iframe>';
+    }}
+
+    const ws = new WebSocket("{ws_url}");
+    ws.binaryType = "arraybuffer";
+    ws.onerror = () => {{ if (!gotFrame) fallback(); }};
+    ws.onclose = () => {{ if (!gotFrame) fallback(); else info.textContent += " (disconnected)"; }};
+    ws.onmessage = async (event) => {{
+        const view = new DataView(event.data);
+        // magic 'AV', version, flags, seq (u32), ts_ms (u64), meta_len (u32), jpeg_len (u32)
+        if (view.getUint8(0) !== 65 || view.getUint8(1) !== 86) return;
+        const seq = view.getUint32(4);
+        const ts = Number(view.getBigUint64(8));
+        const metaLen = view.getUint32(16);
+        const jpegLen = view.getUint32(20);
+        const meta = JSON.parse(new TextDecoder().decode(new Uint8Array(event.data, 24, metaLen)));
+        const jpeg = new Blob([new Uint8Array(event.data, 24 + metaLen, jpegLen)], {{type: "image/jpeg"}});
+        const bitmap = await createImageBitmap(jpeg);
+        gotFrame = true;
+        canvas.width = bitmap.width;
+        canvas.height = bitmap.height;
+        ctx.drawImage(bitmap, 0, 0);
+        bitmap.close();
+        const age = Date.now() - ts;
+        info.textContent = `Frame ${{seq}} | persons: ${{meta.persons}} | direction: ${{meta.direction || "-"}} | latency ~${{age}} ms`;
+        ws.send(JSON.stringify({{ack: seq}}));
+    }};
+    </script>
+    """
 
 def show_dashboard(api_url):
     st.title("Device Dashboard")
@@ -34,17 +86,23 @@ def show_dashboard(api_url):
             else:
                 stream_url = base_url
             
-            # Use HTML for better centering/styling of the stream
-            # Using iframe is more robust if the endpoint returns a full HTML page or a stream
-            st.markdown(
-                f"""
-                <div style="text-align: center; margin-bottom: 20px;">
-                    <iframe src="{stream_url}" style="width: 100%; max-width: 800px; height: 600px; border-radius: 8px; border: 1px solid #444;" frameborder="0" allowfullscreen></iframe>
-                    <p style="color: #888; font-size: 0.8em; margin-top: 5px;">Source: <a href="{stream_url}" target="_blank">{stream_url}</a></p>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
+            if enable_detection:
+                # WebSocket video (frames + detections, acked) when the backend runs
+                # async_server.py; falls back to the MJPEG iframe otherwise
+                ws_url = api_url.replace("http", "ws", 1) + f"/ws/video?url={quote(base_url, safe='')}"
+                components.html(websocket_player(ws_url, stream_url), height=660)
+            else:
+                # Use HTML for better centering/styling of the stream
+                # Using iframe is more robust if the endpoint returns a full HTML page or a stream
+                st.markdown(
+                    f"""
+                    <div style="text-align: center; margin-bottom: 20px;">
+                        <iframe src="{stream_url}" style="width: 100%; max-width: 800px; height: 600px; border-radius: 8px; border: 1px solid #444;" frameborder="0" allowfullscreen></iframe>
+                        <p style="color: #888; font-size: 0.8em; margin-top: 5px;">Source: <a href="{stream_url}" target="_blank">{stream_url}</a></p>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
         else:
             st.warning("No connected device found.")
             